@@ -0,0 +1,621 @@
+"""
+bench_classifier.py
+===================
+Micro-benchmarks do caminho quente do classificador, por etapa.
+Execute: python bench_classifier.py [--n 2000] [--salvar base.json] [--comparar base.json]
+
+Corpus: os `exemplos` de test_classifier.py + mensagens sintéticas
+geradas a partir de modelos de frases financeiras em português.
+
+Etapas medidas (uma chamada por entrada, tempo individual de cada uma):
+  split_intencoes  — por mensagem
+  Mensagem         — por bloco (texto dobrado, valores sob demanda)
+  extract_valor    — por bloco
+  extract_cliente  — por bloco
+  extract_tags     — por bloco (serviço + pessoal)
+  classify_text    — por mensagem, com o Gemini substituído por um stub
+  _montar_linha    — por evento (requer as dependências do core.sheets)
+
+Para cada etapa: ops/s, p50, p95 e p99 (µs). --salvar grava o resultado
+em JSON como baseline; --comparar aponta regressões contra um baseline
+salvo e termina com código 1 se alguma etapa piorar além da tolerância.
+
+Comparativos com implementações anteriores (mesma saída, mais rápido):
+  lexico — léxico compilado (uma alternação por categoria) vs. a
+           implementação anterior (re.search por palavra + `in` linear)
+  split  — split_intencoes pré-compilado vs. a versão que recompilava
+           os padrões a cada chamada
+
+Cache de moldes (uma passada do corpus, cache vazio no início):
+  moldes — taxa de acerto e µs por bloco na camada regex, acerto vs.
+           falta; confere que a classificação é a mesma sem o cache
+
+Classificador local (core/modelo_local.py, treinado com um histórico
+rotulado gerado com outra semente):
+  local — fração dos blocos e das mensagens que vão ao Gemini e latência
+          por mensagem (p50, média), sem e com o modelo; o Gemini é simulado
+          (0,8 s por mensagem que o aciona, o padrão do loadtest.py)
+
+Memória (tracemalloc + blocos alocados do Python):
+  eventos — Evento com __slots__ vs. o dicionário aninhado anterior
+            {"tipo", "dados": {...}}, por mensagem classificada
+"""
+
+import gc
+import os
+import re
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import platform
+import tempfile
+import tracemalloc
+from datetime import datetime
+
+from core import classifier
+from core.classifier import (
+    PALAVRAS_RECEITA, PALAVRAS_DESPESA,
+    CONTEXTO_SERVICO, CONTEXTO_PESSOAL,
+    TAGS_SERVICO_RAW, TAGS_PESSOAL_RAW,
+    _VERBOS_EVENTO, _VERBOS_FIN,
+    split_intencoes, extract_valor, extract_cliente, extract_tags, classify_text,
+)
+from core.mensagem import Mensagem, dobrar
+from core.evento import Evento
+from core.moldes import CacheMoldes
+from core.modelo_local import ModeloLocal, ModeloArquivo
+from test_classifier import exemplos
+from treinar_modelo import avaliar
+
+logging.disable(logging.WARNING)
+
+
+# ================================================================
+# IMPLEMENTAÇÃO ANTERIOR (referência)
+# ================================================================
+
+def _match_tag_antigo(frase_lower, entries):
+    for palavra, wb in entries:
+        if wb:
+            if re.search(r'\b' + re.escape(palavra) + r'\b', frase_lower):
+                return True
+        else:
+            if palavra in frase_lower:
+                return True
+    return False
+
+
+def _contem_alguma_antigo(frase_lower, palavras):
+    return any(p in frase_lower for p in palavras)
+
+
+def _extract_tags_antigo(frase_lower, mapa_tags_raw):
+    return [tag for tag, entries in mapa_tags_raw.items()
+            if _match_tag_antigo(frase_lower, entries)]
+
+
+def _split_intencoes_antigo(texto: str) -> list:
+    t = texto.strip()
+    VERBOS_RE = '|'.join(_VERBOS_EVENTO)
+
+    t = re.sub(r',\s*(mas|porém|porem)\s+', ' |||SEP||| ', t, flags=re.IGNORECASE)
+    t = re.sub(r',?\s*e\s+ainda\s+', ' |||SEP||| ', t, flags=re.IGNORECASE)
+    t = re.sub(r'\s*[.!?]\s+', ' |||SEP||| ', t)
+    t = re.sub(r'\s*[—–]{1,}\s*', ' |||SEP||| ', t)
+
+    t = re.sub(
+        r',\s*(' + VERBOS_RE + r')\s+',
+        r' |||SEP||| \1 ', t, flags=re.IGNORECASE
+    )
+    t = re.sub(
+        r'\s+(?:aí|ai|então|entao|também|tambem)\s+(' + VERBOS_RE + r')\s+([^,]+?\d+)',
+        lambda m: ' |||SEP||| ' + m.group(1) + ' ' + m.group(2),
+        t, flags=re.IGNORECASE
+    )
+    t = re.sub(
+        r'\s+e\s+(' + VERBOS_RE + r')\s+(\w[^,]{0,30}?\d+)',
+        lambda m: ' |||SEP||| ' + m.group(1) + ' ' + m.group(2),
+        t, flags=re.IGNORECASE
+    )
+
+    UNIDADES = r'(?:\s*(?:reais|conto|contos|pila|pilas|real|r\$))?'
+    t = re.sub(r'\b(?:uns|umas|cerca de|mais de|menos de)\s+(\d)', r'\1', t, flags=re.IGNORECASE)
+    _num_pat = re.compile(
+        r'(\d[\d.,]*)' + UNIDADES + r'(?:\s+\w+){0,4}?\s+(' + VERBOS_RE + r')\s+',
+        re.IGNORECASE
+    )
+    for _ in range(10):
+        new_t = _num_pat.sub(lambda m: m.group(1) + ' |||SEP||| ' + m.group(2) + ' ', t)
+        if new_t == t:
+            break
+        t = new_t
+
+    partes = re.split(r'\s*\|\|\|SEP\|\|\|\s*', t)
+
+    blocos = []
+    for parte in partes:
+        sub = parte.strip().rstrip('.,!?')
+        if not sub:
+            continue
+        if blocos and re.fullmatch(
+            r'(' + VERBOS_RE + r')\s+[\d.,]+(\s*(?:reais|conto|real|pila))?',
+            sub, re.IGNORECASE
+        ):
+            blocos[-1] = blocos[-1].rstrip() + ' ' + sub
+        else:
+            blocos.append(sub)
+
+    merged = []
+    i = 0
+    while i < len(blocos):
+        atual = blocos[i]
+        if (
+            not _VERBOS_FIN.search(atual)
+            and i + 1 < len(blocos)
+            and _VERBOS_FIN.search(blocos[i + 1])
+        ):
+            merged.append(atual.rstrip() + ' ' + blocos[i + 1].lstrip())
+            i += 2
+        else:
+            merged.append(atual)
+            i += 1
+
+    return [b for b in merged if b.strip()]
+
+
+# ================================================================
+# CORPUS SINTÉTICO
+# ================================================================
+
+_NOMES = ["João", "Ana", "Carlos", "Marcos", "Zé", "Paulo", "Fernanda", "Rita", "Seu Antônio"]
+_DIAS = ["", "", "segunda", "terça", "quarta", "quinta", "sexta", "sábado", "ontem", "hoje"]
+_VALORES = ["80", "150", "300", "1200", "2.500", "1.200,50", "4000", "75", "uns 200", "R$ 90"]
+_UNIDADES = ["", "", " reais", " conto", " pila"]
+
+# (modelo, rótulo que o histórico teria — ver core/modelo_local.py; None = ambíguo)
+_MODELOS = [
+    ("{dia} recebi {valor}{un} do {nome}", "receita"),
+    ("caiu no pix {valor}{un} do {nome}", "receita"),
+    ("{nome} me pagou {valor}{un} {dia}", "receita"),
+    ("me pagaram {valor}{un} do serviço", "receita"),
+    ("paguei o ajudante {valor}{un}", "despesa_servico:funcionario"),
+    ("paguei a diária do {nome}, {valor}{un}", "despesa_servico:funcionario"),
+    ("comprei tinta por {valor}{un}", "despesa_servico:material"),
+    ("gastei {valor}{un} com gesso e areia para a obra", "despesa_servico:material"),
+    ("botei {valor}{un} de gasolina", "despesa_servico:transporte"),
+    ("abasteci {valor}{un} {dia}", "despesa_servico:transporte"),
+    ("fui no mercado gastei {valor}{un}", "despesa_pessoal:alimentacao"),
+    ("paguei o aluguel {valor}{un}", "despesa_pessoal:moradia"),
+    ("paguei a conta de luz, {valor}{un}", "despesa_pessoal:moradia"),
+    ("comprei remédio na farmácia {valor}{un}", "despesa_pessoal:saude"),
+    ("almoçamos fora, foi {valor}{un}", "despesa_pessoal:alimentacao"),
+    ("paguei {valor}{un} {dia}", None),
+    ("saiu {valor}{un} da conta", None),
+]
+_CONECTIVOS = [", ", " e ", " aí ", ". ", " então ", " "]
+
+
+def _preencher_modelo(rnd: random.Random, modelo: str) -> str:
+    frase = modelo.format(
+        dia=rnd.choice(_DIAS),
+        valor=rnd.choice(_VALORES),
+        un=rnd.choice(_UNIDADES),
+        nome=rnd.choice(_NOMES),
+    )
+    return re.sub(r"\s+", " ", frase).strip()
+
+
+def gerar_historico_rotulado(n: int, semente: int = 7) -> list:
+    """n frases (bloco, rótulo) como as que o Gemini e a planilha já rotularam."""
+    rnd = random.Random(semente)
+    historico = []
+    while len(historico) < n:
+        modelo, rotulo = rnd.choice(_MODELOS)
+        if rotulo is not None:
+            historico.append((_preencher_modelo(rnd, modelo), rotulo))
+    return historico
+
+
+def gerar_corpus_sintetico(n: int, semente: int = 42) -> list:
+    """Gera n mensagens com 1 a 4 eventos cada, de forma determinística."""
+    rnd = random.Random(semente)
+    mensagens = []
+    for _ in range(n):
+        partes = []
+        for _ in range(rnd.choice((1, 1, 2, 2, 3, 4))):
+            partes.append(_preencher_modelo(rnd, rnd.choice(_MODELOS)[0]))
+        msg = partes[0]
+        for p in partes[1:]:
+            msg += rnd.choice(_CONECTIVOS) + p
+        if rnd.random() < 0.5:
+            msg = msg[0].upper() + msg[1:] + "."
+        mensagens.append(msg)
+    return mensagens
+
+
+# ================================================================
+# MEDIÇÃO
+# ================================================================
+
+def _percentil(ordenadas: list, p: float) -> float:
+    idx = min(len(ordenadas) - 1, int(round(p / 100 * (len(ordenadas) - 1))))
+    return ordenadas[idx]
+
+
+def medir(func, entradas: list, repeticoes: int = 3, aquecimento: int = 1) -> dict:
+    """
+    Chama func(entrada) para cada entrada, `repeticoes` vezes, medindo cada
+    chamada. Retorna ops/s e percentis em microssegundos.
+    """
+    for _ in range(aquecimento):
+        for e in entradas:
+            func(e)
+
+    amostras = []
+    relogio = time.perf_counter_ns
+    for _ in range(repeticoes):
+        for e in entradas:
+            t0 = relogio()
+            func(e)
+            amostras.append(relogio() - t0)
+
+    amostras.sort()
+    total_s = sum(amostras) / 1e9
+    return {
+        "chamadas": len(amostras),
+        "ops_por_s": len(amostras) / total_s if total_s else 0.0,
+        "p50_us": _percentil(amostras, 50) / 1e3,
+        "p95_us": _percentil(amostras, 95) / 1e3,
+        "p99_us": _percentil(amostras, 99) / 1e3,
+    }
+
+
+def _cronometrar(func, repeticoes: int) -> float:
+    """Melhor tempo (s) de `repeticoes` execuções."""
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        func()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor
+
+
+def _gemini_stub(texto_original, blocos_inconclusivos):
+    return []
+
+
+def _importar_montar_linha():
+    """core.sheets precisa de gspread/dotenv; sem eles a etapa é pulada."""
+    os.environ.setdefault("TELEGRAM_TOKEN", "bench")
+    os.environ.setdefault("SPREADSHEET_ID", "bench")
+    try:
+        from core.sheets import _montar_linha
+        return _montar_linha
+    except ImportError as e:
+        print(f"  (etapa _montar_linha pulada: {e})")
+        return None
+
+
+# ================================================================
+# ETAPAS
+# ================================================================
+
+def bench_etapas(mensagens: list, repeticoes: int) -> dict:
+    blocos = [b for m in mensagens for b in split_intencoes(m)]
+    # Como no classify_text: os extratores leem a Mensagem já preparada
+    mensagens_bloco = [Mensagem(b) for b in blocos]
+
+    original = classifier._chamar_gemini
+    classifier._chamar_gemini = _gemini_stub
+    try:
+        eventos = [ev for m in mensagens for ev in classify_text(m)]
+        resultados = {
+            "split_intencoes": medir(split_intencoes, mensagens, repeticoes),
+            "Mensagem":        medir(Mensagem, blocos, repeticoes),
+            # str: Mensagem.valores é cacheado, e o tokenizador roda uma vez por bloco
+            "extract_valor":   medir(extract_valor, blocos, repeticoes),
+            "extract_cliente": medir(extract_cliente, mensagens_bloco, repeticoes),
+            "extract_tags":    medir(
+                lambda b: (extract_tags(b, TAGS_SERVICO_RAW), extract_tags(b, TAGS_PESSOAL_RAW)),
+                mensagens_bloco, repeticoes,
+            ),
+            "classify_text":   medir(classify_text, mensagens, repeticoes),
+        }
+    finally:
+        classifier._chamar_gemini = original
+
+    montar_linha = _importar_montar_linha()
+    if montar_linha is not None:
+        agora = datetime.now()
+        resultados["_montar_linha"] = medir(
+            lambda ev: montar_linha(ev, "frase original", agora), eventos, repeticoes
+        )
+    return resultados
+
+
+# ================================================================
+# COMPARATIVOS COM IMPLEMENTAÇÕES ANTERIORES
+# ================================================================
+
+_VOCABULARIO = (PALAVRAS_RECEITA, PALAVRAS_DESPESA, CONTEXTO_SERVICO, CONTEXTO_PESSOAL,
+                TAGS_SERVICO_RAW, TAGS_PESSOAL_RAW)
+
+
+def _dobrar_vocabulario() -> tuple:
+    """O vocabulário dobrado como o léxico compilado o enxerga (sem acento)."""
+    listas = tuple([dobrar(p) for p in v] for v in _VOCABULARIO[:4])
+    tags = tuple({t: [(dobrar(p), wb) for p, wb in es] for t, es in v.items()}
+                 for v in _VOCABULARIO[4:])
+    return listas + tags
+
+
+def _varrer(blocos, contem, tags, vocabulario=_VOCABULARIO) -> list:
+    """Todas as consultas de léxico que classify_text pode fazer por bloco."""
+    receita, despesa, ctx_servico, ctx_pessoal, tags_servico, tags_pessoal = vocabulario
+    saida = []
+    for b in blocos:
+        saida.append((
+            contem(b, receita),
+            contem(b, despesa),
+            contem(b, ctx_servico),
+            contem(b, ctx_pessoal),
+            tags(b, tags_servico),
+            tags(b, tags_pessoal),
+        ))
+    return saida
+
+
+def bench_lexico(mensagens: list, repeticoes: int = 5) -> dict:
+    # Cada lado recebe o que usaria no classify_text: o laço antigo, o texto
+    # e o vocabulário já dobrados; o léxico compilado, a Mensagem do bloco
+    mensagens_bloco = [Mensagem(b) for m in mensagens for b in split_intencoes(m)]
+    blocos = [msg.dobrado for msg in mensagens_bloco]
+    dobrado = _dobrar_vocabulario()
+
+    antigo = lambda: _varrer(blocos, _contem_alguma_antigo, _extract_tags_antigo, dobrado)
+    novo = lambda: _varrer(mensagens_bloco, classifier._contem_alguma, classifier.extract_tags)
+    assert antigo() == novo(), "léxico compilado diverge da implementação anterior"
+
+    t_antigo = _cronometrar(antigo, repeticoes)
+    t_novo = _cronometrar(novo, repeticoes)
+    return {
+        "unidades": len(blocos),
+        "antigo_us": t_antigo / len(blocos) * 1e6,
+        "novo_us": t_novo / len(blocos) * 1e6,
+        "ganho": t_antigo / t_novo,
+    }
+
+
+def bench_split(mensagens: list, repeticoes: int = 5) -> dict:
+    assert [_split_intencoes_antigo(t) for t in mensagens] == [split_intencoes(t) for t in mensagens], \
+        "split_intencoes diverge da implementação anterior"
+
+    t_antigo = _cronometrar(lambda: [_split_intencoes_antigo(t) for t in mensagens], repeticoes)
+    t_novo = _cronometrar(lambda: [split_intencoes(t) for t in mensagens], repeticoes)
+    return {
+        "unidades": len(mensagens),
+        "antigo_us": t_antigo / len(mensagens) * 1e6,
+        "novo_us": t_novo / len(mensagens) * 1e6,
+        "ganho": t_antigo / t_novo,
+    }
+
+
+def bench_moldes(mensagens: list) -> dict:
+    original = classifier._chamar_gemini, classifier._moldes
+    classifier._chamar_gemini = _gemini_stub
+    try:
+        classifier._moldes = False
+        sem_moldes = [[ev.to_dict() for ev in classify_text(m)] for m in mensagens]
+        classifier._moldes = CacheMoldes()
+        com_moldes = [[ev.to_dict() for ev in classify_text(m)] for m in mensagens]
+        stats = classifier._moldes.estatisticas()
+    finally:
+        classifier._chamar_gemini, classifier._moldes = original
+    assert com_moldes == sem_moldes, "o caminho por molde mudou a classificação"
+    stats["unidades"] = stats["acertos_regex"] + stats["acertos_gemini"] + stats["faltas"]
+    return stats
+
+
+GEMINI_LATENCIA_SIMULADA = 0.8
+
+
+def _fallback_e_latencia(mensagens: list) -> dict:
+    """Blocos/mensagens que vão ao Gemini e latências por mensagem, com o Gemini simulado."""
+    blocos = inconclusivos = com_gemini = 0
+    latencias = []
+    for m in mensagens:
+        inicio = time.perf_counter()
+        parcial = classifier.classificar_regex(m)
+        classifier.concluir_classificacao(parcial)
+        segundos = time.perf_counter() - inicio
+        if parcial["inconclusivos"]:
+            segundos += GEMINI_LATENCIA_SIMULADA
+            com_gemini += 1
+        latencias.append(segundos)
+        blocos += len(parcial["eventos"])
+        inconclusivos += len(parcial["inconclusivos"])
+    latencias.sort()
+    return {
+        "blocos": inconclusivos / blocos,
+        "mensagens": com_gemini / len(mensagens),
+        "p50_ms": _percentil(latencias, 50) * 1e3,
+        "media_ms": sum(latencias) / len(latencias) * 1e3,
+    }
+
+
+def bench_modelo_local(mensagens: list, limiar: float = 0.9) -> dict:
+    modelo = ModeloLocal.treinar(gerar_historico_rotulado(2000))
+    validacao = avaliar(modelo, gerar_historico_rotulado(500, semente=99), limiar)
+
+    original = classifier._chamar_gemini, classifier._moldes, classifier._modelo_local
+    classifier._chamar_gemini = _gemini_stub
+    classifier._moldes = False
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, "modelo_local.json")
+        modelo.salvar(caminho)
+        try:
+            classifier._modelo_local = False
+            sem = _fallback_e_latencia(mensagens)
+            classifier._modelo_local = ModeloArquivo(caminho, limiar)
+            classifier._modelo_local.recarregar()
+            com = _fallback_e_latencia(mensagens)
+        finally:
+            classifier._chamar_gemini, classifier._moldes, classifier._modelo_local = original
+    return {"unidades": len(mensagens), "limiar": limiar, "acerto": validacao["acerto"],
+            "sem": sem, "com": com}
+
+
+def _memoria_retida(construir) -> tuple:
+    """(bytes, blocos alocados) que continuam vivos no resultado de construir()."""
+    gc.collect()
+    tracemalloc.start()
+    blocos_antes = sys.getallocatedblocks()
+    bytes_antes = tracemalloc.get_traced_memory()[0]
+    resultado = construir()
+    gc.collect()
+    retido = (tracemalloc.get_traced_memory()[0] - bytes_antes,
+              sys.getallocatedblocks() - blocos_antes)
+    tracemalloc.stop()
+    del resultado
+    return retido
+
+
+def _como_dict(ev) -> dict:
+    """Evento na representação anterior, com as listas próprias de cada evento."""
+    d = ev.to_dict()
+    return {"tipo": d["tipo"],
+            "dados": {k: list(v) if isinstance(v, list) else v for k, v in d["dados"].items()}}
+
+
+def _como_evento(ev):
+    return ev.copia(tags=list(ev.tags) if ev.tags is not None else None,
+                    dias=list(ev.dias) if ev.dias is not None else None)
+
+
+def bench_eventos(mensagens: list) -> dict:
+    original = classifier._chamar_gemini
+    classifier._chamar_gemini = _gemini_stub
+    try:
+        por_mensagem = [classify_text(m) for m in mensagens]
+    finally:
+        classifier._chamar_gemini = original
+    assert all(Evento.from_dict(_como_dict(ev)).to_dict() == ev.to_dict()
+               for evs in por_mensagem for ev in evs), "to_dict/from_dict não preserva o evento"
+
+    n = len(mensagens)
+    bytes_antigo, blocos_antigo = _memoria_retida(
+        lambda: [[_como_dict(ev) for ev in evs] for evs in por_mensagem])
+    bytes_novo, blocos_novo = _memoria_retida(
+        lambda: [[_como_evento(ev) for ev in evs] for evs in por_mensagem])
+    return {
+        "unidades": n,
+        "eventos": sum(map(len, por_mensagem)),
+        "antigo_bytes": bytes_antigo / n,
+        "novo_bytes": bytes_novo / n,
+        "antigo_blocos": blocos_antigo / n,
+        "novo_blocos": blocos_novo / n,
+    }
+
+
+# ================================================================
+# BASELINE
+# ================================================================
+
+def comparar(atual: dict, baseline: dict, tolerancia: float) -> list:
+    """Etapas cujo p50 piorou mais que `tolerancia` (fração) vs. o baseline."""
+    regressoes = []
+    print(f"\n{'etapa':<18}{'p50 base':>12}{'p50 atual':>12}{'Δ':>9}")
+    for etapa, r in atual["etapas"].items():
+        b = baseline.get("etapas", {}).get(etapa)
+        if not b:
+            print(f"{etapa:<18}{'—':>12}{r['p50_us']:>10.1f}µs{'novo':>9}")
+            continue
+        delta = (r["p50_us"] - b["p50_us"]) / b["p50_us"] if b["p50_us"] else 0.0
+        marca = "  ⚠" if delta > tolerancia else ""
+        print(f"{etapa:<18}{b['p50_us']:>10.1f}µs{r['p50_us']:>10.1f}µs{delta:>+8.0%}{marca}")
+        if delta > tolerancia:
+            regressoes.append(etapa)
+    return regressoes
+
+
+# ================================================================
+# RUNNER
+# ================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do classificador por etapa")
+    parser.add_argument("--n", type=int, default=2000, help="mensagens sintéticas (padrão 2000)")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--salvar", metavar="ARQUIVO", help="grava o resultado como baseline JSON")
+    parser.add_argument("--comparar", metavar="ARQUIVO", help="compara com um baseline JSON salvo")
+    parser.add_argument("--tolerancia", type=float, default=0.25,
+                        help="piora de p50 aceita antes de acusar regressão (padrão 0.25)")
+    args = parser.parse_args()
+
+    mensagens = [ex["texto"] for ex in exemplos] + gerar_corpus_sintetico(args.n, args.semente)
+
+    print("\n" + "=" * 60)
+    print("⏱  BENCHMARK DO CLASSIFICADOR")
+    print("=" * 60)
+    print(f"Corpus: {len(exemplos)} exemplos + {args.n} sintéticas "
+          f"(semente {args.semente}), {args.repeticoes} repetição(ões)\n")
+
+    etapas = bench_etapas(mensagens, args.repeticoes)
+    print(f"{'etapa':<18}{'ops/s':>12}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for etapa, r in etapas.items():
+        print(f"{etapa:<18}{r['ops_por_s']:>12,.0f}"
+              f"{r['p50_us']:>8.1f}µs{r['p95_us']:>8.1f}µs{r['p99_us']:>8.1f}µs")
+
+    print("\nComparativos com a implementação anterior (mesma saída):")
+    for nome, r in (("lexico", bench_lexico(mensagens)), ("split", bench_split(mensagens))):
+        print(f"  [{nome}] {r['antigo_us']:.1f} → {r['novo_us']:.1f} µs/unidade "
+              f"({r['ganho']:.1f}x, {r['unidades']} unidades)")
+    r = bench_moldes(mensagens)
+    print(f"  [moldes] {r['taxa_acerto']:.0%} de acerto: {r['us_por_falta']:.1f} µs/bloco na falta, "
+          f"{r['us_por_acerto']:.1f} no acerto ({r['unidades']} blocos, {r['entradas']} moldes)")
+    r = bench_eventos(mensagens)
+    print(f"  [eventos] {r['antigo_bytes']:.0f} → {r['novo_bytes']:.0f} B/mensagem, "
+          f"{r['antigo_blocos']:.1f} → {r['novo_blocos']:.1f} alocações/mensagem "
+          f"({r['unidades']} mensagens, {r['eventos']} eventos)")
+    print("\nCamadas (Gemini simulado):")
+    r = bench_modelo_local(mensagens)
+    sem, com = r["sem"], r["com"]
+    print(f"  [local] Gemini em {sem['blocos']:.1%} → {com['blocos']:.1%} dos blocos, "
+          f"{sem['mensagens']:.1%} → {com['mensagens']:.1%} das mensagens; "
+          f"p50 {sem['p50_ms']:.1f} → {com['p50_ms']:.1f} ms, média {sem['media_ms']:.0f} → {com['media_ms']:.0f} ms "
+          f"(limiar {r['limiar']}, acerto {r['acerto']:.1%} na validação, {r['unidades']} mensagens)")
+
+    resultado = {
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "corpus": {"exemplos": len(exemplos), "sinteticas": args.n, "semente": args.semente},
+        "etapas": etapas,
+    }
+
+    codigo = 0
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\nComparação com {args.comparar} ({baseline.get('data', '?')}):")
+        regressoes = comparar(resultado, baseline, args.tolerancia)
+        if regressoes:
+            print(f"\n❌ Regressão em: {', '.join(regressoes)}")
+            codigo = 1
+        else:
+            print("\n✅ Sem regressões.")
+
+    if args.salvar:
+        with open(args.salvar, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2)
+        print(f"\nBaseline salvo em {args.salvar}")
+
+    print()
+    sys.exit(codigo)
+
+
+if __name__ == "__main__":
+    main()
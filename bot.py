@@ -2,10 +2,16 @@
 bot.py — GessoBot: controle financeiro via Telegram.
 """
 
+import io
+import asyncio
+import contextvars
+import functools
 import json
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-from telegram import Update
+from telegram import Update, InputFile
 from telegram.ext import (
     Application,
     ContextTypes,
@@ -14,10 +20,60 @@ from telegram.ext import (
     filters,
 )
 
-from core.config import TELEGRAM_TOKEN
+from core.config import (
+    TELEGRAM_TOKEN,
+    BOT_MODO,
+    WEBHOOK_URL,
+    WEBHOOK_CAMINHO,
+    WEBHOOK_ESCUTA,
+    WEBHOOK_PORTA,
+    WEBHOOK_SEGREDO,
+    PIPELINE_WORKERS,
+    PIPELINE_GRAVAR_ANTES,
+    RESPOSTA_PROGRESSIVA,
+    RESPOSTA_EDICAO_INTERVALO,
+    SHEETS_WRITE_BEHIND,
+    UPDATES_CONCORRENTES,
+    UPDATES_POR_CHAT,
+    UPDATES_PENDENTES_MAX,
+    DISJUNTOR_FALHAS,
+    DISJUNTOR_TEMPO,
+    DISJUNTOR_TEMPO_MAX,
+    METRICS_PORTA,
+    METRICS_ENDERECO,
+    PROFILE_1_EM_N,
+    PROFILE_MAX_SEGUNDOS,
+)
 from core.security import is_authorized
-from core.classifier import classify_text
-from core.sheets import registrar_eventos, inicializar_planilha
+from core.classifier import (
+    classificar_regex,
+    concluir_classificacao,
+    eventos_definitivos,
+    estatisticas_cache_gemini,
+    estatisticas_moldes,
+    estatisticas_modelo_local,
+    iniciar_modelo_local,
+)
+from core.sheets import (
+    registrar_eventos,
+    inicializar_planilha,
+    iniciar_write_behind,
+    encerrar_write_behind,
+)
+from core.metrics import (
+    LATENCIA_HANDLER,
+    HANDLER_SEGUNDOS,
+    LATENCIA_PRIMEIRA_RESPOSTA,
+    PRIMEIRA_RESPOSTA_SEGUNDOS,
+    EVENTOS_ANTECIPADOS,
+    iniciar_servidor_metricas,
+)
+from core.gemini import iniciar_cliente_gemini
+from core.profiler import PERFILADOR, colapsar, funcoes_quentes
+from core.escalonador import ProcessadorPorChat
+from core.resposta import RespostaProgressiva
+from core.evento import Evento
+from core.disjuntor import configurar_disjuntores, estados_disjuntores
 
 logging.basicConfig(
     level=logging.INFO,
@@ -26,6 +82,43 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+# ============================================================
+# PIPELINE — etapas bloqueantes fora do event loop
+#
+# A classificação (pode esperar segundos no Gemini) e registrar_eventos
+# (HTTP síncrono do gspread) rodam num pool de threads limitado, para
+# que uma mensagem lenta não trave as demais nem o /start.
+# ============================================================
+
+_executor = ThreadPoolExecutor(
+    max_workers=PIPELINE_WORKERS, thread_name_prefix="gessobot-pipeline"
+)
+
+
+# Sorteada por mensagem no handle_message (profiling contínuo 1-em-N)
+_perfilar_mensagem = contextvars.ContextVar("perfilar_mensagem", default=False)
+
+
+# Tarefas no pool (executando + na fila); só o event loop mexe nele
+_no_pool = 0
+
+
+async def _rodar_bloqueante(func, *args):
+    """
+    Executa uma função síncrona no pool do pipeline e aguarda o resultado.
+    A execução é um trecho perfilável (ver core/profiler.py).
+    """
+    global _no_pool
+    loop = asyncio.get_running_loop()
+    _no_pool += 1
+    try:
+        return await loop.run_in_executor(_executor, functools.partial(
+            PERFILADOR.executar, func, *args, continuo=_perfilar_mensagem.get()
+        ))
+    finally:
+        _no_pool -= 1
+
+
 # ============================================================
 # FORMATAÇÃO DA RESPOSTA DO BOT
 # ============================================================
@@ -46,38 +139,77 @@ NOME_TIPO = {
     "nao_classificado": "Não classificado",
 }
 
-def formatar_evento(evento: dict, idx: int) -> str:
+# Marca as etapas ainda pendentes na resposta provisória
+EM_ANDAMENTO = "🔄"
+
+
+def formatar_evento(evento: Evento, idx: int) -> str:
     """Monta a mensagem de confirmação de um evento para o usuário."""
-    tipo  = evento.get("tipo", "")
-    dados = evento.get("dados", {})
+    tipo  = evento.tipo
 
     emoji = EMOJI_TIPO.get(tipo, "📌")
     nome  = NOME_TIPO.get(tipo, tipo)
 
     linhas = [f"{emoji} *Evento {idx} — {nome}*"]
 
-    if dados.get("valor"):
-        linhas.append(f"  💵 Valor: R$ {dados['valor']}")
+    if evento.valor:
+        linhas.append(f"  💵 Valor: R$ {evento.valor}")
 
-    if dados.get("cliente"):
-        linhas.append(f"  👤 Cliente: {dados['cliente']}")
+    if evento.cliente:
+        linhas.append(f"  👤 Cliente: {evento.cliente}")
 
-    if dados.get("tags"):
-        tags_fmt = " · ".join(f"`{t}`" for t in dados["tags"])
+    if evento.tags:
+        tags_fmt = " · ".join(f"`{t}`" for t in evento.tags)
         linhas.append(f"  🏷 Tags: {tags_fmt}")
 
-    if dados.get("dias"):
-        linhas.append(f"  📅 Dia(s): {', '.join(dados['dias'])}")
+    if evento.dias:
+        linhas.append(f"  📅 Dia(s): {', '.join(evento.dias)}")
 
-    if dados.get("descricao"):
-        linhas.append(f"  📝 Desc: _{dados['descricao']}_")
+    if evento.descricao:
+        linhas.append(f"  📝 Desc: _{evento.descricao}_")
 
-    if dados.get("aviso"):
-        linhas.append(f"  ⚠️ Aviso: {dados['aviso']}")
+    if evento.aviso:
+        linhas.append(f"  ⚠️ Aviso: {evento.aviso}")
 
     return "\n".join(linhas)
 
 
+def montar_resposta(eventos: list, resultado: dict | None = None, blocos_na_ia: int = 0) -> str:
+    """
+    Texto da resposta: os eventos e o feedback do registro. Sem
+    `resultado` (ou com blocos ainda no Gemini) é a versão provisória da
+    resposta progressiva, com as etapas que faltam.
+    """
+    if not eventos:
+        return "⚠️ Nenhuma informação financeira reconhecida."
+
+    # Monta resposta de confirmação
+    linhas_resposta = []
+    for i, evento in enumerate(eventos, 1):
+        linhas_resposta.append(formatar_evento(evento, i))
+
+    # Etapas pendentes (resposta provisória)
+    pendentes = []
+    if blocos_na_ia:
+        pendentes.append(f"{EM_ANDAMENTO} Consultando a IA sobre {blocos_na_ia} trecho(s)...")
+    if resultado is None:
+        pendentes.append(f"{EM_ANDAMENTO} Salvando na planilha...")
+    if pendentes:
+        linhas_resposta.append("\n" + "\n".join(pendentes))
+        return "\n\n".join(linhas_resposta)
+
+    # Feedback de registro
+    if resultado["erros"]:
+        linhas_resposta.append(
+            f"\n❌ Erro ao salvar na planilha:\n" + "\n".join(resultado["erros"])
+        )
+    else:
+        n = len(resultado["sucesso"])
+        linhas_resposta.append(f"\n✅ {n} registro(s) salvo(s) na planilha.")
+
+    return "\n\n".join(linhas_resposta)
+
+
 # ============================================================
 # HANDLERS
 # ============================================================
@@ -108,33 +240,219 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     if not update.message or not update.message.text:
         return
 
-    frase = update.message.text
-    eventos = classify_text(frase)
-
-    if not eventos:
-        await update.message.reply_text("⚠️ Nenhuma informação financeira reconhecida.")
+    _perfilar_mensagem.set(PERFILADOR.sortear_mensagem())
+    inicio = time.perf_counter()
+    primeira = None
+    try:
+        primeira = await _processar_mensagem(update, update.message.text)
+    finally:
+        fim = time.perf_counter()
+        LATENCIA_HANDLER.registrar(fim - inicio)
+        HANDLER_SEGUNDOS.observar(fim - inicio)
+        if primeira is not None:
+            LATENCIA_PRIMEIRA_RESPOSTA.registrar(primeira - inicio)
+            PRIMEIRA_RESPOSTA_SEGUNDOS.observar(primeira - inicio)
+
+
+async def _processar_mensagem(update: Update, frase: str) -> float | None:
+    """Classifica, registra e responde. Retorna o instante da primeira resposta."""
+    # A camada regex é só CPU (décimos de ms) e roda no próprio event loop:
+    # no pool, a confirmação imediata esperaria atrás das chamadas ao Gemini
+    parcial = PERFILADOR.executar(classificar_regex, frase, continuo=_perfilar_mensagem.get())
+
+    # Só vale confirmar antes se há espera pela frente: o Gemini, a escrita
+    # direta no Sheets (com write-behind, o journal é local) ou a fila do
+    # pool, quando todos os workers estão ocupados
+    etapa_lenta = (parcial["inconclusivos"] or not SHEETS_WRITE_BEHIND
+                   or _no_pool >= PIPELINE_WORKERS)
+    if not (RESPOSTA_PROGRESSIVA and parcial["eventos"] and etapa_lenta):
+        eventos, resultado = await _classificar_e_registrar(parcial, frase)
+        await update.message.reply_text(montar_resposta(eventos, resultado), parse_mode="Markdown")
+        return time.perf_counter()
+
+    resposta = RespostaProgressiva(update.message, update.effective_chat.id,
+                                   intervalo=RESPOSTA_EDICAO_INTERVALO)
+    resposta.enviar(montar_resposta(parcial["eventos"], blocos_na_ia=len(parcial["inconclusivos"])))
+    # Com write-behind o registro leva milissegundos: a versão "salvando"
+    # só gastaria uma edição antes da final
+    ao_classificar = None
+    if not SHEETS_WRITE_BEHIND:
+        ao_classificar = lambda finais: resposta.atualizar(montar_resposta(finais))
+    try:
+        eventos, resultado = await _classificar_e_registrar(parcial, frase, ao_classificar)
+    except Exception:
+        # Sem isto, a confirmação ficaria para sempre "em andamento"
+        await resposta.concluir("❌ Erro ao processar a mensagem — confira a planilha antes de reenviar.")
+        raise
+    # A final sai na hora (só a ida e volta): esperar o balde de edições
+    # prenderia a vez do chat e uma vaga do processador
+    await resposta.concluir(montar_resposta(eventos, resultado))
+    return resposta.enviada_em
+
+
+async def _classificar_e_registrar(parcial: dict, frase: str, ao_classificar=None) -> tuple:
+    """
+    Conclui a classificação e registra no Sheets. Se a mensagem vai ao
+    Gemini, os eventos que o regex já resolveu de vez (eventos_definitivos)
+    são gravados ao mesmo tempo que a chamada ao LLM, e só o restante é
+    gravado depois — a latência fica max(Gemini, Sheets) em vez da soma.
+    `ao_classificar(eventos)` é chamado assim que a classificação termina,
+    antes de o registro acabar. Retorna (eventos finais, resultado de
+    registrar_eventos).
+    """
+    antecipados = []
+    if PIPELINE_GRAVAR_ANTES and parcial["inconclusivos"]:
+        antecipados = eventos_definitivos(parcial)
+
+    if not antecipados:
+        eventos = await _rodar_bloqueante(concluir_classificacao, parcial)
+        if not eventos:
+            return eventos, {"sucesso": [], "erros": []}
+        if ao_classificar is not None:
+            ao_classificar(eventos)
+        return eventos, await _rodar_bloqueante(registrar_eventos, eventos, frase)
+
+    EVENTOS_ANTECIPADOS.inc(len(antecipados))
+    gravacao = asyncio.ensure_future(_rodar_bloqueante(registrar_eventos, antecipados, frase))
+    try:
+        eventos = await _rodar_bloqueante(concluir_classificacao, parcial)
+        if ao_classificar is not None:
+            ao_classificar(eventos)
+    finally:
+        resultado = await gravacao
+
+    # concluir_classificacao devolve os definitivos como os mesmos objetos
+    ja_gravados = {id(ev) for ev in antecipados}
+    restantes = [ev for ev in eventos if id(ev) not in ja_gravados]
+    if restantes:
+        resto = await _rodar_bloqueante(registrar_eventos, restantes, frase)
+        resultado = {
+            "sucesso": resultado["sucesso"] + resto["sucesso"],
+            "erros": resultado["erros"] + resto["erros"],
+        }
+    return eventos, resultado
+
+
+async def status(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Mostra a latência do handler de mensagens (p50/p99 da janela recente)."""
+    user_id = update.effective_user.id if update.effective_user else None
+    if not user_id or not is_authorized(user_id):
         return
 
-    # Monta resposta de confirmação
-    linhas_resposta = []
-    for i, evento in enumerate(eventos, 1):
-        linhas_resposta.append(formatar_evento(evento, i))
-
-    # Registra no Sheets
-    resultado = registrar_eventos(eventos, frase)
+    r = LATENCIA_HANDLER.resumo()
+    linhas = [
+        "📊 *Latência do processamento*",
+        f"  Amostras: {r['n']} (total {r['total']})",
+        f"  p50: {r['p50'] * 1000:.0f} ms",
+        f"  p99: {r['p99'] * 1000:.0f} ms",
+        f"  máx: {r['max'] * 1000:.0f} ms",
+    ]
+    p = LATENCIA_PRIMEIRA_RESPOSTA.resumo()
+    if p["n"]:
+        linhas.append(f"  1ª resposta: p50 {p['p50'] * 1000:.0f} ms · p99 {p['p99'] * 1000:.0f} ms")
+
+    processador = context.application.update_processor
+    if isinstance(processador, ProcessadorPorChat):
+        f = processador.resumo()
+        linhas += [
+            "",
+            "🚦 *Fila de updates*",
+            f"  Em execução: {f['em_execucao']:g} · na fila: {f['na_fila']:g}",
+            f"  Chats ativos: {f['chats']} · maior fila: {f['maior_fila']}",
+            f"  Descartados (fila cheia): {f['rejeitados']}",
+        ]
+
+    abertos = {nome: estado for nome, estado in estados_disjuntores().items() if estado != "fechado"}
+    if abertos:
+        linhas += ["", "🔌 *Dependências fora*"]
+        linhas += [f"  {nome}: {estado.replace('_', '-')}" for nome, estado in abertos.items()]
+
+    c = estatisticas_cache_gemini()
+    if c:
+        linhas += [
+            "",
+            "🧠 *Cache do Gemini*",
+            f"  Hits: {c['hits_memoria']} memória · {c['hits_disco']} disco "
+            f"({c['taxa_acerto']:.0%})",
+            f"  Chamadas ao LLM: {c['misses']} · colapsadas: {c['colapsadas']}",
+            f"  Tempo economizado: {c['segundos_economizados']:.1f} s",
+        ]
+
+    m = estatisticas_moldes()
+    if m:
+        linhas += [
+            "",
+            "⚡ *Moldes de bloco*",
+            f"  Acertos: {m['acertos_regex']} regex · {m['acertos_gemini']} IA "
+            f"({m['taxa_acerto']:.0%}) · {m['entradas']} moldes",
+            f"  Por bloco: {m['us_por_acerto']:.0f} µs no acerto · {m['us_por_falta']:.0f} µs na falta",
+        ]
+
+    ml = estatisticas_modelo_local()
+    if ml:
+        linhas += [
+            "",
+            "🤖 *Classificador local*",
+            f"  Resolvidos antes do Gemini: {ml['aceitos']} de {ml['consultas']} "
+            f"({ml['taxa_aceite']:.0%}, limiar {ml['limiar']})",
+            f"  Modelo: {ml['exemplos']} exemplos · {ml['rotulos']} rótulos · treinado em {ml['treinado_em']}",
+        ]
+
+    await update.message.reply_text("\n".join(linhas), parse_mode="Markdown")
+
+
+async def profile(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    /profile <segundos> — amostra o pipeline durante a janela e devolve as
+    funções mais quentes e um arquivo de pilhas colapsadas (flamegraph).
+    /profile sem argumentos devolve o acumulado do profiling contínuo.
+    """
+    user_id = update.effective_user.id if update.effective_user else None
+    if not user_id or not is_authorized(user_id):
+        return
 
-    # Feedback de registro
-    if resultado["erros"]:
-        linhas_resposta.append(
-            f"\n❌ Erro ao salvar na planilha:\n" + "\n".join(resultado["erros"])
-        )
+    if context.args:
+        try:
+            segundos = min(float(context.args[0].replace(",", ".")), PROFILE_MAX_SEGUNDOS)
+        except ValueError:
+            segundos = 0
+        if segundos <= 0:
+            await update.message.reply_text("Uso: /profile <segundos>")
+            return
+        try:
+            PERFILADOR.iniciar_sessao()
+        except RuntimeError as e:
+            await update.message.reply_text(f"⚠️ {e}.")
+            return
+        await update.message.reply_text(f"🔬 Perfilando por {segundos:g} s...")
+        try:
+            await asyncio.sleep(segundos)
+        finally:
+            pilhas = PERFILADOR.encerrar_sessao()
+        titulo = f"🔬 *Perfil de {segundos:g} s*"
+    elif PROFILE_1_EM_N:
+        pilhas = PERFILADOR.continuo.copy()
+        titulo = f"🔬 *Perfil contínuo (1 a cada {PROFILE_1_EM_N} mensagens)*"
     else:
-        n = len(resultado["sucesso"])
-        linhas_resposta.append(f"\n✅ {n} registro(s) salvo(s) na planilha.")
+        await update.message.reply_text(
+            "Uso: /profile <segundos>\n(profiling contínuo desligado: PROFILE_1_EM_N=0)"
+        )
+        return
+
+    total = sum(pilhas.values())
+    if not total:
+        await update.message.reply_text(f"{titulo}\n\nNenhuma amostra — nada rodou no pipeline.",
+                                        parse_mode="Markdown")
+        return
 
-    await update.message.reply_text(
-        "\n\n".join(linhas_resposta),
-        parse_mode="Markdown"
+    linhas = [titulo, f"{total} amostra(s) · próprio / inclusivo", "```"]
+    for nome, proprio, inclusivo in funcoes_quentes(pilhas):
+        linhas.append(f"{proprio:5.1f}% {inclusivo:5.1f}%  {nome}")
+    linhas.append("```")
+    await update.message.reply_text("\n".join(linhas), parse_mode="Markdown")
+    await update.message.reply_document(
+        InputFile(io.BytesIO(colapsar(pilhas).encode("utf-8")), filename="gessobot-profile.folded"),
+        caption="Pilhas colapsadas (flamegraph.pl / speedscope)",
     )
 
 
@@ -142,6 +460,39 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 # MAIN
 # ============================================================
 
+async def _avisar_fila_cheia(update: Update) -> None:
+    if update.effective_message:
+        await update.effective_message.reply_text(
+            "⏳ Muitas mensagens seguidas — esta não foi registrada. Reenvie em instantes."
+        )
+
+
+def criar_aplicacao(token: str = TELEGRAM_TOKEN, request=None) -> Application:
+    """
+    Monta o Application com os handlers. `request` substitui o cliente
+    HTTP da Bot API (usado pelo loadtest com core.fake_telegram).
+    """
+    builder = Application.builder().token(token).concurrent_updates(ProcessadorPorChat(
+        limite_global=UPDATES_CONCORRENTES,
+        limite_por_chat=UPDATES_POR_CHAT,
+        max_pendentes=UPDATES_PENDENTES_MAX,
+        ao_rejeitar=_avisar_fila_cheia,
+    ))
+    if request is not None:
+        builder = builder.request(request).get_updates_request(request)
+    app: Application = builder.build()
+
+    app.add_handler(CommandHandler("start", start))
+    app.add_handler(CommandHandler("status", status))
+    # block=False: a janela do /profile não pode segurar, na fila do
+    # chat, as mensagens que ela mesma quer medir.
+    app.add_handler(CommandHandler("profile", profile, block=False))
+    # Bloqueante de propósito: o ProcessadorPorChat só garante a ordem
+    # dentro do chat se o update terminar junto com o handler.
+    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+    return app
+
+
 def main() -> None:
     if not TELEGRAM_TOKEN:
         raise ValueError("❌ TELEGRAM_TOKEN não definido no .env")
@@ -154,13 +505,53 @@ def main() -> None:
         print("✅ Planilha inicializada.")
     except Exception as e:
         print(f"⚠️  Aviso: não foi possível inicializar planilha: {e}")
+    iniciar_write_behind()
 
-    app: Application = Application.builder().token(TELEGRAM_TOKEN).build()
-    app.add_handler(CommandHandler("start", start))
-    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+    # Cliente Gemini criado uma vez e reaproveitado em todo fallback
+    try:
+        iniciar_cliente_gemini()
+        print("✅ Cliente Gemini pronto.")
+    except Exception as e:
+        print(f"⚠️  Aviso: fallback Gemini indisponível: {e}")
 
-    print("✅ Bot rodando.")
-    app.run_polling()
+    # Modelo local lido aqui; no event loop, só a troca em background
+    arquivo = iniciar_modelo_local()
+    modelo = arquivo.atual() if arquivo else None
+    if modelo is not None:
+        print(f"✅ Classificador local: {modelo.exemplos} exemplos, limiar {arquivo.limiar}.")
+
+    PERFILADOR.um_em_n = PROFILE_1_EM_N
+    configurar_disjuntores(DISJUNTOR_FALHAS, DISJUNTOR_TEMPO, DISJUNTOR_TEMPO_MAX)
+
+    if METRICS_PORTA:
+        try:
+            iniciar_servidor_metricas(METRICS_PORTA, METRICS_ENDERECO)
+            print(f"✅ Métricas em http://{METRICS_ENDERECO}:{METRICS_PORTA}/metrics")
+        except OSError as e:
+            print(f"⚠️  Aviso: endpoint de métricas indisponível: {e}")
+
+    app = criar_aplicacao()
+
+    # Nos dois modos, SIGTERM/SIGINT param a entrada de updates e o
+    # Application espera os updates em andamento e enfileirados antes de
+    # voltar — o finally só roda com o pipeline já drenado.
+    try:
+        if BOT_MODO == "webhook":
+            print(f"✅ Bot rodando (webhook em {WEBHOOK_ESCUTA}:{WEBHOOK_PORTA}/{WEBHOOK_CAMINHO}).")
+            app.run_webhook(
+                listen=WEBHOOK_ESCUTA,
+                port=WEBHOOK_PORTA,
+                url_path=WEBHOOK_CAMINHO,
+                webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_CAMINHO}",
+                secret_token=WEBHOOK_SEGREDO,
+            )
+        else:
+            print("✅ Bot rodando (polling).")
+            app.run_polling()
+    finally:
+        _executor.shutdown(wait=True)
+        # Depois do executor: nenhuma mensagem em andamento fica sem journal
+        encerrar_write_behind()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,195 @@
+"""
+core/cache.py — Cache de respostas em dois níveis (memória + disco).
+
+Usado pelo fallback Gemini: usuários repetem as mesmas frases informais
+("botei 100 de gasolina", "caiu o pix do Zé"), então a resposta para um
+conjunto de blocos normalizados pode ser reaproveitada.
+
+  Nível 1 — LRU em memória (OrderedDict), limitado por nº de entradas
+  Nível 2 — SQLite em disco, limitado por TTL e nº de entradas
+
+Chamadas concorrentes com a mesma chave são colapsadas numa só
+(single-flight): a primeira thread calcula, as demais esperam o resultado.
+Valores são guardados como JSON; cada leitura devolve uma cópia nova.
+"""
+
+import re
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def chave_blocos(blocos: list) -> str:
+    """Normaliza blocos para a chave do cache (caixa, espaços e pontuação final)."""
+    return "\n".join(
+        re.sub(r"\s+", " ", b.lower()).strip().rstrip(".,!?;") for b in blocos
+    )
+
+
+class _Voo:
+    """Cálculo em andamento para uma chave (single-flight)."""
+
+    def __init__(self):
+        self.pronto = threading.Event()
+        self.valor = None
+        self.erro = None
+        self.custo = 0.0
+
+
+class CacheRespostas:
+
+    def __init__(
+        self,
+        caminho: str | None = None,
+        ttl: float = 7 * 24 * 3600,
+        max_memoria: int = 1000,
+        max_disco: int = 50000,
+    ):
+        self.ttl = ttl
+        self.max_memoria = max_memoria
+        self.max_disco = max_disco
+
+        self._memoria = OrderedDict()  # chave → (json, expira_em, custo_s)
+        self._voos = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits_memoria": 0,
+            "hits_disco": 0,
+            "misses": 0,
+            "colapsadas": 0,
+            "segundos_economizados": 0.0,
+        }
+
+        self._conn = None
+        if caminho:
+            self._conn = sqlite3.connect(caminho, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS respostas (
+                       chave      TEXT PRIMARY KEY,
+                       valor      TEXT NOT NULL,
+                       expira_em  REAL NOT NULL,
+                       custo      REAL NOT NULL,
+                       acessado_em REAL NOT NULL
+                   )"""
+            )
+
+    # ── leitura ────────────────────────────────────────────────
+
+    def _ler(self, chave: str):
+        """Procura na memória e depois no disco. Chamar com o lock."""
+        agora = time.time()
+        item = self._memoria.get(chave)
+        if item is not None:
+            if item[1] > agora:
+                self._memoria.move_to_end(chave)
+                self._stats["hits_memoria"] += 1
+                self._stats["segundos_economizados"] += item[2]
+                return item[0]
+            del self._memoria[chave]
+
+        if self._conn is not None:
+            row = self._conn.execute(
+                "SELECT valor, expira_em, custo FROM respostas WHERE chave = ?", (chave,)
+            ).fetchone()
+            if row is not None:
+                valor, expira_em, custo = row
+                if expira_em > agora:
+                    self._conn.execute(
+                        "UPDATE respostas SET acessado_em = ? WHERE chave = ?", (agora, chave)
+                    )
+                    self._guardar_memoria(chave, valor, expira_em, custo)
+                    self._stats["hits_disco"] += 1
+                    self._stats["segundos_economizados"] += custo
+                    return valor
+                self._conn.execute("DELETE FROM respostas WHERE chave = ?", (chave,))
+        return None
+
+    # ── escrita ────────────────────────────────────────────────
+
+    def _guardar_memoria(self, chave, valor, expira_em, custo) -> None:
+        self._memoria[chave] = (valor, expira_em, custo)
+        self._memoria.move_to_end(chave)
+        while len(self._memoria) > self.max_memoria:
+            self._memoria.popitem(last=False)
+
+    def _guardar(self, chave: str, valor: str, custo: float) -> None:
+        agora = time.time()
+        expira_em = agora + self.ttl
+        self._guardar_memoria(chave, valor, expira_em, custo)
+        if self._conn is None:
+            return
+        try:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO respostas VALUES (?, ?, ?, ?, ?)",
+                (chave, valor, expira_em, custo, agora),
+            )
+            excesso = self._conn.execute("SELECT COUNT(*) FROM respostas").fetchone()[0] - self.max_disco
+            if excesso > 0:
+                self._conn.execute(
+                    "DELETE FROM respostas WHERE chave IN "
+                    "(SELECT chave FROM respostas ORDER BY acessado_em LIMIT ?)",
+                    (excesso,),
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"Não foi possível gravar no cache em disco: {e}")
+
+    # ── API ────────────────────────────────────────────────────
+
+    def obter_ou_calcular(self, chave: str, calcular):
+        """
+        Retorna o valor em cache para `chave` ou executa calcular().
+        Resultados vazios (falha do cálculo) não são guardados.
+        """
+        with self._lock:
+            valor = self._ler(chave)
+            if valor is not None:
+                return json.loads(valor)
+
+            voo = self._voos.get(chave)
+            lider = voo is None
+            if lider:
+                voo = self._voos[chave] = _Voo()
+                self._stats["misses"] += 1
+            else:
+                self._stats["colapsadas"] += 1
+
+        if not lider:
+            voo.pronto.wait()
+            if voo.erro is not None:
+                raise voo.erro
+            with self._lock:
+                self._stats["segundos_economizados"] += voo.custo
+            return json.loads(voo.valor)
+
+        inicio = time.perf_counter()
+        resultado = None
+        try:
+            resultado = calcular()
+            voo.valor = json.dumps(resultado, ensure_ascii=False)
+        except BaseException as e:
+            # Inclui CancelledError/KeyboardInterrupt: quem espera recebe o mesmo erro
+            voo.erro = e
+            raise
+        finally:
+            voo.custo = time.perf_counter() - inicio
+            with self._lock:
+                if voo.erro is None and resultado:
+                    self._guardar(chave, voo.valor, voo.custo)
+                del self._voos[chave]
+            voo.pronto.set()
+        return json.loads(voo.valor)
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entradas_memoria"] = len(self._memoria)
+        hits = stats["hits_memoria"] + stats["hits_disco"]
+        total = hits + stats["misses"]
+        stats["taxa_acerto"] = hits / total if total else 0.0
+        return stats
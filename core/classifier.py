@@ -1,24 +1,43 @@
 """
 core/classifier.py
 ==================
-Classificador financeiro em duas camadas:
+Classificador financeiro em camadas:
 
   Camada 1 — Regex (rápido, gratuito)
     Tenta identificar eventos por vocabulário expandido e split por contexto.
     Cobre linguagem formal, informal e coloquial.
 
+  Classificador local (opcional, gratuito)
+    Naive Bayes treinado com o histórico (core/modelo_local.py). Resolve o
+    bloco que o regex não resolveu quando a previsão passa do limiar.
+
   Camada 2 — Gemini (fallback inteligente)
     Acionado quando o regex retorna nao_classificado ou despesa genérica.
     Interpreta linguagem livre, sem pontuação, gírias e expressões informais.
+    Respostas ficam em cache (memória + disco) por blocos normalizados.
 
 Fluxo:
-  texto → split_intencoes() → regex classifier → se inconclusivo → Gemini
+  texto → split_intencoes() → regex classifier → se inconclusivo → modelo local
+        → se abaixo do limiar → Gemini
         → normalizar_evento_gemini() → lista de eventos padronizados
 """
 
 import re
 import json
+import time
 import logging
+import threading
+from functools import lru_cache
+
+from core.cache import CacheRespostas, chave_blocos
+from core.gemini import obter_cliente_gemini, MicroLote, PrazoEsgotado, DISJUNTOR_GEMINI
+from core.disjuntor import CircuitoAberto
+from core.limites import CotaEsgotada
+from core.mensagem import Mensagem, como_mensagem, dobrar
+from core.evento import Evento, TipoEvento
+from core.moldes import CacheMoldes, Molde, montar_molde, abstrair, preencher
+from core.modelo_local import ModeloArquivo, TIPOS_COM_TAGS, tipo_e_tags
+from core import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -31,8 +50,8 @@ PALAVRAS_RECEITA = [
     # Formal
     "recebi", "recebemos", "recebeu",
     "me pagou", "nos pagou", "pagou",
-    "transferiu", "fez transferência", "fez transferencia",
-    "depositou", "fez depósito", "fez deposito",
+    "transferiu", "fez transferência",
+    "depositou", "fez depósito",
     "pagamento recebido", "pagamento efetuado",
     "faturei", "faturamos",
     "cobrei", "cobramos",
@@ -48,16 +67,12 @@ PALAVRAS_RECEITA = [
     "liquidou", "liquidaram",
     "depositaram",
     "recebi pix", "pix caiu", "pix entrou",
-    "me pagaram", "pagaram",
     "virou", "caiu grana", "veio dinheiro",
     "recebi grana", "recebi dinheiro",
     "recebi o valor", "recebi os valores",
     "fechei serviço", "fechei trabalho",
     "ganhei", "ganhamos",
-    "liquidaram", "liquidou",
-    "quitaram", "quitou",
-    "acertamos", "acertou",
-    "me acertou", "me acertaram",
+    "acertamos",
 ]
 
 # ================================================================
@@ -83,7 +98,7 @@ PALAVRAS_DESPESA = [
     "debitou", "debitaram",
     "pedi", "pedi comida", "fiz um pedido", "pedi no",
     "fui no mercado", "fui no supermercado", "fui na farmácia",
-    "fui na farmacia", "fui no restaurante", "fui na padaria",
+    "fui no restaurante", "fui na padaria",
     "fui no açougue", "fui na feira", "fui na loja",
     "passei no mercado", "passei na farmácia",
     "passei no supermercado", "passei na padaria",
@@ -94,7 +109,7 @@ PALAVRAS_DESPESA = [
     "repus", "reposição",
     "consertei", "consertamos",
     "arrumei",
-    "tô devendo", "to devendo", "devo",  # passivo mas financeiro
+    "tô devendo", "devo",  # passivo mas financeiro
 ]
 
 # ================================================================
@@ -105,8 +120,8 @@ PALAVRAS_DESPESA = [
 TAGS_SERVICO_RAW = {
     "funcionario": [
         # Formal
-        ("funcionário", False), ("funcionario", False),
-        ("funcionária", False), ("funcionaria", False),
+        ("funcionário", False),
+        ("funcionária", False),
         ("colaborador", True), ("colaboradora", True),
         ("empregado", True), ("empregada", True),
         ("contratado", True), ("contratada", True),
@@ -119,8 +134,8 @@ TAGS_SERVICO_RAW = {
         ("ajudante", True), ("ajudante de obra", False),
         ("peão", True), ("piao", True), ("peão de obra", False),
         ("diarista", True),
-        ("diária", True), ("diaria", True),
-        ("mão de obra", False), ("mao de obra", False),
+        ("diária", True),
+        ("mão de obra", False),
         ("mão", True),  # "paguei a mão"
         ("rapaziada", True), ("rapazes", True),  # "paguei a rapaziada"
         ("galera", True),  # "paguei a galera"
@@ -146,7 +161,7 @@ TAGS_SERVICO_RAW = {
         ("placa", True), ("placa de drywall", False), ("drywall", True),
         ("tijolo", True), ("bloco", True),
         ("cal", True),
-        ("piso", True), ("porcelanato", True), ("cerâmica", True), ("ceramica", True),
+        ("piso", True), ("porcelanato", True), ("cerâmica", True),
         ("telha", True), ("cumeeira", True),
         ("insumo", True),
         # Gatilhos genéricos (apenas quando é objeto direto)
@@ -170,14 +185,14 @@ TAGS_SERVICO_RAW = {
     ],
     "transporte": [
         # Combustível
-        ("gasolina", True), ("combustível", True), ("combustivel", True),
-        ("diesel", True), ("etanol", True), ("álcool", True), ("alcool", True),
+        ("gasolina", True), ("combustível", True),
+        ("diesel", True), ("etanol", True), ("álcool", True),
         ("abasteci", True), ("abastecemos", True), ("enchi o tanque", False),
         # Serviços de transporte
         ("frete", True), ("fretes", True),
-        ("pedágio", True), ("pedagio", True),
+        ("pedágio", True),
         ("estacionamento", True),
-        ("uber", True), ("99", True), ("táxi", True), ("taxi", True),
+        ("uber", True), ("99", True), ("táxi", True),
         ("passagem", True),
         # Manutenção do veículo de trabalho
         ("aluguel da van", False), ("aluguel do carro", False),
@@ -195,8 +210,8 @@ TAGS_SERVICO_RAW = {
         ("inss", True), ("fgts", True),
         ("contador", True), ("contadora", True), ("contabilidade", True),
         ("taxa", True), ("taxas", True),
-        ("alvará", True), ("alvara", True),
-        ("licença", True), ("licenca", True),
+        ("alvará", True),
+        ("licença", True),
     ],
 }
 
@@ -209,33 +224,33 @@ TAGS_PESSOAL_RAW = {
         # Lugares
         ("mercado", True), ("supermercado", True), ("hipermercado", True),
         ("feira", True), ("quitanda", True),
-        ("açougue", True), ("acougue", True), ("peixaria", True),
+        ("açougue", True), ("peixaria", True),
         ("padaria", True), ("confeitaria", True),
         ("restaurante", True), ("lanchonete", True),
         ("pizzaria", True), ("hamburgueria", True),
         # Refeições e itens
-        ("lanche", True), ("refeição", True), ("refeicao", True),
-        ("almoço", True), ("almoco", True),
+        ("lanche", True), ("refeição", True),
+        ("almoço", True),
         ("janta", True), ("jantar", True), ("ceia", True),
         ("café", True), ("cafezinho", True),
-        ("café da manhã", False), ("cafe da manha", False),
+        ("café da manhã", False),
         ("marmita", True),
         # Apps/delivery
         ("ifood", True), ("delivery", True), ("rappi", True),
         ("uber eats", False),
         # Itens
         ("pizza", True), ("hamburguer", True), ("hamburger", True),
-        ("comida", True), ("alimento", True), ("alimentação", True), ("alimentacao", True),
+        ("comida", True), ("alimento", True), ("alimentação", True),
         ("rancho", True),  # compra do mês no nordeste
         ("feira do mês", False), ("compras do mês", False),
     ],
     "moradia": [
         ("aluguel da casa", False), ("aluguel do apartamento", False),
         ("aluguel do apto", False), ("aluguel", True),
-        ("condomínio", True), ("condominio", True),
-        ("conta de luz", False), ("conta de água", False), ("conta de agua", False),
-        ("conta de gás", False), ("conta de gas", False),
-        ("energia elétrica", False), ("energia eletrica", False),
+        ("condomínio", True),
+        ("conta de luz", False), ("conta de água", False),
+        ("conta de gás", False),
+        ("energia elétrica", False),
         ("água da casa", False), ("água encanada", False),
         ("internet da casa", False), ("wi-fi", True), ("wifi", True),
         ("iptu", True),
@@ -247,31 +262,31 @@ TAGS_PESSOAL_RAW = {
         ("financiamento do carro", False), ("prestação do carro", False),
         ("seguro do carro", False), ("seguro do veículo", False),
         ("ipva", True), ("licenciamento", True),
-        ("ônibus", True), ("onibus", True),
-        ("metrô", True), ("metro", True), ("trem", True),
+        ("ônibus", True),
+        ("metrô", True), ("trem", True),
         ("passagem de ônibus", False), ("cartão de transporte", False),
         ("bilhete único", False),
         ("manutenção do carro pessoal", False), ("conserto do carro pessoal", False),
     ],
     "saude": [
-        ("médico", True), ("medico", True),
+        ("médico", True),
         ("hospital", True), ("pronto-socorro", True), ("pronto socorro", False),
-        ("clínica", True), ("clinica", True), ("upa", True),
-        ("farmácia", True), ("farmacia", True), ("drogaria", True),
-        ("remédio", True), ("remedio", True), ("medicamento", True),
-        ("plano de saúde", False), ("plano de saude", False),
+        ("clínica", True), ("upa", True),
+        ("farmácia", True), ("drogaria", True),
+        ("remédio", True), ("medicamento", True),
+        ("plano de saúde", False),
         ("plano", True),
         ("exame", True), ("exames", True),
         ("consulta", True), ("consultas", True),
         ("dentista", True), ("ortodontista", True),
         ("fisioterapeuta", True), ("fisioterapia", True),
-        ("psicólogo", True), ("psicologo", True), ("psiquiatra", True),
+        ("psicólogo", True), ("psiquiatra", True),
         ("academia de saúde", False), ("nutricionista", True),
         ("vacina", True), ("vacinação", True),
         ("cirurgia", True), ("internação", True),
     ],
     "educacao": [
-        ("escola", True), ("colégio", True), ("colegio", True),
+        ("escola", True), ("colégio", True),
         ("faculdade", True), ("universidade", True), ("facul", True),
         ("curso", True), ("cursos", True),
         ("mensalidade", True), ("anuidade", True),
@@ -281,7 +296,7 @@ TAGS_PESSOAL_RAW = {
         ("treinamento", True),
     ],
     "lazer": [
-        ("lazer", True), ("diversão", True), ("diversao", True),
+        ("lazer", True), ("diversão", True),
         ("cinema", True), ("teatro", True), ("show", True),
         ("viagem", True), ("passeio", True), ("excursão", True),
         ("hotel", True), ("pousada", True), ("hospedagem", True),
@@ -296,11 +311,11 @@ TAGS_PESSOAL_RAW = {
     "vestuario": [
         ("roupa", True), ("roupas", True),
         ("calçado", True), ("calçados", True),
-        ("sapato", True), ("tênis", True), ("tenis", True),
-        ("sandália", True), ("sandalia", True),
-        ("vestuário", True), ("vestuario", True),
+        ("sapato", True), ("tênis", True),
+        ("sandália", True),
+        ("vestuário", True),
         ("camisa", True), ("camiseta", True), ("blusa", True),
-        ("calça", True), ("calca", True), ("bermuda", True),
+        ("calça", True), ("bermuda", True),
         ("vestido", True), ("saia", True),
         ("cueca", True), ("meia", True), ("meias", True),
         ("roupa íntima", False),
@@ -328,28 +343,76 @@ CONTEXTO_PESSOAL = [
 ]
 
 
+# ================================================================
+# LÉXICO COMPILADO
+#
+# Cada lista de vocabulário (e cada tag) vira UMA alternação regex,
+# compilada no import. Um único search por categoria substitui o laço
+# de re.search/`in` por palavra. Semântica preservada:
+#   entradas com word boundary → \b(?:a|b|...)\b
+#   entradas sem word boundary → (?:c|d|...)  (substring)
+# As entradas são dobradas (minúsculas, sem acento — core.mensagem) e
+# buscadas em Mensagem.dobrado: uma grafia só por palavra no vocabulário.
+# ================================================================
+
+def _compilar_entradas(entries) -> re.Pattern:
+    """[(palavra, usa_word_boundary)] → um padrão compilado."""
+    entries = [(dobrar(p), wb) for p, wb in entries]
+    # Mais longas primeiro: o search para no primeiro acerto possível
+    com_wb = sorted({p for p, wb in entries if wb}, key=len, reverse=True)
+    sem_wb = sorted({p for p, wb in entries if not wb}, key=len, reverse=True)
+    partes = []
+    if com_wb:
+        partes.append(r'\b(?:' + '|'.join(map(re.escape, com_wb)) + r')\b')
+    if sem_wb:
+        partes.append('(?:' + '|'.join(map(re.escape, sem_wb)) + ')')
+    return re.compile('|'.join(partes) if partes else r'(?!)')
+
+
+# Compilados por identidade da lista/dicionário de origem
+_LEXICO = {}
+
+
+def _compilado_lista(palavras) -> re.Pattern:
+    pat = _LEXICO.get(id(palavras))
+    if pat is None:
+        pat = _LEXICO[id(palavras)] = _compilar_entradas([(p, False) for p in palavras])
+    return pat
+
+
+def _compilado_tags(mapa_tags_raw) -> list:
+    pats = _LEXICO.get(id(mapa_tags_raw))
+    if pats is None:
+        pats = _LEXICO[id(mapa_tags_raw)] = [
+            (tag, _compilar_entradas(entries)) for tag, entries in mapa_tags_raw.items()
+        ]
+    return pats
+
+
+for _vocab in (PALAVRAS_RECEITA, PALAVRAS_DESPESA, CONTEXTO_SERVICO, CONTEXTO_PESSOAL):
+    _compilado_lista(_vocab)
+for _vocab in (TAGS_SERVICO_RAW, TAGS_PESSOAL_RAW):
+    _compilado_tags(_vocab)
+
+
 # ================================================================
 # HELPERS DE MATCH
 # ================================================================
 
-def _match_tag(frase_lower, entries):
-    for palavra, wb in entries:
-        if wb:
-            if re.search(r'\b' + re.escape(palavra) + r'\b', frase_lower):
-                return True
-        else:
-            if palavra in frase_lower:
-                return True
-    return False
+# `frase` é uma Mensagem ou uma str (dobrada aqui, a cada chamada)
+
+def _dobrado(frase) -> str:
+    return frase.dobrado if isinstance(frase, Mensagem) else dobrar(frase)
 
 
-def _contem_alguma(frase_lower, palavras):
-    return any(p in frase_lower for p in palavras)
+def _contem_alguma(frase, palavras):
+    return _compilado_lista(palavras).search(_dobrado(frase)) is not None
 
 
-def extract_tags(frase_lower, mapa_tags_raw):
-    return [tag for tag, entries in mapa_tags_raw.items()
-            if _match_tag(frase_lower, entries)]
+def extract_tags(frase, mapa_tags_raw):
+    dobrado = _dobrado(frase)
+    return [tag for tag, pat in _compilado_tags(mapa_tags_raw)
+            if pat.search(dobrado)]
 
 
 # ================================================================
@@ -391,6 +454,55 @@ _RE_VERBOS = r'\b(' + '|'.join(_VERBOS_EVENTO) + r')\b'
 
 _VERBOS_FIN = re.compile(_RE_VERBOS, re.IGNORECASE)
 
+# ── Padrões do split, compilados uma vez no import ─────────────
+_VERBOS_ALT = '|'.join(_VERBOS_EVENTO)
+_UNIDADES = r'(?:\s*(?:reais|conto|contos|pila|pilas|real|r\$))?'
+_SEP = ' |||SEP||| '
+
+# 1. Separadores explícitos, aplicados nesta ordem (a saída de um alimenta
+#    o seguinte): ", mas/porém", ", e ainda", pontuação final, travessão
+_RE_SEPARADORES = (
+    re.compile(r',\s*(?:mas|porém|porem)\s+', re.IGNORECASE),
+    re.compile(r',?\s*e\s+ainda\s+', re.IGNORECASE),
+    re.compile(r'\s*[.!?]\s+'),
+    re.compile(r'\s*[—–]+\s*'),
+)
+# 2. vírgula + verbo financeiro
+_RE_VIRGULA_VERBO = re.compile(r',\s*(' + _VERBOS_ALT + r')\s+', re.IGNORECASE)
+# 3. Conectivos + verbo + conteúdo até o primeiro número
+_RE_CONECTIVO_VERBO = re.compile(
+    r'\s+(?:aí|ai|então|entao|também|tambem)\s+(' + _VERBOS_ALT + r')\s+([^,]+?\d+)',
+    re.IGNORECASE
+)
+_RE_E_VERBO = re.compile(
+    r'\s+e\s+(' + _VERBOS_ALT + r')\s+(\w[^,]{0,30}?\d+)', re.IGNORECASE
+)
+# 4. Transição numérica: [uns/umas] número [unidade/palavras] → verbo
+_RE_APROXIMACAO = re.compile(
+    r'\b(?:uns|umas|cerca de|mais de|menos de)\s+(\d)', re.IGNORECASE
+)
+_RE_NUMERO_VERBO = re.compile(
+    r'(\d[\d.,]*)' + _UNIDADES + r'(?:\s+\w+){0,4}?\s+(' + _VERBOS_ALT + r')\s+',
+    re.IGNORECASE
+)
+# 5. Quebra pelos marcadores e detecção de bloco órfão ("verbo + número")
+_RE_MARCADOR = re.compile(r'\s*\|\|\|SEP\|\|\|\s*')
+_RE_BLOCO_ORFAO = re.compile(
+    r'(' + _VERBOS_ALT + r')\s+[\d.,]+(\s*(?:reais|conto|real|pila))?', re.IGNORECASE
+)
+
+
+def _sep_verbo(m) -> str:
+    return _SEP + m.group(1) + ' '
+
+
+def _sep_verbo_conteudo(m) -> str:
+    return _SEP + m.group(1) + ' ' + m.group(2)
+
+
+def _sep_numero_verbo(m) -> str:
+    return m.group(1) + _SEP + m.group(2) + ' '
+
 
 def split_intencoes(texto: str) -> list:
     """
@@ -403,80 +515,53 @@ def split_intencoes(texto: str) -> list:
       3. Conectivos (aí, então, e, também) + verbo + número
       4. Transição numérica: número [unidade] → verbo
       5. Merge de blocos sem verbo com o seguinte que tem
+
+    Todos os padrões são pré-compilados no import; cada etapa é uma
+    única varredura linear do texto.
     """
     t = texto.strip()
-    VERBOS_RE = '|'.join(_VERBOS_EVENTO)
 
     # 1. Separadores explícitos
-    t = re.sub(r',\s*(mas|porém|porem)\s+', ' |||SEP||| ', t, flags=re.IGNORECASE)
-    t = re.sub(r',?\s*e\s+ainda\s+', ' |||SEP||| ', t, flags=re.IGNORECASE)
-    t = re.sub(r'\s*[.!?]\s+', ' |||SEP||| ', t)
-    t = re.sub(r'\s*[—–]{1,}\s*', ' |||SEP||| ', t)
+    for padrao in _RE_SEPARADORES:
+        t = padrao.sub(_SEP, t)
 
     # 2. vírgula + verbo financeiro
-    t = re.sub(
-        r',\s*(' + VERBOS_RE + r')\s+',
-        r' |||SEP||| \1 ', t, flags=re.IGNORECASE
-    )
+    t = _RE_VIRGULA_VERBO.sub(_sep_verbo, t)
 
     # 3. Conectivos + verbo + conteúdo (até o primeiro número ou fim)
     # Captura: "aí botei gasolina 130", "e comprei tinta 200", "então paguei 300"
     # Para no primeiro número para não engolir múltiplos eventos
-    t = re.sub(
-        r'\s+(?:aí|ai|então|entao|também|tambem)\s+(' + VERBOS_RE + r')\s+([^,]+?\d+)',
-        lambda m: ' |||SEP||| ' + m.group(1) + ' ' + m.group(2),
-        t, flags=re.IGNORECASE
-    )
+    t = _RE_CONECTIVO_VERBO.sub(_sep_verbo_conteudo, t)
     # "e" + verbo só separa se houver número logo após (evita false positives)
-    t = re.sub(
-        r'\s+e\s+(' + VERBOS_RE + r')\s+(\w[^,]{0,30}?\d+)',
-        lambda m: ' |||SEP||| ' + m.group(1) + ' ' + m.group(2),
-        t, flags=re.IGNORECASE
-    )
+    t = _RE_E_VERBO.sub(_sep_verbo_conteudo, t)
 
     # 4. Transição numérica: [uns/umas] número [unidade/palavras] → verbo
     # Cobre: "gastei uns 200", "caiu uns 300 no pix comprei", "recebi 1500 do João comprei"
-    UNIDADES = r'(?:\s*(?:reais|conto|contos|pila|pilas|real|r\$))?'
     # Normaliza "uns/umas X" → "X" para facilitar a detecção
-    t = re.sub(r'\b(?:uns|umas|cerca de|mais de|menos de)\s+(\d)', r'\1', t, flags=re.IGNORECASE)
-    # Roda em loop porque cada substituição pode ativar a próxima
-    _num_pat = re.compile(
-        r'(\d[\d.,]*)' + UNIDADES + r'(?:\s+\w+){0,4}?\s+(' + VERBOS_RE + r')\s+',
-        re.IGNORECASE
-    )
-    for _ in range(10):  # máx 10 eventos por mensagem
-        new_t = _num_pat.sub(lambda m: m.group(1) + ' |||SEP||| ' + m.group(2) + ' ', t)
-        if new_t == t:
-            break
-        t = new_t
+    t = _RE_APROXIMACAO.sub(r'\1', t)
+    # Uma passada basta: o sub retoma logo após o verbo consumido e o
+    # marcador inserido não pode iniciar um novo match
+    t = _RE_NUMERO_VERBO.sub(_sep_numero_verbo, t)
 
     # 5. Quebra pelos marcadores
-    partes = re.split(r'\s*\|\|\|SEP\|\|\|\s*', t)
-
     blocos = []
-    for parte in partes:
+    for parte in _RE_MARCADOR.split(t):
         sub = parte.strip().rstrip('.,!?')
         if not sub:
             continue
         # Bloco órfão: só "verbo + número [unidade]" → mescla com anterior
-        if blocos and re.fullmatch(
-            r'(' + VERBOS_RE + r')\s+[\d.,]+(\s*(?:reais|conto|real|pila))?',
-            sub, re.IGNORECASE
-        ):
+        if blocos and _RE_BLOCO_ORFAO.fullmatch(sub):
             blocos[-1] = blocos[-1].rstrip() + ' ' + sub
         else:
             blocos.append(sub)
 
     # 6. Merge: bloco sem verbo financeiro + próximo que tem
+    tem_verbo = [_VERBOS_FIN.search(b) is not None for b in blocos]
     merged = []
     i = 0
     while i < len(blocos):
         atual = blocos[i]
-        if (
-            not _VERBOS_FIN.search(atual)
-            and i + 1 < len(blocos)
-            and _VERBOS_FIN.search(blocos[i + 1])
-        ):
+        if not tem_verbo[i] and i + 1 < len(blocos) and tem_verbo[i + 1]:
             merged.append(atual.rstrip() + ' ' + blocos[i + 1].lstrip())
             i += 2
         else:
@@ -486,54 +571,67 @@ def split_intencoes(texto: str) -> list:
     return [b for b in merged if b.strip()]
 
 
-def extract_valor(frase: str) -> str:
-    """Extrai o primeiro valor monetário encontrado."""
-    for pattern in [
-        r'\b(\d{1,3}(?:\.\d{3})+(?:,\d+)?)\b',   # 2.500 ou 2.500,50
-        r'\b(\d{1,3}(?:,\d{3})+(?:\.\d+)?)\b',   # 2,500
-        r'\b(\d{4,})\b',                          # 2500
-        r'\b(\d{2,})\b',                          # 75
-    ]:
-        m = re.search(pattern, frase)
-        if m:
-            return m.group(1)
-    return ""
+# Extratores: recebem a Mensagem do bloco (ou uma str, preparada na hora)
 
+def extract_valor(frase) -> str:
+    """Valor principal do bloco, como escrito (ver core/valores.valor_principal)."""
+    valor = como_mensagem(frase).valor
+    return valor.texto if valor else ""
 
-def extract_todos_valores(frase: str) -> list:
+
+def extract_todos_valores(frase) -> list:
     """Extrai todos os valores monetários (para blocos com múltiplos valores)."""
-    return re.findall(r'\b\d[\d.,]*\b', frase)
+    return [valor.texto for valor in como_mensagem(frase).valores]
+
+
+def extract_dias(frase) -> list:
+    """Dias da semana citados, na grafia canônica ("sabado" → "sábado")."""
+    return [_DIA_POR_PALAVRA[d] for d in _RE_DIAS.findall(_dobrado(frase))]
 
 
-def extract_descricao(frase: str) -> str:
-    d = re.sub(r'\b\d[\d.,]*\b', '', frase)
-    d = re.sub(r'\b(reais|real|conto|contos|pila|r\$|\$)\b', '', d, flags=re.IGNORECASE)
-    return re.sub(r'\s+', ' ', d).strip()
+_RE_UNIDADES = re.compile(r'\b(reais|real|conto|contos|pila|r\$|\$)\b', re.IGNORECASE)
+_RE_ESPACOS = re.compile(r'\s+')
+
+
+def extract_descricao(frase) -> str:
+    msg = como_mensagem(frase)
+    # Tira os valores pelo trecho que o tokenizador reconheceu ("R$ 2,5 mil", "1k")
+    partes, pos = [], 0
+    for valor in msg.valores:
+        partes.append(msg.texto[pos:valor.inicio])
+        pos = valor.fim
+    d = "".join(partes) + msg.texto[pos:]
+    d = _RE_UNIDADES.sub('', d)
+    return _RE_ESPACOS.sub(' ', d).strip()
+
+
+# Buscados no texto dobrado; o nome sai do original pelo mesmo offset
+_NOME = r'([a-z][a-z]{2,})'
+_RE_CLIENTE = (
+    # "recebi X da/do Nome" ou "da empresa Nome"
+    re.compile(r'(?:recebi|recebemos|recebeu).*?(?:da|do)\s+(?:empresa\s+)?' + _NOME),
+    # "Nome me pagou", "Nome transferiu", "Nome enviou"
+    re.compile(r'\b' + _NOME + r'\s+'
+               r'(?:me\s+)?(?:pagou|transferiu|depositou|mandou|enviou|passou|acertou)'),
+    # "da/do Nome" como último recurso
+    re.compile(r'(?:da|do)\s+(?:empresa\s+)?' + _NOME),
+)
 
 
-def extract_cliente(frase: str) -> str:
+def extract_cliente(frase) -> str:
     """Extrai o nome de quem pagou/enviou dinheiro."""
-    padroes = [
-        # "recebi X da/do Nome" ou "da empresa Nome"
-        r'(?:recebi|recebemos|recebeu).*?(?:da|do)\s+(?:empresa\s+)?'
-        r'([A-ZÁÉÍÓÚÂÊÔÃÕÇ][A-Za-záéíóúâêôãõç]{2,})',
-        # "Nome me pagou", "Nome transferiu", "Nome enviou"
-        r'\b([A-ZÁÉÍÓÚÂÊÔÃÕÇ][a-záéíóúâêôãõç]{2,})\s+'
-        r'(?:me\s+)?(?:pagou|transferiu|depositou|mandou|enviou|passou|acertou)',
-        # "da/do Nome" como último recurso
-        r'(?:da|do)\s+(?:empresa\s+)?([A-ZÁÉÍÓÚÂÊÔÃÕÇ][A-Za-záéíóúâêôãõç]{2,})',
-    ]
-    for padrao in padroes:
-        m = re.search(padrao, frase, re.IGNORECASE)
+    msg = como_mensagem(frase)
+    for padrao in _RE_CLIENTE:
+        m = padrao.search(msg.dobrado)
         if m:
-            return m.group(1)
+            return msg.texto[m.start(1):m.end(1)]
     return ""
 
 
-def inferir_contexto(frase_lower: str) -> str | None:
-    if _contem_alguma(frase_lower, CONTEXTO_SERVICO):
+def inferir_contexto(frase) -> str | None:
+    if _contem_alguma(frase, CONTEXTO_SERVICO):
         return "servico"
-    if _contem_alguma(frase_lower, CONTEXTO_PESSOAL):
+    if _contem_alguma(frase, CONTEXTO_PESSOAL):
         return "pessoal"
     return None
 
@@ -542,142 +640,648 @@ def inferir_contexto(frase_lower: str) -> str | None:
 # SUBCLASSIFICADORES REGEX
 # ================================================================
 
-def classificar_receita(bloco: str, bloco_lower: str, valor: str, dias: list) -> dict:
-    return {
-        "tipo": "receita",
-        "dados": {
-            "cliente": extract_cliente(bloco),
-            "valor": valor,
-            "dias": dias,
-        }
-    }
+AVISO_SEM_TAG = "Tag não identificada — revise manualmente"
+AVISO_SEM_TIPO = "Tipo e tag não identificados — revise manualmente"
 
 
-def classificar_despesa(bloco: str, bloco_lower: str, valor: str, dias: list) -> dict:
-    descricao = extract_descricao(bloco)
-    tags_s = extract_tags(bloco_lower, TAGS_SERVICO_RAW)
-    tags_p = extract_tags(bloco_lower, TAGS_PESSOAL_RAW)
+def decidir(msg: Mensagem) -> tuple:
+    """
+    A parte da classificação que depende do léxico: (tipo, tags, aviso).
+    É o que o caminho rápido por molde guarda; o resto do evento sai dos
+    extratores baratos em montar_evento().
+    """
+    if _contem_alguma(msg, PALAVRAS_RECEITA):
+        return TipoEvento.RECEITA, None, None
+    if not _contem_alguma(msg, PALAVRAS_DESPESA):
+        return TipoEvento.NAO_CLASSIFICADO, None, None
 
+    tags_s = extract_tags(msg, TAGS_SERVICO_RAW)
     if tags_s:
-        return {"tipo": "despesa_servico",
-                "dados": {"descricao": descricao, "valor": valor, "tags": tags_s, "dias": dias}}
+        return TipoEvento.DESPESA_SERVICO, tuple(tags_s), None
+    tags_p = extract_tags(msg, TAGS_PESSOAL_RAW)
     if tags_p:
-        return {"tipo": "despesa_pessoal",
-                "dados": {"descricao": descricao, "valor": valor, "tags": tags_p, "dias": dias}}
+        return TipoEvento.DESPESA_PESSOAL, tuple(tags_p), None
 
-    ctx = inferir_contexto(bloco_lower)
+    ctx = inferir_contexto(msg)
     if ctx == "servico":
-        return {"tipo": "despesa_servico",
-                "dados": {"descricao": descricao, "valor": valor, "tags": [], "dias": dias,
-                          "aviso": "Tag não identificada — revise manualmente"}}
+        return TipoEvento.DESPESA_SERVICO, (), AVISO_SEM_TAG
     if ctx == "pessoal":
-        return {"tipo": "despesa_pessoal",
-                "dados": {"descricao": descricao, "valor": valor, "tags": [], "dias": dias,
-                          "aviso": "Tag não identificada — revise manualmente"}}
+        return TipoEvento.DESPESA_PESSOAL, (), AVISO_SEM_TAG
+    return TipoEvento.DESPESA, (), AVISO_SEM_TIPO
 
-    return {"tipo": "despesa",
-            "dados": {"descricao": descricao, "valor": valor, "tags": [], "dias": dias,
-                      "aviso": "Tipo e tag não identificados — revise manualmente"}}
 
+def montar_evento(decisao: tuple, msg: Mensagem, dias: list) -> Evento:
+    """Evento do bloco a partir da decisão do léxico e dos extratores do bloco."""
+    tipo, tags, aviso = decisao
+    if tipo is TipoEvento.NAO_CLASSIFICADO:
+        return Evento(tipo, descricao=msg.texto)
 
-def _evento_inconclusivo(evento: dict) -> bool:
+    valor = msg.valor
+    comum = dict(
+        valor=valor.texto if valor else "",
+        centavos=valor.centavos if valor else None,
+        dias=dias,
+    )
+    if tipo is TipoEvento.RECEITA:
+        return Evento(tipo, cliente=extract_cliente(msg), **comum)
+    return Evento(tipo, descricao=extract_descricao(msg), tags=list(tags), aviso=aviso, **comum)
+
+
+def _evento_inconclusivo(evento: Evento) -> bool:
     """Retorna True se o evento precisa do fallback Gemini."""
-    tipo = evento.get("tipo", "")
-    if tipo in ("nao_classificado", "despesa"):
+    if evento.fonte in ("gemini", "local"):
+        return False  # molde já resolvido pelo Gemini, ou classificador local
+    tipo = evento.tipo
+    if tipo in (TipoEvento.NAO_CLASSIFICADO, TipoEvento.DESPESA):
         return True
     # despesa_servico/pessoal sem tags e sem valor também é inconclusivo
-    if tipo in ("despesa_servico", "despesa_pessoal"):
-        dados = evento.get("dados", {})
-        if not dados.get("tags") and not dados.get("valor"):
+    if tipo in (TipoEvento.DESPESA_SERVICO, TipoEvento.DESPESA_PESSOAL):
+        if not evento.tags and not evento.valor:
             return True
     return False
 
 
+# ================================================================
+# CLASSIFICADOR LOCAL (core/modelo_local.py)
+# ================================================================
+
+_modelo_local = None
+_modelo_local_lock = threading.Lock()
+
+
+def _get_modelo_local() -> ModeloArquivo | None:
+    """Arquivo do modelo local, ou None com MODELO_LOCAL_PATH vazio (ou config indisponível)."""
+    global _modelo_local
+    with _modelo_local_lock:
+        if _modelo_local is None:
+            try:
+                from core.config import MODELO_LOCAL_PATH, MODELO_LOCAL_LIMIAR, MODELO_LOCAL_INTERVALO
+            except Exception as e:
+                logger.warning(f"Classificador local desligado: {e}")
+                MODELO_LOCAL_PATH = ""
+            _modelo_local = (
+                ModeloArquivo(MODELO_LOCAL_PATH, MODELO_LOCAL_LIMIAR, MODELO_LOCAL_INTERVALO)
+                if MODELO_LOCAL_PATH else False
+            )
+        return _modelo_local or None
+
+
+def iniciar_modelo_local() -> ModeloArquivo | None:
+    """Carrega o modelo local na partida, antes do event loop; depois, só troca em background."""
+    arquivo = _get_modelo_local()
+    if arquivo is not None:
+        arquivo.recarregar()
+    return arquivo
+
+
+def _classificar_local(arquivo: ModeloArquivo, msg: Mensagem, dias: list) -> Evento | None:
+    """Evento pelo modelo local, ou None se não houver modelo ou a previsão ficar abaixo do limiar."""
+    modelo = arquivo.atual()
+    if modelo is None:
+        return None
+    rotulo, prob = modelo.prever(msg.dobrado)
+    if rotulo is None:
+        metrics.MODELO_LOCAL.inc(resultado="fora_do_vocabulario")
+        return None
+    if prob < arquivo.limiar:
+        metrics.MODELO_LOCAL.inc(resultado="abaixo_do_limiar")
+        return None
+    metrics.MODELO_LOCAL.inc(resultado="aceito")
+
+    tipo, tags = tipo_e_tags(rotulo)
+    aviso = AVISO_SEM_TAG if tipo in TIPOS_COM_TAGS and not tags else None
+    ev = montar_evento((TipoEvento(tipo), tags, aviso), msg, dias)
+    ev.fonte = "local"
+    return ev
+
+
+def estatisticas_modelo_local() -> dict:
+    """Modelo carregado, limiar e quantos blocos ele resolveu antes do Gemini."""
+    modelo = _modelo_local.atual() if _modelo_local else None
+    if modelo is None:
+        return {}
+    aceitos = metrics.MODELO_LOCAL.valor(resultado="aceito")
+    consultas = aceitos + sum(
+        metrics.MODELO_LOCAL.valor(resultado=r) for r in ("abaixo_do_limiar", "fora_do_vocabulario")
+    )
+    return {
+        "exemplos": modelo.exemplos,
+        "rotulos": len(modelo.rotulos),
+        "treinado_em": modelo.treinado_em,
+        "limiar": _modelo_local.limiar,
+        "consultas": int(consultas),
+        "aceitos": int(aceitos),
+        "taxa_aceite": aceitos / consultas if consultas else 0.0,
+    }
+
+
 # ================================================================
 # CAMADA 2 — FALLBACK GEMINI
 # ================================================================
 
+_cache_gemini = None
+_cache_lock = threading.Lock()
+
+
+def _get_cache_gemini() -> CacheRespostas:
+    global _cache_gemini
+    with _cache_lock:
+        if _cache_gemini is None:
+            from core.config import (
+                GEMINI_CACHE_PATH, GEMINI_CACHE_TTL,
+                GEMINI_CACHE_MAX, GEMINI_CACHE_MAX_DISCO,
+            )
+            _cache_gemini = CacheRespostas(
+                GEMINI_CACHE_PATH or None,
+                ttl=GEMINI_CACHE_TTL,
+                max_memoria=GEMINI_CACHE_MAX,
+                max_disco=GEMINI_CACHE_MAX_DISCO,
+            )
+        return _cache_gemini
+
+
+def estatisticas_cache_gemini() -> dict:
+    """Hits/misses do cache do fallback e segundos de LLM economizados."""
+    return _cache_gemini.estatisticas() if _cache_gemini is not None else {}
+
+
+def _coletar_metricas_cache() -> list:
+    stats = estatisticas_cache_gemini()
+    if not stats:
+        return []
+    nome = "gessobot_gemini_cache"
+    return [
+        f"# HELP {nome}_consultas Consultas ao cache do fallback Gemini, por resultado.",
+        f"# TYPE {nome}_consultas counter",
+        f'{nome}_consultas_total{{resultado="hit_memoria"}} {stats["hits_memoria"]}',
+        f'{nome}_consultas_total{{resultado="hit_disco"}} {stats["hits_disco"]}',
+        f'{nome}_consultas_total{{resultado="colapsada"}} {stats["colapsadas"]}',
+        f'{nome}_consultas_total{{resultado="miss"}} {stats["misses"]}',
+        f"# HELP {nome}_entradas Entradas no LRU em memória.",
+        f"# TYPE {nome}_entradas gauge",
+        f'{nome}_entradas {stats["entradas_memoria"]}',
+    ]
+
+
+metrics.registrar_coletor(_coletar_metricas_cache)
+
+
+AVISO_GEMINI_FORA = "IA indisponível — classificado só pelas regras, revise"
+
+
 def _chamar_gemini(texto_original: str, blocos_inconclusivos: list) -> list:
     """
-    Envia os blocos inconclusivos para o Gemini e retorna eventos normalizados.
-    Retorna lista vazia em caso de erro (silencia falha graciosamente).
+    Fallback Gemini com cache: blocos já vistos (normalizados) não geram
+    nova chamada, e pedidos idênticos simultâneos viram uma só.
+    Levanta CircuitoAberto (sem esperar nada) se o Gemini estiver fora.
+    O cache guarda os eventos em JSON (Evento.to_dict).
     """
     try:
-        import google.generativeai as genai
-        from core.config import GEMINI_API_KEY
-
-        genai.configure(api_key=GEMINI_API_KEY)
-        model = genai.GenerativeModel("gemini-2.5-flash-lite")
-
-        prompt = f"""Você é um assistente de classificação financeira para um microempresário brasileiro.
-Analise o texto abaixo e extraia TODOS os eventos financeiros, mesmo em linguagem informal, gíria ou sem pontuação.
-
-TEXTO ORIGINAL COMPLETO:
-"{texto_original}"
-
-TRECHOS NÃO CLASSIFICADOS (que precisam de análise):
-{chr(10).join(f'- "{b}"' for b in blocos_inconclusivos)}
-
-Retorne APENAS um JSON válido, sem markdown, sem explicações, no formato:
-{{
-  "eventos": [
-    {{
-      "tipo": "receita" | "despesa_servico" | "despesa_pessoal" | "despesa" | "nao_classificado",
-      "dados": {{
-        "valor": "número como string ou vazio",
-        "cliente": "nome se for receita ou vazio",
-        "descricao": "descrição curta do evento",
-        "tags": ["tag1", "tag2"],
-        "dias": ["segunda", "terça", etc. ou lista vazia],
-        "aviso": "se não tiver certeza, explique aqui; senão deixe vazio"
-      }}
-    }}
-  ]
-}}
-
-REGRAS:
-- tipo "despesa_servico": gastos do negócio (funcionário, material, ferramenta, transporte da obra, imposto)
-  tags possíveis: funcionario, material, ferramenta, transporte, imposto
-- tipo "despesa_pessoal": gastos da vida pessoal
-  tags possíveis: alimentacao, moradia, saude, educacao, lazer, vestuario, internet_telefone, transporte_pessoal
-- tipo "receita": qualquer entrada de dinheiro
-- Expressões informais como "caiu grana", "me pagaram", "desembolsei", "botei", "abasteci" são válidas
-- Se o mesmo trecho tiver múltiplos eventos, retorne múltiplos objetos no array
-- Se genuinamente não for financeiro, use "nao_classificado"
-"""
+        cache = _get_cache_gemini()
+    except Exception as e:
+        logger.warning(f"Cache do Gemini indisponível: {e}")
+        return _consultar_gemini(texto_original, blocos_inconclusivos)
+
+    eventos = cache.obter_ou_calcular(
+        chave_blocos(blocos_inconclusivos),
+        lambda: [ev.to_dict() for ev in _consultar_gemini(texto_original, blocos_inconclusivos)],
+    )
+    return [Evento.from_dict(ev) for ev in eventos]
+
+
+def _consultar_gemini(texto_original: str, blocos_inconclusivos: list) -> list:
+    """
+    Envia os blocos inconclusivos ao Gemini via micro-lote: pedidos de
+    mensagens diferentes que chegam dentro da janela GEMINI_LOTE_JANELA
+    seguem num único prompt. Retorna os eventos normalizados deste pedido.
+    """
+    if DISJUNTOR_GEMINI.recusando():
+        # Nem entra no micro-lote: com o Gemini fora, a espera da janela é desperdício
+        raise CircuitoAberto("Gemini indisponível (disjuntor aberto)")
+
+    pedido = (texto_original, blocos_inconclusivos)
+    try:
+        lote = _get_lote_gemini()
+    except Exception as e:
+        logger.warning(f"Micro-lote do Gemini indisponível: {e}")
+        return _consultar_gemini_lote([pedido])[0]
+    return lote.submeter(pedido)
+
+
+_lote_gemini = None
+_lote_lock = threading.Lock()
+
+
+def _get_lote_gemini() -> MicroLote:
+    global _lote_gemini
+    with _lote_lock:
+        if _lote_gemini is None:
+            from core.config import GEMINI_LOTE_JANELA, GEMINI_LOTE_MAX
+
+            _lote_gemini = MicroLote(
+                _consultar_gemini_lote, janela=GEMINI_LOTE_JANELA, max_itens=GEMINI_LOTE_MAX
+            )
+        return _lote_gemini
 
-        response = model.generate_content(prompt)
-        raw = response.text.strip()
 
-        # Remove markdown se vier com ```json
+TIPOS_EVENTO = tuple(tipo.value for tipo in TipoEvento)
+DIAS_SEMANA = ("segunda", "terça", "quarta", "quinta", "sexta", "sábado", "domingo")
+_DIA_POR_PALAVRA = {dobrar(dia): dia for dia in DIAS_SEMANA}
+_RE_DIAS = re.compile(r'\b(' + '|'.join(_DIA_POR_PALAVRA) + r')\b')
+
+_TAGS_POR_TIPO = {
+    TipoEvento.DESPESA_SERVICO: tuple(TAGS_SERVICO_RAW),
+    TipoEvento.DESPESA_PESSOAL: tuple(TAGS_PESSOAL_RAW),
+}
+
+# Parte fixa do prompt: vai como system instruction do modelo (core/gemini.py),
+# não a cada chamada. O formato da resposta é garantido por ESQUEMA_GEMINI.
+INSTRUCAO_GEMINI = f"""Você classifica eventos financeiros de um microempresário brasileiro, escritos em linguagem informal, gíria ou sem pontuação.
+Cada pedido [Rn] traz os trechos que o classificador por regras não resolveu e, quando ajuda, o contexto (a mensagem inteira). Extraia os eventos financeiros dos trechos — o contexto serve só para entendê-los. Responda um item por pedido, com o mesmo id (ex.: "R1"), sem misturar eventos de pedidos diferentes.
+
+tipo:
+- receita: qualquer entrada de dinheiro; cliente = quem pagou
+- despesa_servico: gasto do negócio (funcionário, material, ferramenta, transporte da obra, imposto); tags: {", ".join(TAGS_SERVICO_RAW)}
+- despesa_pessoal: gasto da vida pessoal; tags: {", ".join(TAGS_PESSOAL_RAW)}
+- despesa: gasto que não dá para saber se é do negócio ou pessoal
+- nao_classificado: o trecho genuinamente não é financeiro
+
+valor: só o número, como escrito (ex.: "2.500", "80,50"), ou vazio. descricao: curta. dias: dias da semana citados. aviso: só se houver dúvida, explicando.
+Expressões como "caiu grana", "me pagaram", "desembolsei", "botei", "abasteci" são eventos válidos. Um trecho com vários eventos gera vários itens."""
+
+_TEXTO = {"type": "STRING"}
+ESQUEMA_GEMINI = {
+    "type": "OBJECT",
+    "properties": {
+        "pedidos": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "id": _TEXTO,
+                    "eventos": {
+                        "type": "ARRAY",
+                        "items": {
+                            "type": "OBJECT",
+                            "properties": {
+                                "tipo": {"type": "STRING", "format": "enum", "enum": list(TIPOS_EVENTO)},
+                                "valor": _TEXTO,
+                                "cliente": _TEXTO,
+                                "descricao": _TEXTO,
+                                "tags": {"type": "ARRAY", "items": {
+                                    "type": "STRING", "format": "enum",
+                                    "enum": [*TAGS_SERVICO_RAW, *TAGS_PESSOAL_RAW],
+                                }},
+                                "dias": {"type": "ARRAY", "items": {
+                                    "type": "STRING", "format": "enum", "enum": list(DIAS_SEMANA),
+                                }},
+                                "aviso": _TEXTO,
+                            },
+                            "required": ["tipo"],
+                        },
+                    },
+                },
+                "required": ["id", "eventos"],
+            },
+        },
+    },
+    "required": ["pedidos"],
+}
+
+
+def _so_palavras(texto: str) -> str:
+    return re.sub(r"\W+", " ", texto.lower()).strip()
+
+
+def _montar_prompt(pedidos: list) -> str:
+    """
+    Parte variável do prompt para um lote [(texto_original, blocos)], ids
+    R1..Rn. O texto original só vai como contexto quando tem algo além
+    dos próprios trechos.
+    """
+    secoes = []
+    for i, (texto_original, blocos) in enumerate(pedidos, 1):
+        linhas = [f"[R{i}]"]
+        if _so_palavras(texto_original) != _so_palavras(" ".join(blocos)):
+            linhas.append(f"contexto: {texto_original}")
+        linhas += [f"- {b}" for b in blocos]
+        secoes.append("\n".join(linhas))
+    return "\n".join(secoes)
+
+
+def normalizar_evento_gemini(ev: dict) -> Evento | None:
+    """
+    Converte um evento cru do Gemini num Evento, validando campo a campo: tags e dias fora das listas conhecidas são
+    descartados, valor sem dígito vira vazio. Retorna None se o evento
+    não for aproveitável (não é objeto ou o tipo é desconhecido).
+    Aceita o evento plano (ESQUEMA_GEMINI) ou com os campos em "dados".
+    """
+    if not isinstance(ev, dict):
+        return None
+    tipo = ev.get("tipo", "nao_classificado")
+    if tipo not in TIPOS_EVENTO:
+        return None
+    dados = ev["dados"] if isinstance(ev.get("dados"), dict) else ev
+
+    def texto(campo):
+        valor = dados.get(campo, "") or ""
+        return valor.strip() if isinstance(valor, str) else str(valor)
+
+    def lista(campo, validos):
+        itens = dados.get(campo, []) or []
+        if not isinstance(itens, list):
+            return []
+        return [i for i in itens if isinstance(i, str) and i in validos]
+
+    valor = texto("valor")
+    return Evento(
+        tipo,
+        valor=valor if re.search(r"\d", valor) else "",
+        cliente=texto("cliente"),
+        descricao=texto("descricao"),
+        tags=lista("tags", _TAGS_POR_TIPO.get(tipo, ())),
+        dias=lista("dias", DIAS_SEMANA),
+        aviso=texto("aviso"),
+        fonte="gemini",  # marca para rastreabilidade
+    )
+
+
+def _ler_resposta_gemini(raw: str, n_pedidos: int) -> list:
+    """
+    Eventos normalizados de cada pedido, na ordem R1..Rn. Pedidos e
+    eventos inválidos são descartados um a um — o resto do lote vale.
+    Levanta ValueError só se a resposta não for JSON.
+    """
+    try:
+        parsed = json.loads(raw)
+    except json.JSONDecodeError:
+        # Sem response_schema (ex.: modelos antigos), pode vir com ```json
         raw = re.sub(r'^```(?:json)?\s*', '', raw, flags=re.MULTILINE)
         raw = re.sub(r'\s*```$', '', raw, flags=re.MULTILINE)
-
         parsed = json.loads(raw)
-        eventos = parsed.get("eventos", [])
-
-        # Normaliza e valida cada evento
-        resultado = []
-        for ev in eventos:
-            tipo = ev.get("tipo", "nao_classificado")
-            dados = ev.get("dados", {})
-            resultado.append({
-                "tipo": tipo,
-                "dados": {
-                    "valor":     str(dados.get("valor", "") or ""),
-                    "cliente":   str(dados.get("cliente", "") or ""),
-                    "descricao": str(dados.get("descricao", "") or ""),
-                    "tags":      list(dados.get("tags", []) or []),
-                    "dias":      list(dados.get("dias", []) or []),
-                    "aviso":     str(dados.get("aviso", "") or ""),
-                    "fonte":     "gemini",  # marca para rastreabilidade
-                }
-            })
-        return resultado
-
+    if not isinstance(parsed, dict):
+        raise ValueError(f"resposta do Gemini não é um objeto: {type(parsed).__name__}")
+
+    # Lote de um pedido: aceita também o formato antigo {"eventos": [...]}
+    if "pedidos" not in parsed and n_pedidos == 1:
+        parsed = {"pedidos": [{"id": "R1", "eventos": parsed.get("eventos", [])}]}
+
+    por_id = {}
+    for pedido in parsed.get("pedidos") or []:
+        if isinstance(pedido, dict) and isinstance(pedido.get("eventos"), list):
+            por_id[str(pedido.get("id", "")).strip(" []")] = pedido["eventos"]
+
+    resultado = []
+    descartados = 0
+    for i in range(1, n_pedidos + 1):
+        normalizados = [normalizar_evento_gemini(ev) for ev in por_id.get(f"R{i}", [])]
+        descartados += normalizados.count(None)
+        resultado.append([ev for ev in normalizados if ev is not None])
+    if descartados:
+        metrics.GEMINI_EVENTOS_DESCARTADOS.inc(descartados)
+        logger.warning(f"Gemini: {descartados} evento(s) inválido(s) descartado(s).")
+    return resultado
+
+
+def _consultar_gemini_lote(pedidos: list) -> list:
+    """
+    Faz uma chamada ao Gemini para o lote inteiro e devolve, na ordem dos
+    pedidos, a lista de eventos normalizados de cada um.
+    Se a chamada falhar ou a resposta não for JSON, todos recebem lista
+    vazia (silencia falha graciosamente); eventos inválidos são
+    descartados um a um em _ler_resposta_gemini.
+    """
+    vazios = [[] for _ in pedidos]
+    try:
+        cliente = obter_cliente_gemini()
+        if len(pedidos) > 1:
+            logger.info(f"Gemini: lote com {len(pedidos)} pedido(s).")
+
+        inicio = time.perf_counter()
+        try:
+            raw = DISJUNTOR_GEMINI.chamar(cliente.gerar, _montar_prompt(pedidos)).strip()
+        except PrazoEsgotado:
+            metrics.GEMINI_SEGUNDOS.observar(time.perf_counter() - inicio, resultado="prazo")
+            raise
+        except CotaEsgotada:
+            metrics.GEMINI_SEGUNDOS.observar(time.perf_counter() - inicio, resultado="cota")
+            raise
+        except CircuitoAberto:
+            raise
+        except Exception:
+            metrics.GEMINI_SEGUNDOS.observar(time.perf_counter() - inicio, resultado="erro")
+            raise
+        metrics.GEMINI_SEGUNDOS.observar(time.perf_counter() - inicio, resultado="ok")
+
+        return _ler_resposta_gemini(raw, len(pedidos))
+
+    except PrazoEsgotado as e:
+        logger.warning(f"Fallback Gemini sem resposta no prazo, mantendo regex: {e}")
+        return vazios
+    except CotaEsgotada as e:
+        logger.warning(f"Fallback Gemini sem cota, mantendo regex: {e}")
+        return vazios
+    except CircuitoAberto:
+        raise  # classify_text marca os eventos com aviso
     except Exception as e:
         logger.warning(f"Fallback Gemini falhou: {e}")
-        return []
+        return vazios
+
+
+# ================================================================
+# CAMINHO RÁPIDO POR MOLDE (core/moldes.py)
+#
+# Lacunas de um bloco: valores (tipo pela prioridade do tokenizador),
+# dias da semana e palavras com inicial maiúscula (nomes próprios). Para
+# o esqueleto do Gemini, nome só vale como lacuna se for o cliente.
+# Trecho que o léxico poderia casar — sozinho ou emendado com o texto
+# vizinho ("99", "Mercado", "Mão" em "Mão de obra") — fica literal no
+# molde: blocos do mesmo molde têm sempre a mesma decisão do léxico.
+# ================================================================
+
+_moldes = None
+_moldes_lock = threading.Lock()
+
+
+def _get_moldes() -> CacheMoldes | None:
+    """LRU de moldes, ou None com MOLDES_MAX=0 (ou config indisponível)."""
+    global _moldes
+    with _moldes_lock:
+        if _moldes is None:
+            try:
+                from core.config import MOLDES_MAX
+            except Exception as e:
+                logger.warning(f"Cache de moldes desligado: {e}")
+                MOLDES_MAX = 0
+            _moldes = CacheMoldes(MOLDES_MAX) if MOLDES_MAX > 0 else False
+        return _moldes or None
+
+
+def estatisticas_moldes() -> dict:
+    """Acertos (por origem do esqueleto), faltas e µs por bloco em cada caso."""
+    return _moldes.estatisticas() if _moldes else {}
+
+
+def _pedacos_do_lexico() -> tuple:
+    """
+    Entradas do léxico (dobradas) e os pedaços delas que podem cair numa
+    lacuna quando a entrada começa antes (cauda, depois de um separador)
+    ou termina depois dela (cabeça, até um separador).
+    """
+    entradas = set()
+    for lista in (PALAVRAS_RECEITA, PALAVRAS_DESPESA, CONTEXTO_SERVICO, CONTEXTO_PESSOAL):
+        entradas.update(dobrar(p) for p in lista)
+    for mapa in (TAGS_SERVICO_RAW, TAGS_PESSOAL_RAW):
+        for entries in mapa.values():
+            entradas.update(dobrar(p) for p, _ in entries)
+
+    caudas, cabecas = set(entradas), set(entradas)
+    for e in entradas:
+        for i, c in enumerate(e):
+            if not (c.isalnum() or c == "_"):
+                caudas.add(e[i + 1:])
+                cabecas.add(e[:i])
+    caudas.discard("")
+    cabecas.discard("")
+    return entradas, caudas, cabecas
+
+
+def _ate_separador(pedacos, reverso=False) -> set:
+    """Trechos de lacuna que um pedaço cobre inteiro e ainda continua depois (antes)."""
+    cortes = set(pedacos)
+    for p in pedacos:
+        for i, c in enumerate(p):
+            if not (c.isalnum() or c == "_"):
+                cortes.add(p[i + 1:] if reverso else p[:i])
+    cortes.discard("")
+    return cortes
+
+
+def _alternacao(pedacos) -> re.Pattern:
+    return re.compile('|'.join(map(re.escape, sorted(pedacos, key=len, reverse=True))))
+
+
+_ENTRADAS, _CAUDAS, _CABECAS = _pedacos_do_lexico()
+_RE_ENTRADA_NA_LACUNA = _alternacao(_ENTRADAS)
+_RE_CAUDA_NO_INICIO = _alternacao(_CAUDAS)
+_RE_CABECA_NO_FIM_INVERTIDA = _alternacao(p[::-1] for p in _CABECAS)
+_CAUDAS_ATE_SEPARADOR = _ate_separador(_CAUDAS)
+_CABECAS_DESDE_SEPARADOR = _ate_separador(_CABECAS, reverso=True)
+
+_RE_NOME_PROPRIO = re.compile(r'\b[A-ZÁÉÍÓÚÂÊÔÃÕÇ][a-záéíóúâêôãõç]{2,}\b')
+_RE_DIGITO = re.compile(r'\d')
+
+
+@lru_cache(maxsize=4096)
+def _lacuna_fixa(trecho: str) -> bool:
+    """True se o trecho (dobrado) pode fazer parte de um acerto do léxico."""
+    return (
+        _RE_ENTRADA_NA_LACUNA.search(trecho) is not None
+        or _RE_CAUDA_NO_INICIO.match(trecho) is not None
+        or _RE_CABECA_NO_FIM_INVERTIDA.match(trecho[::-1]) is not None
+        or trecho in _CAUDAS_ATE_SEPARADOR
+        or trecho in _CABECAS_DESDE_SEPARADOR
+    )
+
+
+def molde_do_bloco(msg: Mensagem) -> Molde:
+    """Molde do bloco: valores, dias e nomes livres do léxico viram lacunas."""
+    # Só o número: o "R$" antes dele fica literal
+    achados = [(v.fim - len(v.texto), v.fim, f"V{v.prioridade}") for v in msg.valores]
+    # Dia com inicial maiúscula ("Quinta") é outro molde: pode ser lido como nome
+    achados += [(m.start(), m.end(), "D" if msg.texto[m.start()].isupper() else "d")
+                for m in _RE_DIAS.finditer(msg.dobrado)]
+    achados += [(m.start(), m.end(), "N") for m in _RE_NOME_PROPRIO.finditer(msg.texto)]
+    lacunas, livre_desde = [], 0
+    for inicio, fim, tipo in sorted(achados):
+        if inicio < livre_desde or _lacuna_fixa(msg.dobrado[inicio:fim]):
+            continue
+        lacunas.append((inicio, fim, tipo, msg.texto[inicio:fim]))
+        livre_desde = fim
+    return montar_molde(msg.texto, lacunas)
+
+
+def _registrar_molde(moldes: CacheMoldes, resultado: str, inicio: float) -> None:
+    segundos = time.perf_counter() - inicio
+    moldes.registrar(resultado, segundos)
+    metrics.MOLDE_SEGUNDOS.observar(segundos, resultado=resultado)
+
+
+_CAMPOS_DE_TEXTO = ("valor", "cliente", "descricao", "aviso")
+
+
+def _esqueleto_gemini(eventos: list, molde: Molde, dias_do_bloco: list) -> tuple | None:
+    """
+    Eventos do Gemini para um bloco com os textos das lacunas trocados por
+    marcadores, como (evento, dias_vem_do_texto). None se algum campo não
+    se generaliza: número que não veio de lacuna, nome de lacuna reescrito
+    pelo Gemini ("Ze" para "Zé") ou dias que não são os do texto.
+
+    Também None se uma lacuna de nome não é o cliente de algum evento: aí
+    o nome pode ser uma loja ou marca que decidiu as tags ("na Renner" →
+    vestuario), e outro nome no mesmo molde teria outra classificação.
+    """
+    clientes = {ev.cliente for ev in eventos}
+    if any(tipo == "N" and lacuna not in clientes for lacuna, tipo in zip(molde.lacunas, molde.tipos)):
+        return None
+
+    dobradas = [dobrar(lacuna) for lacuna in molde.lacunas]
+    dobrado_molde = dobrar(molde.chave)
+    esqueleto = []
+    for ev in eventos:
+        campos = {}
+        for campo in _CAMPOS_DE_TEXTO:
+            texto = getattr(ev, campo)
+            if texto:
+                texto = abstrair(texto, molde.lacunas)
+                dobrado = dobrar(texto)
+                if any(lacuna in dobrado for lacuna in dobradas):
+                    return None
+                if campo != "aviso" and _RE_DIGITO.search(texto):
+                    return None
+                if campo == "cliente" and texto == ev.cliente and dobrado not in dobrado_molde:
+                    return None
+            campos[campo] = texto
+        dias_do_texto = ev.dias == dias_do_bloco
+        if not dias_do_texto and any(dobrar(l) in _DIA_POR_PALAVRA for l in molde.lacunas):
+            return None
+        esqueleto.append((ev.copia(**campos), dias_do_texto))
+    return tuple(esqueleto)
+
+
+def _preencher_esqueleto(esqueleto: tuple, molde: Molde, dias: list) -> list:
+    """Eventos de um esqueleto do Gemini com as lacunas do bloco atual."""
+    eventos = []
+    for ev, dias_do_texto in esqueleto:
+        campos = {
+            campo: preencher(getattr(ev, campo), molde.lacunas)
+            for campo in _CAMPOS_DE_TEXTO if getattr(ev, campo)
+        }
+        eventos.append(ev.copia(
+            tags=list(ev.tags) if ev.tags is not None else None,
+            dias=list(dias if dias_do_texto else ev.dias or []),
+            **campos,
+        ))
+    return eventos
+
+
+def _aprender_com_gemini(parcial: dict, eventos_gemini: list) -> None:
+    """
+    Guarda o esqueleto da resposta do Gemini quando ela veio de um só
+    bloco inconclusivo. Com vários, a resposta não diz de qual bloco é
+    cada evento — o Gemini pode juntar um e dividir outro mantendo a
+    contagem — e um esqueleto trocado valeria para toda mensagem daquele
+    formato.
+    """
+    moldes = _get_moldes()
+    moldes_blocos = parcial.get("moldes")
+    blocos = parcial["inconclusivos"]
+    if not moldes or not moldes_blocos or len(blocos) != 1 or len(moldes_blocos) != 1:
+        return
+    molde = moldes_blocos[0]
+    esqueleto = _esqueleto_gemini(eventos_gemini, molde, extract_dias(blocos[0]))
+    if esqueleto is not None:
+        moldes.guardar(molde.chave, "gemini", esqueleto)
 
 
 # ================================================================
@@ -703,41 +1307,154 @@ def classify_text(texto: str) -> list:
                                  educacao | lazer | vestuario | internet_telefone
         despesa          — genérica, não classificada (requer revisão)
         nao_classificado — frase não reconhecida como financeira
+
+    Retorna uma lista de Evento (core/evento.py); to_dict() dá o formato
+    {"tipo": ..., "dados": {...}} para quem precisa de dicionário.
+
+    As etapas 1–2 e 3–4 também estão expostas separadamente
+    (classificar_regex / concluir_classificacao) para o modo pipeline do
+    bot, que grava os eventos já conclusivos enquanto o Gemini responde.
+    """
+    return concluir_classificacao(classificar_regex(texto))
+
+
+def classificar_regex(texto: str) -> dict:
+    """
+    Etapas 1–2: split e camada regex, sem rede. Retorna a classificação
+    parcial que concluir_classificacao() completa:
+    {"texto": ..., "eventos": [...], "inconclusivos": [...blocos...],
+     "moldes": [...molde de cada inconclusivo...], "cpu": s}
+    Blocos cujo molde (core/moldes.py) já foi resolvido reaproveitam a
+    decisão do léxico ou os eventos do Gemini.
+    Blocos que o regex não resolve passam pelo classificador local antes
+    de entrar em "inconclusivos".
     """
+    # thread_time: só CPU desta thread — a espera pelo Gemini não entra
+    cpu_inicio = time.thread_time()
+    blocos = split_intencoes(texto)
+    metrics.SPLIT_CPU_SEGUNDOS.observar(time.thread_time() - cpu_inicio)
+
     eventos = []
     blocos_inconclusivos = []
+    moldes_inconclusivos = []
+    blocos_regex = blocos_molde = blocos_local = 0
+    moldes = _get_moldes()
+    modelo_local = _get_modelo_local()
 
-    for bloco in split_intencoes(texto):
+    for bloco in blocos:
         bloco = bloco.strip()
         if not bloco:
             continue
 
-        bloco_lower = bloco.lower()
-        valor = extract_valor(bloco)
-        dias = re.findall(
-            r'\b(segunda|terça|quarta|quinta|sexta|sábado|domingo)\b',
-            bloco_lower
-        )
-
-        if _contem_alguma(bloco_lower, PALAVRAS_RECEITA):
-            ev = classificar_receita(bloco, bloco_lower, valor, dias)
-        elif _contem_alguma(bloco_lower, PALAVRAS_DESPESA):
-            ev = classificar_despesa(bloco, bloco_lower, valor, dias)
+        inicio = time.perf_counter()
+        # Preparado uma vez; todos os extratores leem desta Mensagem
+        msg = Mensagem(bloco)
+        dias = extract_dias(msg)
+
+        molde = molde_do_bloco(msg) if moldes else None
+        item = moldes.obter(molde.chave) if moldes else None
+        if item is not None and item[0] == "gemini":
+            # Molde já resolvido pelo Gemini: nem léxico nem fallback
+            eventos.extend(_preencher_esqueleto(item[1], molde, dias))
+            blocos_molde += 1
+            _registrar_molde(moldes, "gemini", inicio)
+            continue
+
+        if item is not None:
+            decisao = item[1]
         else:
-            ev = {"tipo": "nao_classificado", "dados": {"descricao": bloco}}
+            decisao = decidir(msg)
+            if moldes:
+                moldes.guardar(molde.chave, "regex", decisao)
+        ev = montar_evento(decisao, msg, dias)
 
-        # Marca inconclusivos para o Gemini
+        # Marca inconclusivos para o Gemini (se o modelo local não resolver)
         if _evento_inconclusivo(ev):
-            blocos_inconclusivos.append(bloco)
+            local = _classificar_local(modelo_local, msg, dias) if modelo_local else None
+            if local is not None:
+                ev = local
+                blocos_local += 1
+            else:
+                blocos_inconclusivos.append(bloco)
+                moldes_inconclusivos.append(molde)
+        else:
+            blocos_regex += 1
 
         eventos.append(ev)
+        if moldes:
+            _registrar_molde(moldes, "regex" if item is not None else "falta", inicio)
+
+    metrics.BLOCOS.inc(blocos_regex, camada="regex")
+    metrics.BLOCOS.inc(blocos_molde, camada="molde")
+    metrics.BLOCOS.inc(blocos_local, camada="local")
+    metrics.BLOCOS.inc(len(blocos_inconclusivos), camada="fallback")
+
+    return {
+        "texto": texto,
+        "eventos": eventos,
+        "inconclusivos": blocos_inconclusivos,
+        "moldes": moldes_inconclusivos,
+        "cpu": time.thread_time() - cpu_inicio,
+    }
+
+
+def _inicio_de_merge(ev: Evento) -> bool:
+    """Despesa com tag mas sem valor: pode absorver o valor do evento seguinte."""
+    return (
+        not ev.valor
+        and bool(ev.tags)
+        and ev.tipo in (TipoEvento.DESPESA_PESSOAL, TipoEvento.DESPESA_SERVICO)
+    )
+
+
+def _fim_de_merge(ev: Evento) -> bool:
+    """Despesa com valor mas sem tag: pode ceder o valor ao evento anterior."""
+    return (
+        bool(ev.valor)
+        and not ev.tags
+        and ev.tipo in (TipoEvento.DESPESA, TipoEvento.DESPESA_PESSOAL, TipoEvento.DESPESA_SERVICO)
+    )
+
+
+def eventos_definitivos(parcial: dict) -> list:
+    """
+    Eventos da camada regex que saem de concluir_classificacao() como
+    estão (mesmo objeto), seja qual for a resposta do Gemini: os
+    conclusivos que não podem entrar em nenhum merge. Os candidatos a
+    merge ficam de fora — o vizinho deles pode ser um bloco que o Gemini
+    ainda vai reescrever.
+    """
+    return [
+        ev for ev in parcial["eventos"]
+        if not _evento_inconclusivo(ev) and not _inicio_de_merge(ev) and not _fim_de_merge(ev)
+    ]
+
+
+def concluir_classificacao(parcial: dict) -> list:
+    """
+    Etapas 3–4: fallback Gemini para os blocos inconclusivos e merge.
+    Os eventos de eventos_definitivos(parcial) voltam na lista final como
+    os mesmos objetos, para quem já os gravou poder reconhecê-los.
+    """
+    cpu_inicio = time.thread_time()
+    texto = parcial["texto"]
+    eventos = parcial["eventos"]
+    blocos_inconclusivos = parcial["inconclusivos"]
 
     # ── Fallback Gemini para inconclusivos ───────────────────────
     if blocos_inconclusivos:
         logger.info(f"Gemini fallback acionado para {len(blocos_inconclusivos)} bloco(s).")
-        eventos_gemini = _chamar_gemini(texto, blocos_inconclusivos)
+        try:
+            eventos_gemini = _chamar_gemini(texto, blocos_inconclusivos)
+        except CircuitoAberto:
+            eventos_gemini = []
+            for ev in eventos:
+                if _evento_inconclusivo(ev):
+                    ev.aviso = " · ".join(filter(None, [ev.aviso, AVISO_GEMINI_FORA]))
 
         if eventos_gemini:
+            _aprender_com_gemini(parcial, eventos_gemini)
+
             # Substitui os eventos inconclusivos pelos do Gemini
             eventos_finais = []
             gemini_idx = 0
@@ -758,35 +1475,20 @@ def classify_text(texto: str) -> list:
     i = 0
     while i < len(eventos):
         ev = eventos[i]
-        dados = ev.get("dados", {})
-
-        if (
-            i + 1 < len(eventos)
-            and not dados.get("valor")
-            and dados.get("tags")
-            and ev["tipo"] in ("despesa_pessoal", "despesa_servico")
-        ):
+
+        if i + 1 < len(eventos) and _inicio_de_merge(ev) and _fim_de_merge(eventos[i + 1]):
             prox = eventos[i + 1]
-            pd = prox.get("dados", {})
-            if (
-                pd.get("valor")
-                and not pd.get("tags")
-                and prox["tipo"] in ("despesa", "despesa_pessoal", "despesa_servico")
-            ):
-                ev_merged = {
-                    "tipo": ev["tipo"],
-                    "dados": {
-                        **dados,
-                        "valor": pd["valor"],
-                        "descricao": (dados.get("descricao", "") + " " + pd.get("descricao", "")).strip(),
-                    }
-                }
-                ev_merged["dados"].pop("aviso", None)
-                eventos_merged.append(ev_merged)
-                i += 2
-                continue
+            eventos_merged.append(ev.copia(
+                valor=prox.valor,
+                centavos=prox.centavos,
+                descricao=((ev.descricao or "") + " " + (prox.descricao or "")).strip(),
+                aviso=None,
+            ))
+            i += 2
+            continue
 
         eventos_merged.append(ev)
         i += 1
 
+    metrics.CLASSIFY_CPU_SEGUNDOS.observar(parcial["cpu"] + time.thread_time() - cpu_inicio)
     return eventos_merged
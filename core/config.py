@@ -6,17 +6,109 @@ load_dotenv()
 # ── Telegram ───────────────────────────────────────────────
 TELEGRAM_TOKEN     = os.getenv("TELEGRAM_TOKEN")
 AUTHORIZED_USER_ID = os.getenv("AUTHORIZED_USER_ID")
+# Como os updates chegam: "polling" (getUpdates) ou "webhook" (servidor
+# HTTP embutido do python-telegram-bot, atrás de proxy/load balancer)
+BOT_MODO           = os.getenv("BOT_MODO", "polling").lower()
+# URL pública base (ex.: https://bot.exemplo.com); o caminho é anexado
+WEBHOOK_URL        = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_CAMINHO    = os.getenv("WEBHOOK_CAMINHO", "telegram")
+WEBHOOK_ESCUTA     = os.getenv("WEBHOOK_ESCUTA", "0.0.0.0")
+WEBHOOK_PORTA      = int(os.getenv("WEBHOOK_PORTA", "8443"))
+# Enviado pelo Telegram no header X-Telegram-Bot-Api-Secret-Token;
+# requisições sem ele (ou com outro valor) recebem 403
+WEBHOOK_SEGREDO    = os.getenv("WEBHOOK_SEGREDO", "")
 
 # ── Google Sheets ──────────────────────────────────────────
 SHEETS_CREDENTIALS_PATH = os.getenv("SHEETS_CREDENTIALS_PATH", "credentials.json")
 SPREADSHEET_ID          = os.getenv("SPREADSHEET_ID")
+# Validade (s) dos handles de Spreadsheet/Worksheet em cache
+SHEETS_CACHE_TTL        = float(os.getenv("SHEETS_CACHE_TTL", "600"))
+# Write-behind: linhas vão primeiro para um journal SQLite local e são
+# enviadas ao Sheets em segundo plano ("0" desliga e grava direto)
+SHEETS_WRITE_BEHIND     = os.getenv("SHEETS_WRITE_BEHIND", "1") == "1"
+SHEETS_JOURNAL_PATH     = os.getenv("SHEETS_JOURNAL_PATH", "gessobot_journal.db")
+SHEETS_FLUSH_INTERVALO  = float(os.getenv("SHEETS_FLUSH_INTERVALO", "2"))
+# Cota de requisições por minuto (0 = sem limite) e espera máxima (s) por
+# uma ficha; passando disso a linha fica no journal para depois
+SHEETS_COTA_POR_MINUTO  = float(os.getenv("SHEETS_COTA_POR_MINUTO", "60"))
+SHEETS_COTA_ESPERA      = float(os.getenv("SHEETS_COTA_ESPERA", "30"))
 
 # ── Gemini ─────────────────────────────────────────────────
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_MODELO  = os.getenv("GEMINI_MODELO", "gemini-2.5-flash-lite")
+# Prazo (s) por chamada; ao estourar, fica valendo o resultado do regex
+GEMINI_PRAZO   = float(os.getenv("GEMINI_PRAZO", "10"))
+# Hedge: dispara uma 2ª requisição quando a 1ª passa do p95 observado
+GEMINI_HEDGE   = os.getenv("GEMINI_HEDGE", "0") == "1"
+# Cotas por minuto (requisições e tokens; 0 = sem limite). Sem cota
+# dentro de GEMINI_COTA_ESPERA (s), fica valendo o resultado do regex
+GEMINI_RPM         = float(os.getenv("GEMINI_RPM", "15"))
+GEMINI_TPM         = float(os.getenv("GEMINI_TPM", "250000"))
+GEMINI_COTA_ESPERA = float(os.getenv("GEMINI_COTA_ESPERA", "2"))
+# Micro-lote: pedidos de mensagens diferentes dentro da janela (s) vão
+# num único prompt (0 = só agrupa o que chegar exatamente junto)
+GEMINI_LOTE_JANELA = float(os.getenv("GEMINI_LOTE_JANELA", "0.05"))
+GEMINI_LOTE_MAX    = int(os.getenv("GEMINI_LOTE_MAX", "8"))
+# Cache de respostas do fallback (vazio em GEMINI_CACHE_PATH = só memória)
+GEMINI_CACHE_PATH       = os.getenv("GEMINI_CACHE_PATH", "gessobot_gemini_cache.db")
+GEMINI_CACHE_TTL        = float(os.getenv("GEMINI_CACHE_TTL", str(7 * 24 * 3600)))
+GEMINI_CACHE_MAX        = int(os.getenv("GEMINI_CACHE_MAX", "1000"))
+GEMINI_CACHE_MAX_DISCO  = int(os.getenv("GEMINI_CACHE_MAX_DISCO", "50000"))
+# Caminho rápido por molde: blocos que só diferem em valores, dias e nomes
+# reaproveitam a classificação já resolvida (nº de moldes no LRU; 0 desliga)
+MOLDES_MAX              = int(os.getenv("MOLDES_MAX", "2000"))
+# Classificador local (treinar_modelo.py) antes do Gemini: só aceita a
+# previsão com probabilidade >= MODELO_LOCAL_LIMIAR. Sem o arquivo, desligado;
+# o arquivo é relido quando muda (MODELO_LOCAL_INTERVALO s entre conferências)
+MODELO_LOCAL_PATH       = os.getenv("MODELO_LOCAL_PATH", "gessobot_modelo_local.json")
+MODELO_LOCAL_LIMIAR     = float(os.getenv("MODELO_LOCAL_LIMIAR", "0.9"))
+MODELO_LOCAL_INTERVALO  = float(os.getenv("MODELO_LOCAL_INTERVALO", "5"))
+
+# ── Pipeline assíncrono ────────────────────────────────────
+# Nº de threads que executam as etapas bloqueantes (classificação, Sheets)
+# fora do event loop do Telegram.
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "4"))
+# Grava os eventos que o regex já resolveu enquanto o Gemini classifica o
+# resto da mensagem ("0" espera a classificação inteira antes de gravar)
+PIPELINE_GRAVAR_ANTES = os.getenv("PIPELINE_GRAVAR_ANTES", "1") == "1"
+# Resposta progressiva: confirma na hora com a leitura do regex e edita a
+# mesma mensagem quando Gemini/Sheets terminam ("0" responde só no fim).
+# Edições da mesma conversa ficam a pelo menos RESPOSTA_EDICAO_INTERVALO s.
+RESPOSTA_PROGRESSIVA      = os.getenv("RESPOSTA_PROGRESSIVA", "1") == "1"
+RESPOSTA_EDICAO_INTERVALO = float(os.getenv("RESPOSTA_EDICAO_INTERVALO", "1"))
+# Updates processados ao mesmo tempo (chats diferentes; dentro de um chat
+# a ordem de chegada é sempre preservada) e limite da fila de cada chat.
+UPDATES_CONCORRENTES  = int(os.getenv("UPDATES_CONCORRENTES", "8"))
+UPDATES_POR_CHAT      = int(os.getenv("UPDATES_POR_CHAT", "20"))
+UPDATES_PENDENTES_MAX = int(os.getenv("UPDATES_PENDENTES_MAX", "1000"))
+
+# ── Disjuntores (Gemini e Sheets) ──────────────────────────
+# Falhas seguidas para abrir; tempo (s) aberto antes de sondar a volta,
+# dobrando a cada sonda que falha até DISJUNTOR_TEMPO_MAX.
+DISJUNTOR_FALHAS     = int(os.getenv("DISJUNTOR_FALHAS", "5"))
+DISJUNTOR_TEMPO      = float(os.getenv("DISJUNTOR_TEMPO", "30"))
+DISJUNTOR_TEMPO_MAX  = float(os.getenv("DISJUNTOR_TEMPO_MAX", "300"))
+
+# ── Métricas ───────────────────────────────────────────────
+# Porta do endpoint /metrics (formato Prometheus); 0 desliga.
+METRICS_PORTA    = int(os.getenv("METRICS_PORTA", "0"))
+METRICS_ENDERECO = os.getenv("METRICS_ENDERECO", "127.0.0.1")
+
+# ── Profiling ──────────────────────────────────────────────
+# 1 a cada N mensagens é perfilada continuamente (0 desliga); o acumulado
+# sai no /profile sem argumentos. PROFILE_MAX_SEGUNDOS limita o /profile <s>.
+PROFILE_1_EM_N       = int(os.getenv("PROFILE_1_EM_N", "0"))
+PROFILE_MAX_SEGUNDOS = float(os.getenv("PROFILE_MAX_SEGUNDOS", "120"))
 
 # ── Validações ─────────────────────────────────────────────
 if not TELEGRAM_TOKEN:
     raise ValueError("❌ TELEGRAM_TOKEN não definido no .env")
 if not SPREADSHEET_ID:
     raise ValueError("❌ SPREADSHEET_ID não definido no .env")
+if BOT_MODO not in ("polling", "webhook"):
+    raise ValueError(f"❌ BOT_MODO inválido: {BOT_MODO!r} (use polling ou webhook)")
+if BOT_MODO == "webhook" and not WEBHOOK_URL:
+    raise ValueError("❌ WEBHOOK_URL não definido no .env (obrigatório com BOT_MODO=webhook)")
+if BOT_MODO == "webhook" and not WEBHOOK_SEGREDO:
+    raise ValueError("❌ WEBHOOK_SEGREDO não definido no .env (obrigatório com BOT_MODO=webhook)")
 # GEMINI_API_KEY é opcional — fallback simplesmente não será acionado sem ela
@@ -0,0 +1,197 @@
+"""
+core/disjuntor.py — Disjuntores (circuit breakers) das dependências externas.
+
+Com o Gemini ou o Sheets fora do ar, cada chamada pagaria o prazo inteiro
+até falhar. O disjuntor conta falhas seguidas e, passado o limite, abre:
+as chamadas seguintes falham na hora com CircuitoAberto e quem chamou
+degrada (regex com aviso, linha no journal).
+
+Estados:
+  fechado      — chamadas passam; `falhas_para_abrir` falhas seguidas abrem
+  aberto       — chamadas são recusadas por `tempo_aberto` segundos
+  meio_aberto  — uma única chamada de teste; sucesso fecha, falha reabre
+                 com o tempo dobrado (até `tempo_aberto_max`)
+
+Com `sonda`, o teste do meio-aberto é feito por ela numa thread própria,
+e nenhuma mensagem de usuário paga a latência de testar uma dependência
+que ainda pode estar fora. Sem sonda, a primeira chamada após o tempo
+aberto é o teste.
+"""
+
+import time
+import logging
+import threading
+
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+FECHADO = "fechado"
+MEIO_ABERTO = "meio_aberto"
+ABERTO = "aberto"
+
+_VALOR_ESTADO = {FECHADO: 0, MEIO_ABERTO: 1, ABERTO: 2}
+
+
+class CircuitoAberto(Exception):
+    """A dependência está com o disjuntor aberto; a chamada nem foi feita."""
+
+
+class Disjuntor:
+
+    def __init__(
+        self,
+        nome: str,
+        falhas_para_abrir: int = 5,
+        tempo_aberto: float = 30.0,
+        tempo_aberto_max: float = 300.0,
+        sonda=None,
+        conta_como_falha=None,
+    ):
+        self.nome = nome
+        self.falhas_para_abrir = falhas_para_abrir
+        self.tempo_aberto = tempo_aberto
+        self.tempo_aberto_max = tempo_aberto_max
+        self.sonda = sonda
+        self.conta_como_falha = conta_como_falha or (lambda e: True)
+        self._lock = threading.Lock()
+        self._estado = FECHADO
+        self._falhas = 0
+        self._reabrir_em = 0.0
+        self._tempo_atual = tempo_aberto
+        self._testando = False
+        metrics.DISJUNTOR_ESTADO.definir(0, dependencia=nome)
+        _DISJUNTORES.append(self)
+
+    @property
+    def estado(self) -> str:
+        return self._estado
+
+    def _mudar(self, estado: str) -> None:
+        # Chamado com self._lock adquirido
+        if estado != self._estado:
+            logger.warning(f"Disjuntor '{self.nome}': {self._estado} → {estado}.")
+            self._estado = estado
+            metrics.DISJUNTOR_ESTADO.definir(_VALOR_ESTADO[estado], dependencia=self.nome)
+
+    def _abrir(self, dobrar: bool) -> None:
+        # Chamado com self._lock adquirido
+        if dobrar:
+            self._tempo_atual = min(self._tempo_atual * 2, self.tempo_aberto_max)
+        self._reabrir_em = time.monotonic() + self._tempo_atual
+        self._testando = False
+        self._mudar(ABERTO)
+
+    # ── Decisão ───────────────────────────────────────────────
+
+    def recusando(self) -> bool:
+        """
+        True se uma chamada agora seria recusada. Sem sonda, não consome a
+        chamada de teste; com sonda, dispara a sonda se já for a hora.
+        """
+        if self.sonda is not None:
+            return not self.permitir()
+        with self._lock:
+            if self._estado == FECHADO:
+                return False
+            return self._testando or time.monotonic() < self._reabrir_em
+
+    def permitir(self) -> bool:
+        """Decide se a chamada pode ir; no meio-aberto, só a de teste vai."""
+        with self._lock:
+            if self._estado == FECHADO:
+                return True
+            if self._testando or time.monotonic() < self._reabrir_em:
+                return False
+            self._testando = True
+            self._mudar(MEIO_ABERTO)
+            if self.sonda is None:
+                return True  # esta chamada é o teste
+        threading.Thread(target=self._sondar, name=f"gessobot-sonda-{self.nome}", daemon=True).start()
+        return False
+
+    # ── Resultado ─────────────────────────────────────────────
+
+    def registrar_sucesso(self) -> None:
+        with self._lock:
+            self._falhas = 0
+            self._testando = False
+            self._tempo_atual = self.tempo_aberto
+            self._mudar(FECHADO)
+
+    def registrar_falha(self) -> None:
+        with self._lock:
+            self._falhas += 1
+            if self._estado == MEIO_ABERTO:
+                self._abrir(dobrar=True)
+            elif self._estado == FECHADO and self._falhas >= self.falhas_para_abrir:
+                self._abrir(dobrar=False)
+
+    def _liberar_teste(self) -> None:
+        """Teste sem veredito (ex.: sem cota): volta a aberto, pronto para testar de novo."""
+        with self._lock:
+            if self._estado == MEIO_ABERTO:
+                self._testando = False
+                self._reabrir_em = time.monotonic()
+                self._mudar(ABERTO)
+
+    def testar_agora(self) -> str:
+        """
+        Roda a sonda já, na thread atual, se o disjuntor não estiver
+        fechado (ex.: antes do flush final no encerramento). Devolve o estado.
+        """
+        with self._lock:
+            if self._estado == FECHADO or self.sonda is None or self._testando:
+                return self._estado
+            self._testando = True
+            self._mudar(MEIO_ABERTO)
+        self._sondar()
+        return self._estado
+
+    def _sondar(self) -> None:
+        try:
+            self.sonda()
+        except Exception as e:
+            if not self.conta_como_falha(e):
+                self._liberar_teste()
+                return
+            logger.warning(f"Sonda de '{self.nome}' falhou: {e}")
+            self.registrar_falha()
+        else:
+            self.registrar_sucesso()
+
+    def chamar(self, func, *args):
+        """func(*args) protegido; levanta CircuitoAberto sem chamar se estiver aberto."""
+        if not self.permitir():
+            metrics.DISJUNTOR_RECUSAS.inc(dependencia=self.nome)
+            raise CircuitoAberto(f"{self.nome} indisponível (disjuntor aberto)")
+        try:
+            resultado = func(*args)
+        except Exception as e:
+            if self.conta_como_falha(e):
+                self.registrar_falha()
+            else:
+                self._liberar_teste()
+            raise
+        self.registrar_sucesso()
+        return resultado
+
+
+# ============================================================
+# REGISTRO (configurado pelo bot no startup)
+# ============================================================
+
+_DISJUNTORES = []
+
+
+def configurar_disjuntores(falhas_para_abrir: int, tempo_aberto: float, tempo_aberto_max: float) -> None:
+    for d in _DISJUNTORES:
+        with d._lock:
+            d.falhas_para_abrir = falhas_para_abrir
+            d.tempo_aberto = d._tempo_atual = tempo_aberto
+            d.tempo_aberto_max = tempo_aberto_max
+
+
+def estados_disjuntores() -> dict:
+    """{nome: estado} de todos os disjuntores, para o /status."""
+    return {d.nome: d.estado for d in _DISJUNTORES}
@@ -0,0 +1,133 @@
+"""
+core/escalonador.py — Processamento concorrente de updates com ordem por chat.
+
+Por padrão o Application do python-telegram-bot processa um update por vez:
+uma mensagem lenta de um chat atrasa todos os outros. Ligar concorrência
+pura resolveria isso, mas duas mensagens seguidas do mesmo chat poderiam
+ser gravadas na planilha fora de ordem.
+
+ProcessadorPorChat roda chats diferentes em paralelo e, dentro de cada
+chat, um update por vez na ordem de chegada:
+
+  - cada chat tem um asyncio.Lock (FIFO); o update espera a vez do seu
+    chat antes de disputar uma vaga global, para que uma rajada de um só
+    chat não ocupe as vagas dos outros
+  - `limite_global` updates no máximo em execução ao mesmo tempo
+  - `limite_por_chat` updates no máximo por chat (executando + na fila);
+    o excedente é descartado e `ao_rejeitar(update)` avisa o usuário
+  - profundidade das filas, execução e espera vão para core.metrics
+"""
+
+import time
+import asyncio
+import logging
+import contextlib
+
+from telegram.ext import BaseUpdateProcessor
+
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class _FilaChat:
+    __slots__ = ("lock", "profundidade")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.profundidade = 0
+
+
+class ProcessadorPorChat(BaseUpdateProcessor):
+
+    def __init__(
+        self,
+        limite_global: int = 8,
+        limite_por_chat: int = 20,
+        max_pendentes: int = 1000,
+        ao_rejeitar=None,
+    ):
+        # O semáforo da classe base limita o total de updates dentro do
+        # processador (executando + esperando); a vaga de execução é o
+        # self._vagas, adquirido só depois da vez do chat.
+        super().__init__(max_concurrent_updates=max_pendentes)
+        self.limite_global = limite_global
+        self.limite_por_chat = limite_por_chat
+        self._ao_rejeitar = ao_rejeitar
+        self._vagas = None
+        self._chats = {}
+        self.rejeitados = 0
+
+    async def initialize(self) -> None:
+        self._vagas = asyncio.Semaphore(self.limite_global)
+
+    async def shutdown(self) -> None:
+        pass
+
+    @staticmethod
+    def _chave_chat(update):
+        chat = getattr(update, "effective_chat", None)
+        return chat.id if chat is not None else None
+
+    async def do_process_update(self, update, coroutine) -> None:
+        chave = self._chave_chat(update)
+        if chave is None:
+            # Sem chat (ex.: inline query) não há ordem a preservar
+            await self._executar(coroutine)
+            return
+
+        fila = self._chats.get(chave)
+        if fila is None:
+            fila = self._chats[chave] = _FilaChat()
+        if fila.profundidade >= self.limite_por_chat:
+            coroutine.close()
+            self.rejeitados += 1
+            metrics.UPDATES_REJEITADOS.inc()
+            logger.warning(f"Fila do chat {chave} cheia ({fila.profundidade}); update descartado.")
+            if self._ao_rejeitar is not None:
+                try:
+                    await self._ao_rejeitar(update)
+                except Exception as e:
+                    logger.warning(f"Falha ao avisar rejeição ao chat {chave}: {e}")
+            return
+
+        # Nenhum await entre a checagem acima e o pedido do lock: a ordem de
+        # chegada é a ordem de aquisição (asyncio.Lock atende em FIFO).
+        fila.profundidade += 1
+        try:
+            await self._executar(coroutine, vez=fila.lock)
+        finally:
+            fila.profundidade -= 1
+            if fila.profundidade == 0:
+                del self._chats[chave]
+
+    async def _executar(self, coroutine, vez=None) -> None:
+        """Espera a vez do chat (`vez`), depois uma vaga global, e roda."""
+        chegada = time.perf_counter()
+        metrics.UPDATES_NA_FILA.inc()
+        iniciado = False
+        try:
+            async with vez if vez is not None else contextlib.nullcontext():
+                async with self._vagas:
+                    metrics.UPDATES_NA_FILA.dec()
+                    iniciado = True
+                    metrics.ESPERA_FILA_SEGUNDOS.observar(time.perf_counter() - chegada)
+                    metrics.UPDATES_EM_EXECUCAO.inc()
+                    try:
+                        await coroutine
+                    finally:
+                        metrics.UPDATES_EM_EXECUCAO.dec()
+        finally:
+            if not iniciado:  # cancelado antes de ganhar a vaga
+                metrics.UPDATES_NA_FILA.dec()
+                coroutine.close()
+
+    def resumo(self) -> dict:
+        """Snapshot para o /status."""
+        return {
+            "em_execucao": metrics.UPDATES_EM_EXECUCAO.valor(),
+            "na_fila": metrics.UPDATES_NA_FILA.valor(),
+            "chats": len(self._chats),
+            "maior_fila": max((f.profundidade for f in self._chats.values()), default=0),
+            "rejeitados": self.rejeitados,
+        }
@@ -0,0 +1,93 @@
+"""
+core/evento.py — O evento financeiro que circula do classificador ao Sheets.
+
+Cada etapa (camada regex, fallback Gemini, merge, resposta do bot,
+linha do Sheets) recebia {"tipo": ..., "dados": {...}}, sondava campo a
+campo com .get e copiava o dicionário a cada merge. Evento guarda os
+mesmos campos em __slots__ (sem __dict__ por instância), o tipo como
+TipoEvento e o valor também em centavos inteiros (core.valores), lidos
+uma vez na origem.
+
+Campo None = ausente. to_dict() devolve o formato antigo, só com as
+chaves que a origem preencheu — é o formato do cache do Gemini (JSON) e
+o de quem ainda precisa de dicionário; from_dict() faz o caminho inverso.
+"""
+
+from enum import Enum
+
+from core.valores import para_centavos
+
+
+class TipoEvento(str, Enum):
+    RECEITA = "receita"
+    DESPESA_SERVICO = "despesa_servico"
+    DESPESA_PESSOAL = "despesa_pessoal"
+    DESPESA = "despesa"
+    NAO_CLASSIFICADO = "nao_classificado"
+
+    # Formata como o texto puro ("receita"), como nas abas e nas mensagens
+    __str__ = str.__str__
+    __format__ = str.__format__
+
+
+# Campos de "dados", na ordem do to_dict()
+CAMPOS = ("valor", "cliente", "descricao", "tags", "dias", "aviso", "fonte")
+
+
+class Evento:
+
+    __slots__ = ("tipo", "centavos") + CAMPOS
+
+    def __init__(
+        self,
+        tipo,
+        valor: str | None = None,
+        cliente: str | None = None,
+        descricao: str | None = None,
+        tags: list | None = None,
+        dias: list | None = None,
+        aviso: str | None = None,
+        fonte: str | None = None,
+        centavos: int | None = None,
+    ):
+        self.tipo = TipoEvento(tipo)
+        self.valor = valor
+        self.cliente = cliente
+        self.descricao = descricao
+        self.tags = tags
+        self.dias = dias
+        self.aviso = aviso
+        self.fonte = fonte
+        # Quem já tokenizou o valor (camada regex) passa os centavos prontos
+        if centavos is None and valor:
+            centavos = para_centavos(valor)
+        self.centavos = centavos
+
+    def copia(self, **campos) -> "Evento":
+        """Novo Evento com os mesmos campos, trocando os de `campos` (None remove)."""
+        atuais = {campo: getattr(self, campo) for campo in CAMPOS}
+        atuais.update(campos)
+        if "valor" in campos and "centavos" not in campos:
+            atuais["centavos"] = None  # recalculado do novo valor
+        else:
+            atuais.setdefault("centavos", self.centavos)
+        return Evento(self.tipo, **atuais)
+
+    def to_dict(self) -> dict:
+        """{"tipo": ..., "dados": {...}} com os campos presentes (listas não são copiadas)."""
+        dados = {}
+        for campo in CAMPOS:
+            valor = getattr(self, campo)
+            if valor is not None:
+                dados[campo] = valor
+        return {"tipo": self.tipo.value, "dados": dados}
+
+    @classmethod
+    def from_dict(cls, evento: dict) -> "Evento":
+        dados = evento.get("dados") or {}
+        return cls(evento.get("tipo", TipoEvento.NAO_CLASSIFICADO),
+                   **{campo: dados[campo] for campo in CAMPOS if campo in dados})
+
+    def __repr__(self) -> str:
+        campos = ", ".join(f"{c}={getattr(self, c)!r}" for c in CAMPOS if getattr(self, c) is not None)
+        return f"Evento({self.tipo.value}{', ' if campos else ''}{campos})"
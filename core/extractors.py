@@ -1,11 +1,10 @@
 import re
 
+from core.valores import valor_principal
+
 def extract_valor(frase):
-    match = re.search(
-        r'\b\d{1,3}(?:[.,]\d{3})*(?:[.,]\d+)?\b',
-        frase
-    )
-    return match.group(0) if match else ""
+    valor = valor_principal(frase)
+    return valor.texto if valor else ""
 
 def extract_nome(frase):
     match = re.search(
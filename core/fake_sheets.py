@@ -0,0 +1,94 @@
+"""
+core/fake_sheets.py — Backend falso do Google Sheets, em memória.
+
+Imita a parte da API do gspread usada por core/sheets.py
+(open_by_key, worksheet, worksheets, add_worksheet, append_row(s),
+batch_update) para testar o journal e o flusher sem rede:
+
+    from core import sheets
+    from core.fake_sheets import FakeClient
+    sheets._get_client = lambda: FakeClient()
+
+`fora_do_ar = True` faz toda chamada falhar, simulando indisponibilidade.
+`latencia` (s) e `taxa_erro` (0–1) simulam um Sheets lento ou instável
+em testes de carga.
+"""
+
+import time
+import random
+import threading
+
+import gspread
+
+
+class FakeWorksheet:
+    def __init__(self, cliente: "FakeClient", title: str, id: int):
+        self._cliente = cliente
+        self.title = title
+        self.id = id
+        self.linhas = []
+
+    def append_row(self, linha, value_input_option="RAW"):
+        self._cliente._chamada()
+        self.linhas.append(list(linha))
+
+    def append_rows(self, linhas, value_input_option="RAW"):
+        self._cliente._chamada()
+        self.linhas.extend(list(linha) for linha in linhas)
+
+
+class FakeSpreadsheet:
+    def __init__(self, cliente: "FakeClient"):
+        self._cliente = cliente
+        self._abas = {}
+
+    def worksheet(self, nome_aba: str) -> FakeWorksheet:
+        self._cliente._chamada()
+        if nome_aba not in self._abas:
+            raise gspread.WorksheetNotFound(nome_aba)
+        return self._abas[nome_aba]
+
+    def worksheets(self) -> list:
+        self._cliente._chamada()
+        return list(self._abas.values())
+
+    def add_worksheet(self, title: str, rows: int, cols: int) -> FakeWorksheet:
+        self._cliente._chamada()
+        ws = FakeWorksheet(self._cliente, title, len(self._abas) + 1)
+        self._abas[title] = ws
+        return ws
+
+    def batch_update(self, body: dict) -> dict:
+        self._cliente._chamada()
+        return {}
+
+
+class FakeClient:
+    """Cliente gspread falso. Conta as chamadas feitas (atributo `chamadas`)."""
+
+    def __init__(self, latencia: float = 0.0, taxa_erro: float = 0.0, semente: int | None = None):
+        self.spreadsheet = FakeSpreadsheet(self)
+        self.chamadas = 0
+        self.erros = 0
+        self.fora_do_ar = False
+        self.latencia = latencia
+        self.taxa_erro = taxa_erro
+        self._rnd = random.Random(semente)
+        self._lock = threading.Lock()
+
+    def _chamada(self) -> None:
+        with self._lock:
+            self.chamadas += 1
+            falhar = self.fora_do_ar or self._rnd.random() < self.taxa_erro
+            if falhar:
+                self.erros += 1
+        if self.latencia:
+            time.sleep(self.latencia)
+        if self.fora_do_ar:
+            raise ConnectionError("Sheets fora do ar (simulado)")
+        if falhar:
+            raise ConnectionError("Erro transitório do Sheets (simulado)")
+
+    def open_by_key(self, key: str) -> FakeSpreadsheet:
+        self._chamada()
+        return self.spreadsheet
@@ -0,0 +1,132 @@
+"""
+core/fake_telegram.py — Bot API falsa do Telegram, em memória.
+
+Substitui o cliente HTTP do python-telegram-bot (telegram.request.BaseRequest)
+para rodar o Application de verdade — polling ou webhook — sem rede:
+
+    from bot import criar_aplicacao
+    from core.fake_telegram import FakeBotAPI
+    api = FakeBotAPI(rtt=0.05)
+    app = criar_aplicacao("123:loadtest", request=api)
+
+Cada chamada à API custa `rtt` segundos (metade na ida, metade na volta).
+getUpdates se comporta como long polling: segura a requisição até chegar
+um update enfileirado com enfileirar() ou acabar o timeout. As respostas
+do bot (sendMessage, editMessageText etc.) ficam em `respostas` e podem
+ser aguardadas por chat com aguardar_resposta() / proxima_resposta().
+"""
+
+import json
+import time
+import asyncio
+import itertools
+
+from telegram.request import BaseRequest
+
+
+def montar_update(update_id: int, user_id: int, chat_id: int, texto: str) -> dict:
+    """Update de mensagem de texto privada, no formato JSON da Bot API."""
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private", "first_name": "Carga"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Carga"},
+            "text": texto,
+        },
+    }
+
+
+class FakeBotAPI(BaseRequest):
+
+    BOT = {"id": 1, "is_bot": True, "first_name": "GessoBot", "username": "gessobot_teste"}
+
+    def __init__(self, rtt: float = 0.05):
+        self.rtt = rtt
+        self.chamadas = {}
+        self.respostas = []  # (instante, chat_id, método)
+        self._fila = []
+        self._chegou = None
+        self._esperas = {}
+        self._ids = itertools.count(1)
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    # ── Lado "Telegram" ────────────────────────────────────────
+
+    def enfileirar(self, update: dict) -> None:
+        """Entrega um update ao próximo getUpdates (modo polling)."""
+        self._fila.append(update)
+        self._evento().set()
+
+    async def aguardar_resposta(self, chat_id: int) -> float:
+        """Espera o bot responder no chat; retorna o instante (perf_counter)."""
+        instante, _ = await self.proxima_resposta(chat_id)
+        return instante
+
+    async def proxima_resposta(self, chat_id: int) -> tuple:
+        """Espera a próxima resposta ou edição no chat: (instante, texto)."""
+        return await self._espera(chat_id).get()
+
+    def _evento(self) -> asyncio.Event:
+        if self._chegou is None:
+            self._chegou = asyncio.Event()
+        return self._chegou
+
+    def _espera(self, chat_id: int) -> asyncio.Queue:
+        if chat_id not in self._esperas:
+            self._esperas[chat_id] = asyncio.Queue()
+        return self._esperas[chat_id]
+
+    # ── BaseRequest ───────────────────────────────────────────
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        metodo = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data is not None else {}
+        self.chamadas[metodo] = self.chamadas.get(metodo, 0) + 1
+
+        await asyncio.sleep(self.rtt / 2)
+        resultado = await self._responder(metodo, params)
+        await asyncio.sleep(self.rtt / 2)
+        return 200, json.dumps({"ok": True, "result": resultado}).encode("utf-8")
+
+    async def _responder(self, metodo: str, params: dict):
+        if metodo == "getMe":
+            return self.BOT
+        if metodo == "getUpdates":
+            return await self._get_updates(int(params.get("offset", 0) or 0),
+                                           float(params.get("timeout", 0) or 0))
+        if metodo in ("sendMessage", "editMessageText", "sendDocument"):
+            chat_id = int(params["chat_id"])
+            agora = time.perf_counter()
+            self.respostas.append((agora, chat_id, metodo))
+            self._espera(chat_id).put_nowait((agora, params.get("text", "")))
+            return {
+                "message_id": next(self._ids),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": self.BOT,
+                "text": params.get("text", ""),
+            }
+        return True  # setWebhook, deleteWebhook, etc.
+
+    async def _get_updates(self, offset: int, timeout: float) -> list:
+        self._fila = [u for u in self._fila if u["update_id"] >= offset]
+        if not self._fila and timeout:
+            evento = self._evento()
+            evento.clear()
+            try:
+                await asyncio.wait_for(evento.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return list(self._fila)
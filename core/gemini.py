@@ -0,0 +1,305 @@
+"""
+core/gemini.py — Cliente Gemini de longa duração.
+
+O modelo é configurado uma única vez (no startup do bot) e reutilizado
+por todas as chamadas do fallback. Cada chamada tem prazo (deadline):
+se estourar, gerar() levanta PrazoEsgotado e o classificador fica com
+o resultado do regex.
+
+Hedge opcional: se a primeira requisição passar do p95 observado, uma
+segunda é disparada em paralelo e vale a que responder primeiro.
+
+Cotas: com limitadores de RPM/TPM (core/limites.py), cada requisição
+reserva fichas antes de sair. Sem cota dentro de `cota_espera`, gerar()
+levanta CotaEsgotada; a hedge só sai se houver cota imediata.
+
+Instruções fixas e formato: `instrucao_sistema` vai como system
+instruction do modelo e `esquema_resposta` como response_schema (JSON
+garantido pela API), de modo que cada chamada leva só os dados do
+pedido. Os tokens reais de cada resposta (usage_metadata) vão para
+core.metrics e acertam a reserva estimada no balde de TPM.
+
+Para testes, passe um objeto com generate_content() em `modelo`.
+
+DISJUNTOR_GEMINI (core/disjuntor.py) recusa chamadas na hora enquanto o
+Gemini estiver fora; a sonda testa a volta com uma requisição mínima.
+
+MicroLote agrupa pedidos que chegam de threads diferentes dentro de uma
+janela curta e os executa numa única chamada (ver classifier).
+"""
+
+import time
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from core import metrics
+from core.metrics import JanelaLatencia
+from core.limites import CotaEsgotada, aguardar_todos
+from core.disjuntor import Disjuntor
+
+logger = logging.getLogger(__name__)
+
+
+class PrazoEsgotado(TimeoutError):
+    """A chamada ao Gemini não respondeu dentro do prazo."""
+
+
+class ClienteGemini:
+
+    def __init__(
+        self,
+        api_key: str | None = None,
+        nome_modelo: str = "gemini-2.5-flash-lite",
+        prazo: float = 10.0,
+        hedge: bool = False,
+        hedge_min_amostras: int = 20,
+        modelo=None,
+        workers: int = 4,
+        limite_rpm=None,
+        limite_tpm=None,
+        cota_espera: float = 2.0,
+        instrucao_sistema: str = "",
+        esquema_resposta: dict | None = None,
+    ):
+        if modelo is None:
+            import google.generativeai as genai
+
+            if not api_key:
+                raise RuntimeError("GEMINI_API_KEY não definida")
+            genai.configure(api_key=api_key)
+            config_geracao = None
+            if esquema_resposta is not None:
+                config_geracao = {
+                    "response_mime_type": "application/json",
+                    "response_schema": esquema_resposta,
+                }
+            modelo = genai.GenerativeModel(
+                nome_modelo,
+                system_instruction=instrucao_sistema or None,
+                generation_config=config_geracao,
+            )
+
+        self._modelo = modelo
+        self.instrucao_sistema = instrucao_sistema
+        self.prazo = prazo
+        self.hedge = hedge
+        self.hedge_min_amostras = hedge_min_amostras
+        self.latencias = JanelaLatencia(500)
+        self.hedges_disparados = 0
+        self.limite_rpm = limite_rpm
+        self.limite_tpm = limite_tpm
+        self.cota_espera = cota_espera
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gessobot-gemini")
+
+    def _requisitar(self, prompt: str, prazo: float) -> str:
+        inicio = time.perf_counter()
+        response = self._modelo.generate_content(prompt, request_options={"timeout": prazo})
+        self.latencias.registrar(time.perf_counter() - inicio)
+        self._registrar_uso(prompt, getattr(response, "usage_metadata", None))
+        return response.text
+
+    def _estimar_tokens(self, prompt: str) -> int:
+        # ~4 caracteres por token; a instrução de sistema também conta na cota
+        return (len(self.instrucao_sistema) + len(prompt)) // 4 + 1
+
+    def _reservar_cota(self, prompt: str, espera_max: float) -> None:
+        """Reserva 1 requisição e os tokens estimados; pode bloquear ou levantar CotaEsgotada."""
+        pedidos = []
+        if self.limite_rpm is not None:
+            pedidos.append((self.limite_rpm, 1))
+        if self.limite_tpm is not None:
+            pedidos.append((self.limite_tpm, self._estimar_tokens(prompt)))
+        if pedidos:
+            aguardar_todos(pedidos, espera_max)
+
+    def _registrar_uso(self, prompt: str, uso) -> None:
+        """
+        Tokens reais da resposta (usage_metadata) vão para as métricas, e a
+        diferença para a estimativa reservada é acertada no balde de TPM.
+        """
+        if uso is None:
+            return
+        entrada = getattr(uso, "prompt_token_count", 0) or 0
+        metrics.GEMINI_TOKENS.observar(entrada, tipo="entrada")
+        metrics.GEMINI_TOKENS.observar(getattr(uso, "candidates_token_count", 0) or 0, tipo="saida")
+        metrics.GEMINI_TOKENS.observar(getattr(uso, "cached_content_token_count", 0) or 0, tipo="cache")
+        if self.limite_tpm is not None and entrada:
+            diferenca = entrada - self._estimar_tokens(prompt)
+            if diferenca > 0:
+                self.limite_tpm.reservar(diferenca)  # já gastos: fica como dívida no balde
+            elif diferenca < 0:
+                self.limite_tpm.devolver(-diferenca)
+
+    def sondar(self) -> None:
+        """Requisição mínima para testar se o Gemini voltou (levanta se não)."""
+        self._reservar_cota("ok", 0.0)
+        self._requisitar("Responda apenas: ok", min(self.prazo, 5.0))
+
+    def _limiar_hedge(self) -> float | None:
+        """p95 observado, ou None enquanto não houver amostras suficientes."""
+        if not self.hedge or self.latencias.resumo()["n"] < self.hedge_min_amostras:
+            return None
+        return self.latencias.percentil(95)
+
+    def gerar(self, prompt: str, prazo: float | None = None) -> str:
+        """
+        Envia o prompt e retorna o texto da resposta.
+        Levanta PrazoEsgotado se nenhuma requisição terminar a tempo e
+        CotaEsgotada se não houver cota (a espera conta dentro do prazo).
+        """
+        prazo = prazo if prazo is not None else self.prazo
+        limite = time.monotonic() + prazo
+
+        self._reservar_cota(prompt, min(self.cota_espera, prazo))
+        restante = max(0.0, limite - time.monotonic())
+        pendentes = {self._executor.submit(self._requisitar, prompt, restante)}
+        limiar = self._limiar_hedge()
+        ultimo_erro = None
+
+        while pendentes:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+
+            espera = restante
+            if limiar is not None:
+                espera = min(espera, limiar)
+
+            prontas, pendentes = wait(pendentes, timeout=espera, return_when=FIRST_COMPLETED)
+
+            for fut in prontas:
+                try:
+                    return fut.result()
+                except Exception as e:
+                    ultimo_erro = e
+
+            if limiar is not None and not prontas:
+                # Primeira requisição passou do p95: dispara a segunda,
+                # desde que haja cota sem esperar
+                try:
+                    self._reservar_cota(prompt, 0.0)
+                    self.hedges_disparados += 1
+                    restante = max(0.0, limite - time.monotonic())
+                    pendentes.add(self._executor.submit(self._requisitar, prompt, restante))
+                except CotaEsgotada:
+                    logger.debug("Hedge não disparada: sem cota imediata.")
+            limiar = None  # no máximo um hedge por chamada
+
+        if ultimo_erro is not None and not pendentes:
+            raise ultimo_erro
+        raise PrazoEsgotado(f"Gemini não respondeu em {prazo:.1f}s")
+
+
+# ============================================================
+# MICRO-LOTE
+# ============================================================
+
+class MicroLote:
+    """
+    Junta pedidos concorrentes em lotes. A primeira thread que chega a um
+    lote vazio vira líder: espera `janela` segundos (ou o lote encher),
+    fecha o lote e chama executar(itens) → lista de resultados na mesma
+    ordem. As demais threads só esperam o seu resultado.
+    """
+
+    def __init__(self, executar, janela: float, max_itens: int = 8):
+        self._executar = executar
+        self.janela = janela
+        self.max_itens = max_itens
+        self._cond = threading.Condition()
+        self._itens = []
+        self._futuros = []
+        self.lotes_executados = 0
+        self.itens_executados = 0
+
+    def submeter(self, item):
+        with self._cond:
+            lider = not self._itens
+            self._itens.append(item)
+            futuro = Future()
+            self._futuros.append(futuro)
+            if len(self._itens) >= self.max_itens:
+                self._cond.notify_all()
+
+        if not lider:
+            return futuro.result()
+
+        with self._cond:
+            self._cond.wait_for(lambda: len(self._itens) >= self.max_itens, timeout=self.janela)
+            itens, futuros = self._itens, self._futuros
+            self._itens, self._futuros = [], []
+            self.lotes_executados += 1
+            self.itens_executados += len(itens)
+
+        erro = RuntimeError("Lote retornou menos resultados que pedidos")
+        try:
+            resultados = self._executar(itens)
+            for f, r in zip(futuros, resultados):
+                f.set_result(r)
+        except BaseException as e:
+            # Inclui KeyboardInterrupt/SystemExit: sem resultado no futuro, os
+            # seguidores esperariam para sempre
+            erro = e
+            raise
+        finally:
+            for f in futuros:
+                if not f.done():
+                    f.set_exception(erro)
+        return futuro.result()
+
+
+# ============================================================
+# CLIENTE GLOBAL (criado no startup)
+# ============================================================
+
+_cliente = None
+_cliente_lock = threading.Lock()
+
+
+def _criar_cliente_da_config() -> ClienteGemini:
+    from core.config import (
+        GEMINI_API_KEY, GEMINI_MODELO, GEMINI_PRAZO, GEMINI_HEDGE, GEMINI_COTA_ESPERA,
+    )
+    from core.limites import limitador
+    from core.classifier import INSTRUCAO_GEMINI, ESQUEMA_GEMINI
+
+    return ClienteGemini(
+        api_key=GEMINI_API_KEY,
+        nome_modelo=GEMINI_MODELO,
+        prazo=GEMINI_PRAZO,
+        hedge=GEMINI_HEDGE,
+        limite_rpm=limitador("gemini_rpm"),
+        limite_tpm=limitador("gemini_tpm"),
+        cota_espera=GEMINI_COTA_ESPERA,
+        instrucao_sistema=INSTRUCAO_GEMINI,
+        esquema_resposta=ESQUEMA_GEMINI,
+    )
+
+
+def iniciar_cliente_gemini(cliente: ClienteGemini | None = None) -> ClienteGemini:
+    """
+    Cria (ou substitui) o cliente compartilhado. Sem argumento, usa as
+    configurações de core.config. Chamar uma vez no startup do bot.
+    """
+    global _cliente
+    with _cliente_lock:
+        _cliente = cliente if cliente is not None else _criar_cliente_da_config()
+        return _cliente
+
+
+def obter_cliente_gemini() -> ClienteGemini:
+    """Retorna o cliente compartilhado, criando-o na primeira chamada."""
+    global _cliente
+    with _cliente_lock:
+        if _cliente is None:
+            _cliente = _criar_cliente_da_config()
+        return _cliente
+
+
+DISJUNTOR_GEMINI = Disjuntor(
+    "gemini",
+    sonda=lambda: obter_cliente_gemini().sondar(),
+    # Falta de cota é nossa, não do Gemini
+    conta_como_falha=lambda e: not isinstance(e, CotaEsgotada),
+)
@@ -0,0 +1,215 @@
+"""
+core/journal.py — Journal local (write-behind) das linhas do Sheets.
+
+registrar_eventos grava as linhas aqui, num SQLite em modo WAL, e
+responde ao usuário na hora. O FlusherSheets roda numa thread de fundo
+e drena o journal para o Google Sheets em lotes, com retry e backoff
+exponencial por linha; uma aba só anda quando a sua linha mais antiga
+pode sair, para não trocar a ordem na planilha. Nada se perde se o
+Sheets estiver lento ou fora do ar: a linha só sai do journal depois
+de confirmada na planilha.
+
+Tabela "pendentes":
+  id | aba | linha (JSON) | criado_em | tentativas | proxima_tentativa
+"""
+
+import json
+import time
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class Journal:
+    """Fila durável, append-only, de linhas pendentes por aba."""
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(caminho, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS pendentes (
+                   id                INTEGER PRIMARY KEY AUTOINCREMENT,
+                   aba               TEXT    NOT NULL,
+                   linha             TEXT    NOT NULL,
+                   criado_em         REAL    NOT NULL,
+                   tentativas        INTEGER NOT NULL DEFAULT 0,
+                   proxima_tentativa REAL    NOT NULL DEFAULT 0
+               )"""
+        )
+
+    def anexar(self, linhas_por_aba: dict) -> list:
+        """Grava {aba: [linha, ...]} numa única transação. Retorna os ids."""
+        agora = time.time()
+        ids = []
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for aba, linhas in linhas_por_aba.items():
+                    for linha in linhas:
+                        cur = self._conn.execute(
+                            "INSERT INTO pendentes (aba, linha, criado_em) VALUES (?, ?, ?)",
+                            (aba, json.dumps(linha, ensure_ascii=False), agora),
+                        )
+                        ids.append(cur.lastrowid)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return ids
+
+    def pendentes(self, limite: int, ignorar_backoff: bool = False) -> list:
+        """
+        Linhas prontas para envio, em ordem de chegada: [(id, aba, linha, tentativas)].
+        A aba vale como um todo: se a linha mais antiga dela está em backoff,
+        nenhuma sai — as mais novas não podem passar na frente na planilha.
+        """
+        sql = "SELECT id, aba, linha, tentativas FROM pendentes"
+        params = []
+        if not ignorar_backoff:
+            sql += (
+                " WHERE aba IN (SELECT p.aba FROM pendentes p"
+                " JOIN (SELECT aba, MIN(id) AS cabeca FROM pendentes GROUP BY aba) c"
+                " ON p.id = c.cabeca WHERE p.proxima_tentativa <= ?)"
+            )
+            params.append(time.time())
+        sql += " ORDER BY id LIMIT ?"
+        params.append(limite)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [(i, aba, json.loads(linha), tent) for i, aba, linha, tent in rows]
+
+    def confirmar(self, ids: list) -> None:
+        """Remove as linhas já gravadas no Sheets."""
+        if not ids:
+            return
+        with self._lock:
+            self._conn.executemany("DELETE FROM pendentes WHERE id = ?", [(i,) for i in ids])
+
+    def adiar(self, ids: list, atraso: float) -> None:
+        """Incrementa tentativas e agenda a próxima tentativa daqui a `atraso` s."""
+        if not ids:
+            return
+        proxima = time.time() + atraso
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE pendentes SET tentativas = tentativas + 1, proxima_tentativa = ? WHERE id = ?",
+                [(proxima, i) for i in ids],
+            )
+
+    def contar(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM pendentes").fetchone()[0]
+
+    def fechar(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+# ============================================================
+# FLUSHER EM SEGUNDO PLANO
+# ============================================================
+
+class FlusherSheets(threading.Thread):
+    """
+    Drena o journal para o Sheets. `gravar` recebe {aba: [linhas]} e
+    retorna {aba: erro_ou_None} (ver core.sheets._gravar_linhas).
+    """
+
+    def __init__(
+        self,
+        journal: Journal,
+        gravar,
+        intervalo: float = 2.0,
+        lote: int = 500,
+        backoff_base: float = 2.0,
+        backoff_max: float = 300.0,
+    ):
+        super().__init__(name="gessobot-flusher", daemon=True)
+        self.journal = journal
+        self.gravar = gravar
+        self.intervalo = intervalo
+        self.lote = lote
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+        # Uma drenagem por vez: duas sobre as mesmas linhas as gravariam em dobro
+        self._drenando = threading.Lock()
+
+    def acordar(self) -> None:
+        """Pede um flush imediato (chamado após cada anexar)."""
+        self._acordar.set()
+
+    def run(self) -> None:
+        while not self._parar.is_set():
+            self._acordar.wait(self.intervalo)
+            self._acordar.clear()
+            if self._parar.is_set():
+                break
+            try:
+                self.drenar()
+            except Exception as e:
+                logger.error(f"Flusher do journal falhou: {e}")
+
+    def drenar(self, ignorar_backoff: bool = False) -> int:
+        """Envia lotes até esvaziar o que está pronto. Retorna nº de linhas gravadas."""
+        with self._drenando:
+            return self._drenar(ignorar_backoff)
+
+    def _drenar(self, ignorar_backoff: bool) -> int:
+        gravadas = 0
+        while True:
+            pendentes = self.journal.pendentes(self.lote, ignorar_backoff)
+            if not pendentes:
+                return gravadas
+
+            linhas_por_aba, ids_por_aba, tentativas_por_aba = {}, {}, {}
+            for id_, aba, linha, tentativas in pendentes:
+                linhas_por_aba.setdefault(aba, []).append(linha)
+                ids_por_aba.setdefault(aba, []).append(id_)
+                tentativas_por_aba[aba] = max(tentativas, tentativas_por_aba.get(aba, 0))
+
+            falhas = self.gravar(linhas_por_aba)
+
+            houve_falha = False
+            for aba, ids in ids_por_aba.items():
+                if falhas.get(aba) is None:
+                    self.journal.confirmar(ids)
+                    gravadas += len(ids)
+                else:
+                    houve_falha = True
+                    atraso = min(self.backoff_max, self.backoff_base * 2 ** tentativas_por_aba[aba])
+                    self.journal.adiar(ids, atraso)
+                    logger.warning(
+                        f"{len(ids)} linha(s) de '{aba}' mantidas no journal; "
+                        f"nova tentativa em {atraso:.0f}s."
+                    )
+
+            # Com falha, as linhas adiadas podem voltar no próximo SELECT
+            # (ignorar_backoff) — encerra a rodada para não entrar em loop.
+            if houve_falha or len(pendentes) < self.lote:
+                return gravadas
+
+    def encerrar(self, timeout: float = 30.0) -> None:
+        """Para a thread e faz uma última drenagem, ignorando o backoff."""
+        self._parar.set()
+        self._acordar.set()
+        if self.is_alive():
+            self.join(timeout)
+        if self.is_alive():
+            # Ainda presa num append_rows: o que ela não confirmar fica no
+            # journal e sai na próxima execução, sem risco de gravar em dobro
+            logger.warning(f"Flusher ainda gravando após {timeout:g}s; "
+                           f"{self.journal.contar()} linha(s) ficam no journal.")
+            return
+        try:
+            n = self.drenar(ignorar_backoff=True)
+            restantes = self.journal.contar()
+            logger.info(f"Flush final do journal: {n} gravada(s), {restantes} pendente(s).")
+        except Exception as e:
+            logger.error(f"Flush final do journal falhou: {e}")
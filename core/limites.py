@@ -0,0 +1,124 @@
+"""
+core/limites.py — Limitadores de taxa (token bucket) das APIs externas.
+
+O Sheets tem cota de requisições por minuto e o Gemini, de requisições
+(RPM) e tokens (TPM) por minuto. Em vez de disparar e transformar o 429
+em mensagem de erro, toda chamada reserva fichas no balde da sua API:
+
+  - com fichas disponíveis, segue na hora
+  - sem fichas, espera na fila (a reserva é feita na chegada, então a
+    ordem é respeitada e não há corrida quando o balde reabastece)
+  - se a espera passaria de `espera_max`, nada é reservado e quem chamou
+    degrada (classificação só por regex, linha fica no journal)
+
+Os baldes são compartilhados por processo — limitador("sheets") devolve
+sempre a mesma instância. Espera e esgotamentos vão para core.metrics.
+"""
+
+import time
+import threading
+
+from core import metrics
+
+
+class CotaEsgotada(Exception):
+    """Não haveria cota dentro da espera máxima; a chamada não foi feita."""
+
+
+class LimitadorTaxa:
+    """
+    Token bucket: `por_minuto` fichas/min, acumulando até `rajada`.
+    por_minuto <= 0 desliga o limite.
+    """
+
+    def __init__(self, nome: str, por_minuto: float, rajada: float | None = None):
+        self.nome = nome
+        self.taxa = por_minuto / 60.0
+        self.capacidade = float(rajada if rajada else por_minuto)
+        self._fichas = self.capacidade
+        self._atualizado = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reservar(self, custo: float = 1, espera_max: float = float("inf")) -> float | None:
+        """
+        Reserva `custo` fichas e devolve quantos segundos esperar até
+        poder usá-las — ou None (sem reservar nada) se passaria de espera_max.
+        """
+        if self.taxa <= 0:
+            return 0.0
+        custo = min(custo, self.capacidade)  # senão nunca caberia no balde
+        with self._lock:
+            agora = time.monotonic()
+            self._fichas = min(self.capacidade, self._fichas + (agora - self._atualizado) * self.taxa)
+            self._atualizado = agora
+            # O saldo pode ficar negativo: são reservas já feitas na fila
+            espera = max(0.0, (custo - self._fichas) / self.taxa)
+            if espera > espera_max:
+                return None
+            self._fichas -= custo
+            return espera
+
+    def devolver(self, custo: float = 1) -> None:
+        """Desfaz uma reserva que não foi usada."""
+        if self.taxa <= 0:
+            return
+        with self._lock:
+            self._fichas = min(self.capacidade, self._fichas + min(custo, self.capacidade))
+
+    def aguardar(self, custo: float = 1, espera_max: float = float("inf")) -> None:
+        """Bloqueia até ter as fichas; levanta CotaEsgotada se passaria de espera_max."""
+        aguardar_todos([(self, custo)], espera_max)
+
+
+def aguardar_todos(pedidos: list, espera_max: float = float("inf")) -> None:
+    """
+    Reserva [(limitador, custo), ...] de uma vez e espera o mais lento.
+    Se algum passaria de espera_max, desfaz as reservas e levanta CotaEsgotada.
+    """
+    esperas = []
+    for limitador_taxa, custo in pedidos:
+        espera = limitador_taxa.reservar(custo, espera_max)
+        if espera is None:
+            for feito, custo_feito in pedidos[:len(esperas)]:
+                feito.devolver(custo_feito)
+            metrics.COTA_ESGOTADA.inc(api=limitador_taxa.nome)
+            raise CotaEsgotada(f"Cota de '{limitador_taxa.nome}' esgotada (espera > {espera_max:.1f}s)")
+        esperas.append(espera)
+
+    for (limitador_taxa, _), espera in zip(pedidos, esperas):
+        metrics.ESPERA_COTA_SEGUNDOS.observar(espera, api=limitador_taxa.nome)
+    if esperas and max(esperas) > 0:
+        time.sleep(max(esperas))
+
+
+# ============================================================
+# LIMITADORES COMPARTILHADOS (configurados por core.config)
+# ============================================================
+
+_limitadores = {}
+_limitadores_lock = threading.Lock()
+
+
+def _criar_da_config(nome: str) -> LimitadorTaxa:
+    from core.config import SHEETS_COTA_POR_MINUTO, GEMINI_RPM, GEMINI_TPM
+
+    por_minuto = {
+        "sheets": SHEETS_COTA_POR_MINUTO,
+        "gemini_rpm": GEMINI_RPM,
+        "gemini_tpm": GEMINI_TPM,
+    }[nome]
+    return LimitadorTaxa(nome, por_minuto)
+
+
+def limitador(nome: str) -> LimitadorTaxa:
+    """Balde compartilhado da API `nome` ("sheets", "gemini_rpm", "gemini_tpm")."""
+    with _limitadores_lock:
+        if nome not in _limitadores:
+            _limitadores[nome] = _criar_da_config(nome)
+        return _limitadores[nome]
+
+
+def definir_limitador(limitador_taxa: LimitadorTaxa) -> None:
+    """Substitui um balde compartilhado (testes, loadtest)."""
+    with _limitadores_lock:
+        _limitadores[limitador_taxa.nome] = limitador_taxa
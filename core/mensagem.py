@@ -0,0 +1,65 @@
+"""
+core/mensagem.py — Um bloco de texto preparado uma vez para os extratores.
+
+Antes, cada extrator do classificador refazia o próprio pré-processamento
+sobre a string crua (.lower(), varredura de números, regex de dias com e
+sem acento). Mensagem faz isso uma vez por bloco:
+
+    msg = Mensagem("Paguei R$ 80 na farmacia sábado")
+    msg.dobrado   → "paguei r$ 80 na farmacia sabado"  (minúsculo, sem acento)
+    msg.valores   → [Valor(centavos=8000, ...)]          (core.valores)
+    msg.valor     → o valor principal do bloco
+
+`dobrado` tem o mesmo comprimento de `texto`: um offset achado nele vale
+no original (ex.: o nome do cliente sai com a grafia de quem escreveu).
+O léxico do classificador é dobrado do mesmo jeito na compilação, então
+"farmácia" cobre "farmacia" sem precisar das duas grafias na lista.
+"""
+
+from core.valores import extrair_valores, escolher_principal
+
+_SEM_ACENTO = str.maketrans(
+    "áàâãäéèêëíìîïóòôõöúùûüçñ",
+    "aaaaaeeeeiiiiooooouuuucn",
+)
+
+
+def dobrar(texto: str) -> str:
+    """Minúsculo e sem acento, preservando o comprimento ("Açaí" → "acai")."""
+    dobrado = texto.lower().translate(_SEM_ACENTO)
+    if len(dobrado) != len(texto):
+        # Raro ("İ".lower() tem 2 caracteres): dobra letra a letra para
+        # manter os offsets alinhados com o original
+        dobrado = "".join((c.lower()[:1] or c).translate(_SEM_ACENTO) for c in texto)
+    return dobrado
+
+
+class Mensagem:
+    """Texto de um bloco + as formas derivadas que os extratores consultam."""
+
+    __slots__ = ("texto", "dobrado", "_valores")
+
+    def __init__(self, texto: str):
+        self.texto = texto
+        self.dobrado = dobrar(texto)
+        self._valores = None
+
+    @property
+    def valores(self) -> list:
+        """Valores monetários do bloco, com trecho e centavos (core.valores)."""
+        if self._valores is None:
+            self._valores = extrair_valores(self.texto)
+        return self._valores
+
+    @property
+    def valor(self):
+        """Valor principal do bloco (core.valores.valor_principal), ou None."""
+        return escolher_principal(self.valores)
+
+    def __repr__(self) -> str:
+        return f"Mensagem({self.texto!r})"
+
+
+def como_mensagem(texto) -> Mensagem:
+    """Aceita str ou Mensagem; evita preparar de novo o que já veio pronto."""
+    return texto if isinstance(texto, Mensagem) else Mensagem(texto)
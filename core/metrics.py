@@ -0,0 +1,309 @@
+"""
+core/metrics.py — Métricas do GessoBot.
+
+JanelaLatencia guarda as últimas N amostras (em segundos) num buffer
+circular e calcula percentis sob demanda (usada pelo /status).
+
+Histograma e Contador seguem o modelo do Prometheus e são expostos em
+formato texto (OpenMetrics/Prometheus) por um endpoint HTTP local
+opcional, iniciado pelo bot quando METRICS_PORTA > 0. Registrar uma
+amostra custa um bisect e um incremento sob lock — barato o bastante
+para ficar ligado em produção.
+
+Tudo aqui é thread-safe: as amostras chegam tanto do event loop quanto
+das threads do pipeline.
+"""
+
+import bisect
+import logging
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+
+def _percentil(ordenadas: list, p: float) -> float:
+    if not ordenadas:
+        return 0.0
+    idx = min(len(ordenadas) - 1, int(round(p / 100 * (len(ordenadas) - 1))))
+    return ordenadas[idx]
+
+
+class JanelaLatencia:
+    """Janela deslizante de latências com cálculo de p50/p99."""
+
+    def __init__(self, tamanho: int = 1000):
+        self._amostras = deque(maxlen=tamanho)
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def registrar(self, segundos: float) -> None:
+        with self._lock:
+            self._amostras.append(segundos)
+            self._total += 1
+
+    def percentil(self, p: float) -> float:
+        """Percentil p (0–100) das amostras na janela; 0.0 se vazia."""
+        with self._lock:
+            ordenadas = sorted(self._amostras)
+        return _percentil(ordenadas, p)
+
+    def resumo(self) -> dict:
+        with self._lock:
+            ordenadas = sorted(self._amostras)
+            total = self._total
+        return {
+            "n": len(ordenadas),
+            "total": total,
+            "p50": _percentil(ordenadas, 50),
+            "p99": _percentil(ordenadas, 99),
+            "max": ordenadas[-1] if ordenadas else 0.0,
+        }
+
+
+# ============================================================
+# MÉTRICAS NO MODELO PROMETHEUS
+# ============================================================
+
+_REGISTRO = []   # métricas em ordem de criação
+_COLETORES = []  # funções chamadas a cada exportação
+
+
+def _formatar_rotulos(nomes: tuple, valores: tuple, extra: str = "") -> str:
+    pares = [f'{n}="{str(v)}"' for n, v in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+class Contador:
+    """Contador monotônico, opcionalmente com rótulos."""
+
+    def __init__(self, nome: str, ajuda: str, rotulos: tuple = ()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = rotulos
+        self._valores = {}
+        self._lock = threading.Lock()
+        _REGISTRO.append(self)
+
+    def inc(self, n: float = 1, **rotulos) -> None:
+        chave = tuple(rotulos.get(r, "") for r in self.rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + n
+
+    def valor(self, **rotulos) -> float:
+        chave = tuple(rotulos.get(r, "") for r in self.rotulos)
+        with self._lock:
+            return self._valores.get(chave, 0)
+
+    def exportar(self) -> list:
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} counter"]
+        with self._lock:
+            itens = sorted(self._valores.items())
+        for chave, v in itens:
+            linhas.append(f"{self.nome}_total{_formatar_rotulos(self.rotulos, chave)} {v}")
+        return linhas
+
+
+class Medidor(Contador):
+    """Valor instantâneo (gauge): sobe e desce."""
+
+    def dec(self, n: float = 1, **rotulos) -> None:
+        self.inc(-n, **rotulos)
+
+    def definir(self, valor: float, **rotulos) -> None:
+        chave = tuple(rotulos.get(r, "") for r in self.rotulos)
+        with self._lock:
+            self._valores[chave] = valor
+
+    def exportar(self) -> list:
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} gauge"]
+        with self._lock:
+            itens = sorted(self._valores.items())
+        for chave, v in itens:
+            linhas.append(f"{self.nome}{_formatar_rotulos(self.rotulos, chave)} {v}")
+        return linhas
+
+
+class Histograma:
+    """Histograma de buckets fixos (limites superiores, em ordem crescente)."""
+
+    LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self, nome: str, ajuda: str, buckets: tuple = LATENCIA, rotulos: tuple = ()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.buckets = tuple(buckets)
+        self.rotulos = rotulos
+        self._series = {}  # rótulos → [contagens por bucket..., +Inf], soma
+        self._lock = threading.Lock()
+        _REGISTRO.append(self)
+
+    def observar(self, valor: float, **rotulos) -> None:
+        chave = tuple(rotulos.get(r, "") for r in self.rotulos)
+        idx = bisect.bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.get(chave)
+            if serie is None:
+                serie = self._series[chave] = [[0] * (len(self.buckets) + 1), 0.0]
+            serie[0][idx] += 1
+            serie[1] += valor
+
+    def exportar(self) -> list:
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} histogram"]
+        with self._lock:
+            series = sorted((k, (list(c), s)) for k, (c, s) in self._series.items())
+        for chave, (contagens, soma) in series:
+            acumulado = 0
+            for limite, n in zip(self.buckets + (float("inf"),), contagens):
+                acumulado += n
+                le = "+Inf" if limite == float("inf") else repr(float(limite))
+                rot = _formatar_rotulos(self.rotulos, chave, 'le="' + le + '"')
+                linhas.append(f"{self.nome}_bucket{rot} {acumulado}")
+            rot = _formatar_rotulos(self.rotulos, chave)
+            linhas.append(f"{self.nome}_count{rot} {acumulado}")
+            linhas.append(f"{self.nome}_sum{rot} {soma}")
+        return linhas
+
+
+def registrar_coletor(coletor) -> None:
+    """
+    Registra uma função chamada a cada exportação, que devolve linhas já
+    formatadas — para métricas que vivem em outro lugar (ex.: cache).
+    """
+    _COLETORES.append(coletor)
+
+
+def exportar() -> str:
+    """Todas as métricas no formato texto do Prometheus/OpenMetrics."""
+    linhas = []
+    for metrica in _REGISTRO:
+        linhas.extend(metrica.exportar())
+    for coletor in _COLETORES:
+        try:
+            linhas.extend(coletor())
+        except Exception as e:
+            logger.warning(f"Coletor de métricas falhou: {e}")
+    linhas.append("# EOF")
+    return "\n".join(linhas) + "\n"
+
+
+# ============================================================
+# ENDPOINT HTTP
+# ============================================================
+
+class _HandlerMetricas(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        corpo = exportar().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/openmetrics-text; version=1.0.0; charset=utf-8")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, format, *args):
+        pass  # scrapes a cada poucos segundos não devem poluir o log
+
+
+def iniciar_servidor_metricas(porta: int, endereco: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Sobe o endpoint /metrics numa thread daemon."""
+    servidor = ThreadingHTTPServer((endereco, porta), _HandlerMetricas)
+    threading.Thread(target=servidor.serve_forever, name="gessobot-metrics", daemon=True).start()
+    logger.info(f"Métricas em http://{endereco}:{porta}/metrics")
+    return servidor
+
+
+# ============================================================
+# MÉTRICAS DO BOT
+# ============================================================
+
+# Latência ponta a ponta do handle_message (recebimento → resposta enviada)
+LATENCIA_HANDLER = JanelaLatencia()
+
+HANDLER_SEGUNDOS = Histograma(
+    "gessobot_handler_segundos", "Latência ponta a ponta do handle_message."
+)
+# Recebimento → primeira resposta entregue (a confirmação imediata, no
+# modo progressivo; senão, a resposta final)
+LATENCIA_PRIMEIRA_RESPOSTA = JanelaLatencia()
+
+PRIMEIRA_RESPOSTA_SEGUNDOS = Histograma(
+    "gessobot_primeira_resposta_segundos", "Tempo até a primeira resposta ao usuário."
+)
+SPLIT_CPU_SEGUNDOS = Histograma(
+    "gessobot_split_cpu_segundos", "Tempo de CPU do split_intencoes por mensagem.",
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025),
+)
+CLASSIFY_CPU_SEGUNDOS = Histograma(
+    "gessobot_classify_cpu_segundos",
+    "Tempo de CPU do classify_text por mensagem (exclui a espera pelo Gemini).",
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05),
+)
+GEMINI_SEGUNDOS = Histograma(
+    "gessobot_gemini_segundos", "Latência das chamadas ao Gemini.", rotulos=("resultado",)
+)
+GEMINI_TOKENS = Histograma(
+    "gessobot_gemini_tokens", "Tokens por chamada ao Gemini (usage_metadata).",
+    buckets=(25, 50, 100, 200, 400, 800, 1600, 3200, 6400), rotulos=("tipo",),
+)
+GEMINI_EVENTOS_DESCARTADOS = Contador(
+    "gessobot_gemini_eventos_descartados", "Eventos da resposta do Gemini que não passaram na validação."
+)
+SHEETS_SEGUNDOS = Histograma(
+    "gessobot_sheets_segundos", "Latência das escritas no Sheets por aba.", rotulos=("aba",)
+)
+REGISTRAR_LOTE_EVENTOS = Histograma(
+    "gessobot_registrar_lote_eventos", "Eventos por chamada de registrar_eventos.",
+    buckets=(1, 2, 3, 4, 5, 8, 13, 21),
+)
+BLOCOS = Contador(
+    "gessobot_blocos", "Blocos classificados, por camada que os resolveu.", rotulos=("camada",)
+)
+MODELO_LOCAL = Contador(
+    "gessobot_modelo_local", "Consultas ao classificador local, por resultado.", rotulos=("resultado",)
+)
+MOLDE_SEGUNDOS = Histograma(
+    "gessobot_molde_segundos", "Tempo por bloco na camada regex, por resultado do cache de moldes.",
+    buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025), rotulos=("resultado",),
+)
+EVENTOS_ANTECIPADOS = Contador(
+    "gessobot_eventos_antecipados",
+    "Eventos do regex gravados enquanto o Gemini classificava o resto da mensagem.",
+)
+SHEETS_ERROS = Contador(
+    "gessobot_sheets_erros", "Falhas de escrita no Sheets por aba.", rotulos=("aba",)
+)
+UPDATES_EM_EXECUCAO = Medidor(
+    "gessobot_updates_em_execucao", "Updates sendo processados agora."
+)
+UPDATES_NA_FILA = Medidor(
+    "gessobot_updates_na_fila", "Updates esperando a vez do seu chat ou uma vaga global."
+)
+UPDATES_REJEITADOS = Contador(
+    "gessobot_updates_rejeitados", "Updates descartados por fila do chat cheia."
+)
+DISJUNTOR_ESTADO = Medidor(
+    "gessobot_disjuntor_estado", "Estado do disjuntor: 0 fechado, 1 meio-aberto, 2 aberto.",
+    rotulos=("dependencia",),
+)
+DISJUNTOR_RECUSAS = Contador(
+    "gessobot_disjuntor_recusas", "Chamadas recusadas na hora por disjuntor aberto.",
+    rotulos=("dependencia",),
+)
+ESPERA_COTA_SEGUNDOS = Histograma(
+    "gessobot_espera_cota_segundos", "Espera por fichas no limitador de taxa, por API.",
+    rotulos=("api",),
+)
+COTA_ESGOTADA = Contador(
+    "gessobot_cota_esgotada", "Chamadas não feitas por falta de cota dentro da espera máxima.",
+    rotulos=("api",),
+)
+ESPERA_FILA_SEGUNDOS = Histograma(
+    "gessobot_espera_fila_segundos", "Tempo entre a chegada do update e o início do processamento."
+)
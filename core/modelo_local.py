@@ -0,0 +1,253 @@
+"""
+core/modelo_local.py — Classificador local entre o regex e o Gemini.
+
+Bloco que o regex não resolve ia direto para o Gemini (pago, ~1 s).
+Antes disso, um Naive Bayes multinomial sobre n-gramas de caracteres do
+bloco (dobrado, números trocados por "0") dá um rótulo com uma
+probabilidade; o classificador só aceita acima do limiar
+(MODELO_LOCAL_LIMIAR) — abaixo, o bloco segue para o Gemini como antes.
+
+Rótulo = tipo do evento e tags: "receita", "nao_classificado",
+"despesa_servico:material", "despesa_pessoal:alimentacao,saude"...
+"despesa" (genérica) não é rótulo: é justamente o que o Gemini resolve.
+
+Treinado offline (treinar_modelo.py) com o histórico rotulado: respostas
+do Gemini no cache em disco e linhas exportadas da planilha. O arquivo é
+JSON com as contagens; ModeloArquivo recarrega (numa thread à parte) quando
+o mtime muda, então trocar o arquivo troca o modelo sem reiniciar o bot.
+"""
+
+import os
+import re
+import json
+import math
+import time
+import logging
+import threading
+from collections import Counter
+from datetime import datetime
+
+from core.mensagem import dobrar
+
+logger = logging.getLogger(__name__)
+
+VERSAO_FORMATO = 1
+TIPOS_COM_TAGS = ("despesa_servico", "despesa_pessoal")
+
+# Abaixo disso (fração dos n-gramas do bloco vistos no treino) o bloco é
+# diferente demais do histórico: a probabilidade do NB não quer dizer nada
+COBERTURA_MINIMA = 0.5
+
+_RE_NUMERO = re.compile(r'\d+(?:[.,]\d+)*')
+_RE_ESPACOS = re.compile(r'\s+')
+
+
+# ================================================================
+# RÓTULOS
+# ================================================================
+
+def rotulo_do_evento(tipo: str, tags=None) -> str | None:
+    """Rótulo de treino de um evento, ou None se não serve como exemplo."""
+    if tipo in ("receita", "nao_classificado"):
+        return tipo
+    if tipo in TIPOS_COM_TAGS:
+        return f"{tipo}:{','.join(sorted(tags))}" if tags else tipo
+    return None
+
+
+def tipo_e_tags(rotulo: str) -> tuple:
+    """Inverso de rotulo_do_evento(): ("despesa_servico", ("material",))."""
+    tipo, _, tags = rotulo.partition(":")
+    return tipo, tuple(tags.split(",")) if tags else ()
+
+
+# ================================================================
+# N-GRAMAS
+# ================================================================
+
+def ngramas(texto: str, n_min: int = 3, n_max: int = 5) -> Counter:
+    """N-gramas de caracteres do texto dobrado, com espaço nas pontas."""
+    t = " " + _RE_ESPACOS.sub(" ", _RE_NUMERO.sub("0", dobrar(texto))).strip() + " "
+    return Counter(t[i:i + n] for n in range(n_min, n_max + 1) for i in range(len(t) - n + 1))
+
+
+# ================================================================
+# MODELO
+# ================================================================
+
+class ModeloLocal:
+    """
+    Naive Bayes multinomial com suavização aditiva (alpha). Guarda as
+    contagens (formato do arquivo) e, derivado delas, um índice invertido
+    n-grama → {rótulo: Δ log-prob}: a previsão só visita os rótulos que
+    viram cada n-grama do bloco.
+
+    Cada caractere entra em n n-gramas de cada tamanho n, e o NB conta a
+    mesma evidência todas essas vezes — a probabilidade sai perto de 1
+    até para bloco ambíguo. A verossimilhança é dividida por Σn (12 para
+    3..5) antes de normalizar, para o limiar separar certeza de chute.
+    """
+
+    def __init__(self, contagens: dict, documentos: dict, alpha: float = 0.5,
+                 n_min: int = 3, n_max: int = 5, treinado_em: str = ""):
+        self.contagens = contagens    # rótulo → {n-grama: nº}
+        self.documentos = documentos  # rótulo → nº de exemplos
+        self.alpha = alpha
+        self.n_min, self.n_max = n_min, n_max
+        self.treinado_em = treinado_em
+
+        self.rotulos = sorted(documentos)
+        vocabulario = set()
+        for cont in contagens.values():
+            vocabulario.update(cont)
+        total_docs = sum(documentos.values())
+        v = len(vocabulario)
+        temperatura = sum(range(n_min, n_max + 1))
+
+        self._prior = []
+        self._ausente = []  # log-prob de um n-grama que o rótulo não viu
+        self._indice = {}
+        for i, rotulo in enumerate(self.rotulos):
+            cont = contagens.get(rotulo, {})
+            denominador = sum(cont.values()) + alpha * v
+            ausente = math.log(alpha / denominador)
+            self._prior.append(math.log(documentos[rotulo] / total_docs))
+            self._ausente.append(ausente / temperatura)
+            for ng, c in cont.items():
+                delta = math.log((c + alpha) / denominador) - ausente
+                self._indice.setdefault(ng, {})[i] = delta / temperatura
+
+    @property
+    def exemplos(self) -> int:
+        return sum(self.documentos.values())
+
+    @classmethod
+    def treinar(cls, exemplos, alpha: float = 0.5, n_min: int = 3, n_max: int = 5) -> "ModeloLocal":
+        """`exemplos`: [(texto, rótulo)]."""
+        contagens, documentos = {}, Counter()
+        for texto, rotulo in exemplos:
+            contagens.setdefault(rotulo, Counter()).update(ngramas(texto, n_min, n_max))
+            documentos[rotulo] += 1
+        if not documentos:
+            raise ValueError("sem exemplos para treinar")
+        return cls({r: dict(c) for r, c in contagens.items()}, dict(documentos),
+                   alpha, n_min, n_max, datetime.now().isoformat(timespec="seconds"))
+
+    def prever(self, texto: str) -> tuple:
+        """
+        (rótulo, probabilidade) do rótulo mais provável. (None, 0.0) se o
+        bloco tem poucos n-gramas conhecidos (COBERTURA_MINIMA).
+        """
+        grams = ngramas(texto, self.n_min, self.n_max)
+        total = sum(grams.values())
+        conhecidos = 0
+        scores = [p + total * a for p, a in zip(self._prior, self._ausente)]
+        for ng, c in grams.items():
+            deltas = self._indice.get(ng)
+            if deltas is None:
+                continue
+            conhecidos += c
+            for i, d in deltas.items():
+                scores[i] += c * d
+        if not total or conhecidos / total < COBERTURA_MINIMA:
+            return None, 0.0
+
+        melhor = max(range(len(scores)), key=scores.__getitem__)
+        topo = scores[melhor]
+        prob = 1.0 / sum(math.exp(s - topo) for s in scores)
+        return self.rotulos[melhor], prob
+
+    # ── arquivo ───────────────────────────────────────────────────
+
+    def para_json(self) -> dict:
+        return {
+            "versao": VERSAO_FORMATO,
+            "treinado_em": self.treinado_em,
+            "alpha": self.alpha,
+            "n_gramas": [self.n_min, self.n_max],
+            "documentos": self.documentos,
+            "contagens": self.contagens,
+        }
+
+    @classmethod
+    def de_json(cls, dados: dict) -> "ModeloLocal":
+        if dados.get("versao") != VERSAO_FORMATO:
+            raise ValueError(f"formato de modelo desconhecido: {dados.get('versao')!r}")
+        n_min, n_max = dados["n_gramas"]
+        return cls(dados["contagens"], dados["documentos"], dados["alpha"],
+                   n_min, n_max, dados.get("treinado_em", ""))
+
+    def salvar(self, caminho: str) -> None:
+        """Grava num temporário e troca: quem recarrega nunca lê arquivo pela metade."""
+        temporario = f"{caminho}.tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump(self.para_json(), f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(temporario, caminho)
+
+    @classmethod
+    def carregar(cls, caminho: str) -> "ModeloLocal":
+        with open(caminho, encoding="utf-8") as f:
+            return cls.de_json(json.load(f))
+
+
+class ModeloArquivo:
+    """
+    Modelo servido a partir de um arquivo, recarregado quando o mtime
+    muda, com o limiar de aceitação da previsão. Arquivo ausente = sem
+    modelo; arquivo inválido mantém o modelo anterior.
+
+    atual() roda no event loop (via classificar_regex): só lê o modelo já
+    carregado. Passado o `intervalo`, dispara a conferência do arquivo
+    (os.stat e, se mudou, a leitura do JSON) numa thread à parte — a troca
+    vale a partir da mensagem seguinte. recarregar() faz o mesmo na hora,
+    para a partida do bot e os testes.
+    """
+
+    def __init__(self, caminho: str, limiar: float = 0.9, intervalo: float = 5.0):
+        self.caminho = caminho
+        self.limiar = limiar
+        self.intervalo = intervalo
+        self._modelo = None
+        self._mtime = None
+        self._conferido_em = float("-inf")
+        self._lock = threading.Lock()  # preso durante a conferência
+
+    def atual(self) -> ModeloLocal | None:
+        modelo = self._modelo
+        if time.monotonic() - self._conferido_em >= self.intervalo and self._lock.acquire(blocking=False):
+            # Lock (não RLock): a thread da conferência é quem solta
+            threading.Thread(target=self._conferir, name="gessobot-modelo-local", daemon=True).start()
+        return modelo
+
+    def recarregar(self) -> ModeloLocal | None:
+        """Confere o arquivo agora, na thread de quem chama."""
+        with self._lock:
+            self._recarregar_se_mudou()
+            self._conferido_em = time.monotonic()
+        return self._modelo
+
+    def _conferir(self) -> None:
+        try:
+            self._recarregar_se_mudou()
+        finally:
+            self._conferido_em = time.monotonic()
+            self._lock.release()
+
+    def _recarregar_se_mudou(self) -> None:
+        try:
+            mtime = os.stat(self.caminho).st_mtime_ns
+        except OSError:
+            if self._modelo is not None:
+                logger.info(f"Modelo local removido ({self.caminho}).")
+            self._modelo, self._mtime = None, None
+            return
+        if mtime == self._mtime:
+            return
+        self._mtime = mtime
+        try:
+            self._modelo = ModeloLocal.carregar(self.caminho)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Modelo local inválido em {self.caminho}, mantendo o anterior: {e}")
+            return
+        logger.info(f"Modelo local carregado: {self._modelo.exemplos} exemplos, "
+                    f"{len(self._modelo.rotulos)} rótulos (treinado em {self._modelo.treinado_em}).")
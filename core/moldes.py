@@ -0,0 +1,115 @@
+"""
+core/moldes.py — Caminho rápido por molde de bloco.
+
+Boa parte do tráfego repete as mesmas formas com números e nomes
+diferentes ("paguei o ajudante 300", "recebi 500 do Zé"). O molde de um
+bloco é o texto com as lacunas — valores, dias da semana, nomes — trocadas
+por marcadores do seu tipo; CacheMoldes é um LRU limitado de molde →
+esqueleto da classificação já resolvida (pelo regex ou pelo Gemini). No
+acerto, o classificador pula o léxico (e o LLM) e só preenche as lacunas.
+
+Quais trechos podem virar lacuna é decisão do classificador: um trecho
+que pode mudar o resultado do léxico tem de ficar literal no molde.
+
+Nos esqueletos vindos do Gemini, os textos das lacunas que aparecem nos
+campos (valor, cliente, descrição) viram marcadores com abstrair() e
+voltam com os textos do novo bloco em preencher().
+"""
+
+import threading
+from collections import OrderedDict
+from typing import NamedTuple
+
+# Marcadores em área de uso privado do Unicode: não aparecem em mensagens
+_INICIO_LACUNA = "\ue000"
+_FIM_LACUNA = "\ue001"
+_MARCADOR_BASE = 0xE100
+
+
+class Molde(NamedTuple):
+    chave: str
+    lacunas: tuple  # texto de cada lacuna no bloco, na ordem
+    tipos: tuple    # tipo de cada lacuna, na mesma ordem
+
+
+def montar_molde(texto: str, lacunas: list) -> Molde:
+    """
+    `lacunas`: [(inicio, fim, tipo, texto_da_lacuna)] sem sobreposição, em
+    ordem. A chave é `texto` com cada trecho trocado pelo marcador do tipo.
+    """
+    partes, textos, tipos, pos = [], [], [], 0
+    for inicio, fim, tipo, texto_lacuna in lacunas:
+        partes.append(texto[pos:inicio])
+        partes.append(f"{_INICIO_LACUNA}{tipo}{_FIM_LACUNA}")
+        textos.append(texto_lacuna)
+        tipos.append(tipo)
+        pos = fim
+    partes.append(texto[pos:])
+    return Molde("".join(partes), tuple(textos), tuple(tipos))
+
+
+def abstrair(texto: str, lacunas: tuple) -> str:
+    """Troca os textos das lacunas em `texto` pelos marcadores (mais longos primeiro)."""
+    for i in sorted(range(len(lacunas)), key=lambda i: len(lacunas[i]), reverse=True):
+        if lacunas[i]:
+            texto = texto.replace(lacunas[i], chr(_MARCADOR_BASE + i))
+    return texto
+
+
+def preencher(texto: str, lacunas: tuple) -> str:
+    """Inverso de abstrair(), com as lacunas de outro bloco do mesmo molde."""
+    for i, lacuna in enumerate(lacunas):
+        texto = texto.replace(chr(_MARCADOR_BASE + i), lacuna)
+    return texto
+
+
+class CacheMoldes:
+    """LRU de molde → esqueleto, com acertos por origem do esqueleto e tempo por bloco."""
+
+    def __init__(self, max_itens: int = 2000):
+        self.max_itens = max_itens
+        self._itens = OrderedDict()  # chave → (fonte, esqueleto)
+        self._lock = threading.Lock()
+        self._stats = {
+            "acertos_regex": 0,
+            "acertos_gemini": 0,
+            "faltas": 0,
+            "segundos_acerto": 0.0,
+            "segundos_falta": 0.0,
+        }
+
+    def obter(self, chave: str):
+        """(fonte, esqueleto) do molde, ou None."""
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is not None:
+                self._itens.move_to_end(chave)
+            return item
+
+    def guardar(self, chave: str, fonte: str, esqueleto) -> None:
+        with self._lock:
+            self._itens[chave] = (fonte, esqueleto)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+
+    def registrar(self, resultado: str, segundos: float) -> None:
+        """resultado: "regex" / "gemini" (acerto, pela origem do esqueleto) ou "falta"."""
+        with self._lock:
+            if resultado == "falta":
+                self._stats["faltas"] += 1
+                self._stats["segundos_falta"] += segundos
+            else:
+                self._stats[f"acertos_{resultado}"] += 1
+                self._stats["segundos_acerto"] += segundos
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entradas"] = len(self._itens)
+        acertos = stats["acertos_regex"] + stats["acertos_gemini"]
+        total = acertos + stats["faltas"]
+        stats["taxa_acerto"] = acertos / total if total else 0.0
+        stats["us_por_acerto"] = stats["segundos_acerto"] / acertos * 1e6 if acertos else 0.0
+        stats["us_por_falta"] = stats["segundos_falta"] / stats["faltas"] * 1e6 if stats["faltas"] else 0.0
+        return stats
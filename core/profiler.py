@@ -0,0 +1,178 @@
+"""
+core/profiler.py — Profiler por amostragem do GessoBot.
+
+Uma thread separada lê sys._current_frames() a cada `intervalo` segundos
+e conta as pilhas das threads que estão dentro de um trecho marcado
+(classificação, gravação no Sheets). Não usa sys.setprofile: o código
+perfilado roda sem instrumentação, e o custo fica na thread amostradora.
+
+Dois modos:
+  - sessão: /profile <segundos> amostra todos os trechos durante a janela
+  - contínuo: com um_em_n = N, 1 a cada N mensagens é amostrada o tempo
+    todo e as pilhas se acumulam em `continuo`
+
+O resultado sai em dois formatos: tabela das funções mais quentes e
+pilhas colapsadas ("a;b;c 42"), aceitas pelo flamegraph.pl e pelo
+speedscope.
+"""
+
+import os
+import re
+import sys
+import time
+import threading
+import itertools
+from collections import Counter
+from contextlib import contextmanager
+
+
+def _nome_frame(frame, folha: bool = False) -> str:
+    codigo = frame.f_code
+    arquivo = os.path.basename(codigo.co_filename)
+    # Na folha a linha identifica a regex/chamada exata; no resto da
+    # pilha ela só fragmentaria o flamegraph.
+    if folha:
+        return f"{codigo.co_name} ({arquivo}:{frame.f_lineno})"
+    return f"{codigo.co_name} ({arquivo})"
+
+
+def _sem_linha(nome: str) -> str:
+    return re.sub(r":\d+\)$", ")", nome)
+
+
+def _pilha(frame) -> tuple:
+    """Pilha da raiz para a folha."""
+    nomes = [_nome_frame(frame, folha=True)]
+    frame = frame.f_back
+    while frame is not None:
+        nomes.append(_nome_frame(frame))
+        frame = frame.f_back
+    nomes.reverse()
+    return tuple(nomes)
+
+
+class Perfilador:
+
+    def __init__(self, intervalo: float = 0.005, um_em_n: int = 0):
+        self.intervalo = intervalo
+        self.um_em_n = um_em_n
+        self.continuo = Counter()
+        self._lock = threading.Lock()
+        self._em_foco = {}  # ident da thread → [profundidade, amostragem contínua]
+        self._sessao = None
+        self._trabalho = threading.Event()
+        self._thread = None
+        self._mensagens = itertools.count()
+
+    # ── Marcação dos trechos ────────────────────────────────────
+
+    def sortear_mensagem(self) -> bool:
+        """True para 1 a cada `um_em_n` mensagens (modo contínuo)."""
+        return self.um_em_n > 0 and next(self._mensagens) % self.um_em_n == 0
+
+    @contextmanager
+    def trecho(self, continuo: bool = False):
+        """Marca a thread atual como perfilável enquanto o bloco roda."""
+        ident = threading.get_ident()
+        with self._lock:
+            foco = self._em_foco.setdefault(ident, [0, False])
+            foco[0] += 1
+            foco[1] = foco[1] or continuo
+            if continuo or self._sessao is not None:
+                self._garantir_thread()
+                self._trabalho.set()
+        try:
+            yield
+        finally:
+            with self._lock:
+                foco[0] -= 1
+                if foco[0] == 0:
+                    del self._em_foco[ident]
+
+    def executar(self, func, *args, continuo: bool = False):
+        """func(*args) dentro de um trecho — para submeter a executores."""
+        with self.trecho(continuo):
+            return func(*args)
+
+    # ── Sessões (/profile) ───────────────────────────────────────
+
+    def iniciar_sessao(self) -> None:
+        with self._lock:
+            if self._sessao is not None:
+                raise RuntimeError("Já existe um perfil em andamento")
+            self._sessao = Counter()
+            self._garantir_thread()
+            self._trabalho.set()
+
+    def encerrar_sessao(self) -> Counter:
+        with self._lock:
+            pilhas, self._sessao = self._sessao, None
+        return pilhas if pilhas is not None else Counter()
+
+    # ── Amostragem ──────────────────────────────────────────────
+
+    def _garantir_thread(self) -> None:
+        # Chamado com self._lock adquirido
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._amostrar, name="gessobot-profiler", daemon=True
+            )
+            self._thread.start()
+
+    def _amostrar(self) -> None:
+        while True:
+            self._trabalho.wait()
+            with self._lock:
+                sessao = self._sessao
+                alvos = [(ident, foco[1]) for ident, foco in self._em_foco.items()]
+                if sessao is None and not any(c for _, c in alvos):
+                    self._trabalho.clear()
+                    continue
+
+            frames = sys._current_frames()
+            for ident, continuo in alvos:
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                pilha = _pilha(frame)
+                with self._lock:
+                    if sessao is not None and self._sessao is sessao:
+                        sessao[pilha] += 1
+                    if continuo:
+                        self.continuo[pilha] += 1
+            del frames  # não prende os frames das outras threads até a próxima volta
+            time.sleep(self.intervalo)
+
+
+# ============================================================
+# RELATÓRIOS
+# ============================================================
+
+def colapsar(pilhas: Counter) -> str:
+    """Formato de pilhas colapsadas: uma linha "raiz;...;folha contagem"."""
+    return "".join(
+        f"{';'.join(pilha)} {n}\n" for pilha, n in pilhas.most_common()
+    )
+
+
+def funcoes_quentes(pilhas: Counter, n: int = 15) -> list:
+    """
+    [(função, % próprio, % inclusivo)] ordenado pelo tempo próprio.
+    Próprio = amostras em que a função estava no topo da pilha.
+    """
+    total = sum(pilhas.values())
+    if not total:
+        return []
+    proprio, inclusivo = Counter(), Counter()
+    for pilha, contagem in pilhas.items():
+        proprio[pilha[-1]] += contagem
+        for nome in {_sem_linha(nome) for nome in pilha}:  # recursão conta uma vez
+            inclusivo[nome] += contagem
+    return [
+        (nome, 100 * c / total, 100 * inclusivo[_sem_linha(nome)] / total)
+        for nome, c in proprio.most_common(n)
+    ]
+
+
+# Instância global; o bot ajusta um_em_n a partir da config no startup
+PERFILADOR = Perfilador()
@@ -0,0 +1,152 @@
+"""
+core/resposta.py — Resposta progressiva no Telegram.
+
+Quando a mensagem ainda vai esperar o Gemini ou o Sheets, o bot responde
+na hora com a leitura do regex e depois edita essa mesma mensagem conforme
+as etapas lentas terminam:
+
+    resposta = RespostaProgressiva(update.message, chat_id)
+    resposta.enviar(texto_do_regex)     # não bloqueia
+    resposta.atualizar(texto_parcial)   # agenda uma edição
+    await resposta.concluir(texto_final)
+
+Edições intermediárias são coalescidas: cada chat tem um balde
+(core.limites) de uma edição a cada `intervalo` segundos, com rajada
+curta; enquanto a vez não chega, só o texto mais recente fica pendente, e
+textos iguais ao já publicado não geram chamada. Um RetryAfter do
+Telegram espera o tempo pedido e tenta de novo com o texto mais recente.
+
+A versão final não espera a vez: concluir() roda no handler, com a vez do
+chat e uma vaga do ProcessadorPorChat presas, e mensagens seguidas do
+mesmo chat ficariam no ritmo do balde. Ela descarta a intermediária que
+ainda esperava e sai na hora (conta no balde, mas sem esperar); só um
+RetryAfter a manda para o segundo plano.
+"""
+
+import time
+import asyncio
+import logging
+import contextlib
+from collections import OrderedDict
+
+from telegram.error import RetryAfter, TelegramError
+
+from core.limites import LimitadorTaxa
+
+logger = logging.getLogger(__name__)
+
+# Chamadas seguidas permitidas por chat antes de cair no ritmo do intervalo
+# (a confirmação e a versão final de uma mensagem rápida cabem na rajada)
+RAJADA_EDICOES = 3
+
+_MAX_CHATS = 256
+_baldes = OrderedDict()
+_em_segundo_plano = set()  # edições que sobrevivem ao handler (o loop só guarda referência fraca)
+
+
+def _balde_do_chat(chat_id, intervalo: float) -> LimitadorTaxa:
+    balde = _baldes.get(chat_id)
+    if balde is None:
+        balde = _baldes[chat_id] = LimitadorTaxa(
+            "telegram_edicao", por_minuto=60.0 / intervalo if intervalo > 0 else 0,
+            rajada=RAJADA_EDICOES,
+        )
+    _baldes.move_to_end(chat_id)
+    while len(_baldes) > _MAX_CHATS:
+        _baldes.popitem(last=False)
+    return balde
+
+
+def _segundos(retry_after) -> float:
+    return retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else float(retry_after)
+
+
+class RespostaProgressiva:
+
+    def __init__(self, mensagem, chat_id, intervalo: float = 1.0, parse_mode: str = "Markdown"):
+        self._origem = mensagem
+        self._balde = _balde_do_chat(chat_id, intervalo)
+        self._parse_mode = parse_mode
+        self._envio = None
+        self._editor = None
+        self._chamada = None  # edição intermediária em voo
+        self._publicado = None
+        self._pendente = None
+        self.enviada_em = None  # perf_counter da primeira resposta entregue
+
+    def enviar(self, texto: str) -> None:
+        """Dispara a primeira resposta sem esperar a ida e volta à Bot API."""
+        self._balde.reservar(1)  # conta na rajada, mas nunca espera
+        self._publicado = texto
+        self._envio = asyncio.ensure_future(self._responder(texto))
+
+    def atualizar(self, texto: str) -> None:
+        """Agenda a edição para `texto`; substitui o que ainda não foi enviado."""
+        self._pendente = texto
+        if self._editor is None or self._editor.done():
+            self._editor = asyncio.ensure_future(self._editar())
+            _em_segundo_plano.add(self._editor)
+            self._editor.add_done_callback(_em_segundo_plano.discard)
+
+    async def concluir(self, texto: str) -> None:
+        """Publica o texto final já, sem esperar a vez no balde do chat."""
+        self._pendente = None
+        if self._editor is not None:
+            self._editor.cancel()  # a intermediária que esperava a vez fica obsoleta
+        if self._chamada is not None:
+            with contextlib.suppress(TelegramError):
+                await self._chamada  # a final não pode chegar antes da intermediária em voo
+        mensagem = await self._envio
+        if texto == self._publicado:
+            return
+        self._balde.reservar(1)
+        try:
+            await self._publicar(mensagem, texto)
+        except RetryAfter:
+            self.atualizar(texto)  # o editor respeita a pausa, fora do handler
+        except TelegramError as e:
+            logger.warning(f"Falha ao editar a resposta: {e}")
+
+    async def _responder(self, texto: str):
+        try:
+            mensagem = await self._origem.reply_text(texto, parse_mode=self._parse_mode)
+        except TelegramError as e:
+            logger.warning(f"Falha ao enviar a confirmação imediata: {e}")
+            self._publicado = None
+            return None
+        if self.enviada_em is None:
+            self.enviada_em = time.perf_counter()
+        return mensagem
+
+    async def _publicar(self, mensagem, texto: str):
+        """Edita para `texto`; sem confirmação entregue, manda como mensagem nova."""
+        if mensagem is None:
+            self._envio = asyncio.ensure_future(self._responder(texto))
+            mensagem = await self._envio
+            if mensagem is not None:
+                self._publicado = texto
+            return mensagem
+        await mensagem.edit_text(texto, parse_mode=self._parse_mode)
+        self._publicado = texto
+        return mensagem
+
+    async def _editar(self) -> None:
+        # shield: cancelar o editor (concluir) não pode cancelar o envio nem a edição em voo
+        mensagem = await asyncio.shield(self._envio)
+        while self._pendente is not None:
+            espera = self._balde.reservar(1)
+            if espera:
+                await asyncio.sleep(espera)  # o que chegar até lá substitui o pendente
+            texto, self._pendente = self._pendente, None
+            if texto == self._publicado:
+                self._balde.devolver(1)
+                continue
+            self._chamada = asyncio.ensure_future(self._publicar(mensagem, texto))
+            try:
+                mensagem = await asyncio.shield(self._chamada)
+            except RetryAfter as e:
+                if self._pendente is None:
+                    self._pendente = texto
+                await asyncio.sleep(_segundos(e.retry_after))
+            except TelegramError as e:
+                logger.warning(f"Falha ao editar a resposta: {e}")
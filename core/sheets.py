@@ -12,16 +12,45 @@ Cada aba tem colunas:
   Descrição | Frase Original | Aviso
 
 Autenticação: Service Account (JSON key definido em .env).
+
+Escrita: por padrão registrar_eventos só grava no journal local
+(core/journal.py) e um flusher em segundo plano envia ao Sheets.
+Com SHEETS_WRITE_BEHIND=0 a escrita é síncrona, direto na planilha.
+
+Cota: toda requisição HTTP do gspread passa pelo limitador "sheets"
+(core/limites.py). Sem cota dentro de SHEETS_COTA_ESPERA, a escrita
+falha com CotaEsgotada e as linhas ficam no journal para depois.
+
+Disponibilidade: as escritas passam pelo DISJUNTOR_SHEETS
+(core/disjuntor.py). Com o Sheets fora, elas falham na hora com
+CircuitoAberto e as linhas também ficam no journal.
 """
 
 import re
+import time
 import logging
+import threading
 from datetime import datetime
 
 import gspread
 from google.oauth2.service_account import Credentials
 
-from core.config import SHEETS_CREDENTIALS_PATH, SPREADSHEET_ID
+from core.config import (
+    SHEETS_CREDENTIALS_PATH,
+    SPREADSHEET_ID,
+    SHEETS_CACHE_TTL,
+    SHEETS_WRITE_BEHIND,
+    SHEETS_JOURNAL_PATH,
+    SHEETS_FLUSH_INTERVALO,
+    SHEETS_COTA_ESPERA,
+)
+from core.journal import Journal, FlusherSheets
+from core import metrics
+from core.profiler import PERFILADOR
+from core.limites import CotaEsgotada, limitador
+from core.disjuntor import Disjuntor, CircuitoAberto
+from core.valores import para_centavos, formatar_centavos
+from core.evento import Evento
 
 logger = logging.getLogger(__name__)
 
@@ -65,6 +94,14 @@ CABECALHO = [
 # CLIENTE GSPREAD (singleton simples)
 # ============================================================
 
+class _HTTPClientComCota(gspread.HTTPClient):
+    """HTTPClient do gspread que reserva uma ficha de cota por requisição."""
+
+    def request(self, *args, **kwargs):
+        limitador("sheets").aguardar(1, SHEETS_COTA_ESPERA)
+        return super().request(*args, **kwargs)
+
+
 _gc = None
 
 def _get_client() -> gspread.Client:
@@ -73,27 +110,140 @@ def _get_client() -> gspread.Client:
         creds = Credentials.from_service_account_file(
             SHEETS_CREDENTIALS_PATH, scopes=SCOPES
         )
-        _gc = gspread.authorize(creds)
+        _gc = gspread.authorize(creds, http_client=_HTTPClientComCota)
     return _gc
 
 
+# ============================================================
+# CACHE DE HANDLES (Spreadsheet + Worksheet por aba)
+#
+# Abrir a planilha e localizar a aba custa duas chamadas de metadados.
+# Os handles ficam em cache por SHEETS_CACHE_TTL segundos e são
+# descartados quando uma operação falha com erro de handle obsoleto
+# (aba renomeada/apagada, planilha recriada etc.).
+#
+# O _cache_lock só protege os dicionários: a rede (e a espera pela cota,
+# até SHEETS_COTA_ESPERA) fica fora dele, para uma aba lenta não travar
+# quem acha a sua no cache.
+# ============================================================
+
+_cache_lock = threading.RLock()
+_criacao_lock = threading.Lock()  # duas threads não criam a mesma aba
+_spreadsheet = None
+_spreadsheet_expira = 0.0
+_abas: dict = {}  # nome_aba → (Worksheet, expira_em)
+
+# APIError de handle velho (aba apagada ou renomeada), não de Sheets fora
+_RE_HANDLE_OBSOLETO = re.compile(r"grid id|grid with id|unable to parse range", re.IGNORECASE)
+
+
+def _get_spreadsheet() -> gspread.Spreadsheet:
+    """Retorna o handle da planilha, reabrindo apenas quando o cache expira."""
+    global _spreadsheet, _spreadsheet_expira
+    with _cache_lock:
+        if _spreadsheet is not None and time.monotonic() < _spreadsheet_expira:
+            return _spreadsheet
+
+    spreadsheet = _get_client().open_by_key(SPREADSHEET_ID)
+    with _cache_lock:
+        _spreadsheet = spreadsheet
+        _spreadsheet_expira = time.monotonic() + SHEETS_CACHE_TTL
+        _abas.clear()  # handles de aba pertencem à planilha anterior
+    return spreadsheet
+
+
+def _invalidar_cache(nome_aba: str | None = None) -> None:
+    """Descarta o handle de uma aba (ou de tudo, se nome_aba for None)."""
+    global _spreadsheet
+    with _cache_lock:
+        if nome_aba is None:
+            _spreadsheet = None
+            _abas.clear()
+        else:
+            _abas.pop(nome_aba, None)
+
+
+def _criar_aba(spreadsheet: gspread.Spreadsheet, nome_aba: str) -> gspread.Worksheet:
+    ws = spreadsheet.add_worksheet(title=nome_aba, rows=1000, cols=len(CABECALHO))
+    ws.append_row(CABECALHO, value_input_option="RAW")
+    # Formata cabeçalho: negrito + fundo cinza
+    _formatar_cabecalho(spreadsheet, ws)
+    logger.info(f"Aba '{nome_aba}' criada.")
+    return ws
+
+
 def _get_sheet(nome_aba: str) -> gspread.Worksheet:
-    """Retorna a aba pelo nome, criando-a se não existir."""
-    gc = _get_client()
-    spreadsheet = gc.open_by_key(SPREADSHEET_ID)
+    """Retorna a aba pelo nome (do cache quando possível), criando-a se não existir."""
+    with _cache_lock:
+        cacheada = _abas.get(nome_aba)
+        if cacheada and time.monotonic() < cacheada[1]:
+            return cacheada[0]
 
+    spreadsheet = _get_spreadsheet()
     try:
         ws = spreadsheet.worksheet(nome_aba)
     except gspread.WorksheetNotFound:
-        ws = spreadsheet.add_worksheet(title=nome_aba, rows=1000, cols=len(CABECALHO))
-        ws.append_row(CABECALHO, value_input_option="RAW")
-        # Formata cabeçalho: negrito + fundo cinza
-        _formatar_cabecalho(spreadsheet, ws)
-        logger.info(f"Aba '{nome_aba}' criada.")
-
+        with _criacao_lock:
+            try:
+                ws = spreadsheet.worksheet(nome_aba)  # outra thread pode ter criado
+            except gspread.WorksheetNotFound:
+                ws = _criar_aba(spreadsheet, nome_aba)
+
+    with _cache_lock:
+        if _spreadsheet is spreadsheet:  # a planilha não foi reaberta nesse meio-tempo
+            _abas[nome_aba] = (ws, time.monotonic() + SHEETS_CACHE_TTL)
     return ws
 
 
+def _handle_obsoleto(e: Exception) -> bool:
+    """WorksheetNotFound, 404 ou grid id inválido: o handle em cache não serve mais."""
+    if isinstance(e, gspread.WorksheetNotFound):
+        return True
+    if isinstance(e, gspread.exceptions.APIError):
+        return e.code == 404 or (e.code == 400 and bool(_RE_HANDLE_OBSOLETO.search(e.error.get("message", ""))))
+    return False
+
+
+def _na_aba(nome_aba: str, operacao):
+    """
+    Executa operacao(ws) na aba. Se o handle em cache estiver obsoleto
+    (_handle_obsoleto), descarta o cache e tenta uma vez mais com handles
+    recém-abertos. Qualquer outro erro sobe sem repetir: append_rows não é
+    idempotente — num 5xx ou timeout a escrita pode ter entrado — e o
+    disjuntor e o journal cuidam do Sheets fora.
+    """
+    try:
+        return operacao(_get_sheet(nome_aba))
+    except (gspread.WorksheetNotFound, gspread.exceptions.APIError) as e:
+        if not _handle_obsoleto(e):
+            raise
+        logger.warning(f"Handle da aba '{nome_aba}' inválido ({e}); recarregando.")
+        _invalidar_cache()
+        return operacao(_get_sheet(nome_aba))
+
+
+# ============================================================
+# DISJUNTOR
+# ============================================================
+
+def _falha_de_disponibilidade(e: Exception) -> bool:
+    """Só erros que indicam o Sheets fora contam para abrir o disjuntor."""
+    if isinstance(e, (CotaEsgotada, gspread.WorksheetNotFound)):
+        return False
+    if isinstance(e, gspread.exceptions.APIError):
+        return e.code >= 500 or e.code == -1
+    return True  # rede, timeout, credenciais
+
+
+def _sondar_sheets() -> None:
+    _get_client().open_by_key(SPREADSHEET_ID)
+
+
+DISJUNTOR_SHEETS = Disjuntor(
+    "sheets", sonda=_sondar_sheets, conta_como_falha=_falha_de_disponibilidade
+)
+
+
 def _formatar_cabecalho(spreadsheet: gspread.Spreadsheet, ws: gspread.Worksheet):
     """Aplica formatação básica ao cabeçalho da aba."""
     try:
@@ -144,54 +294,42 @@ def _formatar_cabecalho(spreadsheet: gspread.Spreadsheet, ws: gspread.Worksheet)
 
 def _normalizar_valor(valor_str: str) -> str:
     """
-    Converte string de valor para float e formata como moeda brasileira.
-    Aceita: '2.500', '2500', '1.200,50', '1200.50'
-    Retorna: '2500.00' (float string para o Sheets calcular)
+    Converte o valor para o formato que o Sheets calcula, via centavos
+    inteiros (core.valores) — sem arredondamento de float.
+    Aceita: '2.500', '2500', '1.200,50', '1200.50', '2,5 mil', '1k'
+    Retorna: '2500.00'; se não houver número, devolve a string como veio.
     """
     if not valor_str:
         return ""
-    v = valor_str.strip()
-    # Remove pontos de milhar e converte vírgula decimal
-    if "." in v and "," in v:
-        # 1.200,50 → 1200.50
-        v = v.replace(".", "").replace(",", ".")
-    elif "." in v and v.count(".") == 1 and len(v.split(".")[-1]) != 3:
-        # 1200.50 → já é decimal
-        pass
-    elif "." in v:
-        # 2.500 → 2500 (ponto de milhar)
-        v = v.replace(".", "")
-    elif "," in v:
-        # 2500,50 → 2500.50
-        v = v.replace(",", ".")
-    try:
-        return str(float(v))
-    except ValueError:
-        return valor_str
+    centavos = para_centavos(valor_str)
+    return formatar_centavos(centavos) if centavos is not None else valor_str
 
 
 # ============================================================
 # MONTAR LINHA
 # ============================================================
 
-def _montar_linha(evento: dict, frase_original: str, timestamp: datetime) -> list:
+def _montar_linha(evento: Evento, frase_original: str, timestamp: datetime) -> list:
     """
     Monta a lista de valores que vai para uma linha do Sheets.
     Ordem: CABECALHO
     """
-    dados = evento.get("dados", {})
-    tipo  = evento.get("tipo", "")
+    tipo  = evento.tipo.value
 
     data_hora = timestamp.strftime("%d/%m/%Y %H:%M")
-    dias      = ", ".join(dados.get("dias", [])) if dados.get("dias") else ""
-    tags      = ", ".join(dados.get("tags", [])) if dados.get("tags") else ""
-    valor     = _normalizar_valor(dados.get("valor", ""))
-    cliente   = dados.get("cliente", "")
-    aviso     = dados.get("aviso", "")
+    dias      = ", ".join(evento.dias) if evento.dias else ""
+    tags      = ", ".join(evento.tags) if evento.tags else ""
+    # Centavos já lidos na classificação; sem eles, o texto como veio
+    if evento.centavos is not None:
+        valor = formatar_centavos(evento.centavos)
+    else:
+        valor = _normalizar_valor(evento.valor or "")
+    cliente   = evento.cliente or ""
+    aviso     = evento.aviso or ""
 
     # Descrição: usa a descrição limpa se existir e for informativa;
     # caso contrário, usa a frase original como fallback
-    descricao_limpa = (dados.get("descricao") or "").strip()
+    descricao_limpa = (evento.descricao or "").strip()
     descricao = descricao_limpa if descricao_limpa else frase_original
 
     return [
@@ -206,6 +344,79 @@ def _montar_linha(evento: dict, frase_original: str, timestamp: datetime) -> lis
     ]
 
 
+# ============================================================
+# ESCRITA EM LOTE
+# ============================================================
+
+def _gravar_linhas(linhas_por_aba: dict) -> dict:
+    """
+    Grava as linhas agrupadas por aba com um único append_rows por aba.
+
+    Recebe {nome_aba: [linha, ...]} e retorna {nome_aba: erro_ou_None}:
+    uma falha afeta apenas as linhas da aba em que ocorreu.
+    """
+    falhas = {}
+    for nome_aba, linhas in linhas_por_aba.items():
+        inicio = time.perf_counter()
+        try:
+            with PERFILADOR.trecho():
+                DISJUNTOR_SHEETS.chamar(
+                    _na_aba, nome_aba,
+                    lambda ws: ws.append_rows(linhas, value_input_option="USER_ENTERED"),
+                )
+            falhas[nome_aba] = None
+            logger.info(f"{len(linhas)} linha(s) registrada(s) em '{nome_aba}'.")
+        except Exception as e:
+            logger.error(f"Erro ao registrar em '{nome_aba}': {e}")
+            falhas[nome_aba] = e
+            metrics.SHEETS_ERROS.inc(aba=nome_aba)
+        metrics.SHEETS_SEGUNDOS.observar(time.perf_counter() - inicio, aba=nome_aba)
+    return falhas
+
+
+# ============================================================
+# WRITE-BEHIND (journal + flusher)
+# ============================================================
+
+_journal = None
+_flusher = None
+_wb_lock = threading.Lock()
+
+
+def _get_flusher() -> FlusherSheets:
+    """Abre o journal e inicia o flusher na primeira utilização."""
+    global _journal, _flusher
+    with _wb_lock:
+        if _flusher is None:
+            _journal = Journal(SHEETS_JOURNAL_PATH)
+            _flusher = FlusherSheets(_journal, _gravar_linhas, intervalo=SHEETS_FLUSH_INTERVALO)
+            _flusher.start()
+            pendentes = _journal.contar()
+            if pendentes:
+                logger.info(f"Journal com {pendentes} linha(s) pendente(s) de execuções anteriores.")
+                _flusher.acordar()
+        return _flusher
+
+
+def iniciar_write_behind() -> None:
+    """Inicia o flusher no startup (drena o que ficou pendente)."""
+    if SHEETS_WRITE_BEHIND:
+        _get_flusher()
+
+
+def encerrar_write_behind() -> None:
+    """Shutdown gracioso: envia ao Sheets tudo que está no journal."""
+    global _flusher
+    with _wb_lock:
+        flusher, _flusher = _flusher, None
+    if flusher is not None:
+        # Disjuntor aberto recusaria o flush final sem nem tentar
+        DISJUNTOR_SHEETS.testar_agora()
+        flusher.encerrar()
+        if not flusher.is_alive():  # presa no Sheets, ainda vai confirmar no journal
+            flusher.journal.fechar()
+
+
 # ============================================================
 # FUNÇÃO PRINCIPAL
 # ============================================================
@@ -213,9 +424,17 @@ def _montar_linha(evento: dict, frase_original: str, timestamp: datetime) -> lis
 def registrar_eventos(eventos: list, frase_original: str) -> dict:
     """
     Recebe a lista de eventos do classifier e registra cada um
-    na aba correta do Google Sheets.
+    na aba correta do Google Sheets. As linhas são agrupadas por aba
+    e enviadas num único append_rows por aba.
 
-    Retorna um dict com o resumo do que foi registrado:
+    Com write-behind ativo, as linhas são gravadas no journal local e
+    contam como sucesso assim que persistidas; o envio ao Sheets é
+    feito pelo flusher. Se o journal falhar, grava direto na planilha.
+    Na escrita direta, abas sem cota ou com o Sheets fora (disjuntor
+    aberto) vão para o journal em vez de falhar.
+
+    Retorna um dict com o resumo do que foi registrado
+    (uma entrada por evento, na ordem dos eventos):
     {
         "sucesso": [...nomes das abas onde registrou...],
         "erros":   [...mensagens de erro...]
@@ -223,21 +442,44 @@ def registrar_eventos(eventos: list, frase_original: str) -> dict:
     """
     timestamp = datetime.now()
     resultado = {"sucesso": [], "erros": []}
+    metrics.REGISTRAR_LOTE_EVENTOS.observar(len(eventos))
 
+    abas_eventos = []
+    linhas_por_aba = {}
     for evento in eventos:
-        tipo     = evento.get("tipo", "nao_classificado")
-        nome_aba = ABA_POR_TIPO.get(tipo, "Não Classificado")
+        nome_aba = ABA_POR_TIPO.get(evento.tipo, "Não Classificado")
+        abas_eventos.append(nome_aba)
+        linhas_por_aba.setdefault(nome_aba, []).append(
+            _montar_linha(evento, frase_original, timestamp)
+        )
 
+    falhas = None
+    if SHEETS_WRITE_BEHIND:
         try:
-            ws   = _get_sheet(nome_aba)
-            linha = _montar_linha(evento, frase_original, timestamp)
-            ws.append_row(linha, value_input_option="USER_ENTERED")
-            resultado["sucesso"].append(nome_aba)
-            logger.info(f"Evento '{tipo}' registrado em '{nome_aba}'.")
+            flusher = _get_flusher()
+            flusher.journal.anexar(linhas_por_aba)
+            flusher.acordar()
+            falhas = {}
         except Exception as e:
-            msg = f"Erro ao registrar em '{nome_aba}': {e}"
-            logger.error(msg)
-            resultado["erros"].append(msg)
+            logger.error(f"Journal indisponível, gravando direto no Sheets: {e}")
+    if falhas is None:
+        falhas = _gravar_linhas(linhas_por_aba)
+        adiadas = {aba: linhas_por_aba[aba] for aba, erro in falhas.items()
+                   if isinstance(erro, (CotaEsgotada, CircuitoAberto))}
+        if adiadas:
+            try:
+                _get_flusher().journal.anexar(adiadas)
+                falhas.update(dict.fromkeys(adiadas))
+                logger.warning(f"Sheets sem cota ou fora; {len(adiadas)} aba(s) adiada(s) para o journal.")
+            except Exception as e:
+                logger.error(f"Journal indisponível para adiar as linhas: {e}")
+
+    for nome_aba in abas_eventos:
+        erro = falhas.get(nome_aba)
+        if erro is None:
+            resultado["sucesso"].append(nome_aba)
+        else:
+            resultado["erros"].append(f"Erro ao registrar em '{nome_aba}': {erro}")
 
     return resultado
 
@@ -252,6 +494,15 @@ def inicializar_planilha():
     Chamar uma vez no startup do bot.
     """
     abas = list(dict.fromkeys(ABA_POR_TIPO.values()))  # mantém ordem, sem duplicatas
+
+    # Uma única listagem de abas popula o cache; só as ausentes geram chamadas extras
+    spreadsheet = _get_spreadsheet()
+    existentes = spreadsheet.worksheets()
+    with _cache_lock:
+        expira = time.monotonic() + SHEETS_CACHE_TTL
+        for ws in existentes:
+            _abas[ws.title] = (ws, expira)
+
     for nome_aba in abas:
         try:
             _get_sheet(nome_aba)
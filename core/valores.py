@@ -0,0 +1,124 @@
+"""
+core/valores.py — Valores monetários em centavos inteiros.
+
+Um único regex compilado varre o texto uma vez e devolve todos os valores
+com o trecho de origem. O valor vai para centavos (int) sem passar por
+float, e o classificador, a montagem da linha do Sheets e
+core/extractors usam todos o mesmo tokenizador.
+
+Formas reconhecidas:
+  2500 · 75          inteiro
+  2.500 · 1.200,50   milhar com ponto (decimal com vírgula)
+  2,500 · 1,200.50   milhar com vírgula (decimal com ponto)
+  80,50 · 1200.50    decimal (1 ou 2 casas; a vírgula/ponto com 3 dígitos
+                     depois de 1–3 dígitos é milhar)
+  2,5 mil · 1k       multiplicador de milhar
+  R$ 50 · R$50       prefixo de moeda (entra no trecho)
+"""
+
+import re
+from typing import NamedTuple
+
+
+_RE_VALOR = re.compile(
+    r"(?P<moeda>R\$\s*)?"
+    r"\b(?P<numero>"
+    r"(?P<milhar_ponto>\d{1,3}(?:\.\d{3})+(?:,\d+)?)"
+    r"|(?P<milhar_virgula>\d{1,3}(?:,\d{3})+(?:\.\d+)?)"
+    r"|(?P<simples>\d+(?:[.,]\d+)?)"
+    r")"
+    # "1k" não tem fronteira de palavra entre o número e o k
+    r"(?:\s*(?P<mult>mil|k)\b|\b)",
+    re.IGNORECASE,
+)
+
+
+class Valor(NamedTuple):
+    centavos: int
+    inicio: int      # trecho inteiro, com "R$" e "mil"/"k"
+    fim: int
+    texto: str       # o número como escrito, com o multiplicador ("2,5 mil")
+    prioridade: int  # 0 = milhar/multiplicador … 3 = 1 dígito sem "R$"
+
+
+def _centavos(inteiro: str, fracao: str) -> int:
+    """Parte inteira (só dígitos) + fração → centavos, arredondando meio para cima."""
+    centavos = int(inteiro) * 100
+    if fracao:
+        escala = 10 ** len(fracao)
+        centavos += (int(fracao) * 200 + escala) // (2 * escala)
+    return centavos
+
+
+def _ler(m: re.Match) -> Valor:
+    if m.group("milhar_ponto"):
+        inteiro, _, fracao = m.group("milhar_ponto").partition(",")
+        inteiro = inteiro.replace(".", "")
+    elif m.group("milhar_virgula"):
+        inteiro, _, fracao = m.group("milhar_virgula").partition(".")
+        inteiro = inteiro.replace(",", "")
+    else:
+        inteiro, fracao = _partir_simples(m.group("simples"))
+
+    centavos = _centavos(inteiro, fracao)
+    if m.group("mult"):
+        centavos *= 1000
+
+    # Prioridade do valor principal de um bloco (ver valor_principal)
+    if m.group("mult") or not m.group("simples"):
+        prioridade = 0
+    elif len(inteiro) >= 4:
+        prioridade = 1
+    elif len(inteiro) >= 2 or m.group("moeda"):
+        prioridade = 2
+    else:
+        prioridade = 3
+
+    return Valor(centavos, m.start(), m.end(), m.string[m.start("numero"):m.end()], prioridade)
+
+
+def _partir_simples(numero: str) -> tuple:
+    """"2500" → ("2500", ""); "80,50" / "1200.5" → (inteiro, fração)."""
+    for sep in ",.":
+        if sep in numero:
+            inteiro, _, fracao = numero.partition(sep)
+            return inteiro, fracao
+    return numero, ""
+
+
+def extrair_valores(texto: str) -> list:
+    """Todos os valores do texto, na ordem em que aparecem."""
+    return [_ler(m) for m in _RE_VALOR.finditer(texto)]
+
+
+def valor_principal(texto: str) -> Valor | None:
+    """
+    O valor do bloco: o de menor prioridade, o mais à esquerda no empate.
+    Separador de milhar ou multiplicador ganham de um número de 4+ dígitos,
+    que ganha de 2–3 dígitos. Parte inteira de 1 dígito ("5", "2,5") só
+    conta com "R$" — num bloco cortado no meio de "2,5 mil", "2,5" não é
+    o valor.
+    """
+    return escolher_principal(extrair_valores(texto))
+
+
+def escolher_principal(valores: list) -> Valor | None:
+    """valor_principal sobre valores já extraídos (ex.: Mensagem.valores)."""
+    melhor = None
+    for valor in valores:
+        if valor.prioridade < 3 and (melhor is None or valor.prioridade < melhor.prioridade):
+            melhor = valor
+    return melhor
+
+
+def para_centavos(texto: str) -> int | None:
+    """Centavos do primeiro valor em `texto` (ex.: "1.200,50" → 120050), ou None."""
+    m = _RE_VALOR.search(texto or "")
+    return _ler(m).centavos if m else None
+
+
+def formatar_centavos(centavos: int) -> str:
+    """120050 → "1200.50" (ponto decimal, sem milhar — formato que o Sheets lê)."""
+    sinal = "-" if centavos < 0 else ""
+    centavos = abs(centavos)
+    return f"{sinal}{centavos // 100}.{centavos % 100:02d}"
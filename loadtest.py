@@ -0,0 +1,344 @@
+"""
+loadtest.py
+===========
+Teste de carga ponta a ponta do GessoBot, sem rede.
+Execute: python loadtest.py [--usuarios 50] [--mensagens 10] ...
+
+Injeta Updates sintéticos direto em bot.handle_message, com dublês
+em processo para as dependências externas:
+  Sheets  — core.fake_sheets.FakeClient no lugar de core.sheets._get_client
+  Gemini  — stub no lugar de core.classifier._chamar_gemini (com o cache
+            de moldes desligado, para o fallback ser sempre exercitado)
+
+Latência e taxa de erro de cada dublê são configuráveis. Ao final, mostra
+vazão, latência ponta a ponta (p50/p95/p99, do update até a resposta
+final), tempo até a primeira resposta (a confirmação imediata, quando a
+resposta é progressiva) e a profundidade da fila do pool do pipeline amostrada durante o teste.
+
+--transporte polling|webhook roda o Application real do python-telegram-bot
+contra core.fake_telegram.FakeBotAPI (RTT configurável): no polling os
+updates saem por getUpdates; no webhook são POSTados, com o secret token,
+no servidor embutido. --transporte comparar roda os dois com o mesmo corpus.
+"""
+
+import os
+import sys
+import time
+import random
+import asyncio
+import logging
+import argparse
+import tempfile
+import socket
+
+_tmp = tempfile.mkdtemp(prefix="gessobot-loadtest-")
+os.environ.setdefault("TELEGRAM_TOKEN", "loadtest")
+os.environ.setdefault("SPREADSHEET_ID", "loadtest")
+os.environ.setdefault("AUTHORIZED_USER_ID", "4242")
+os.environ.setdefault("SHEETS_JOURNAL_PATH", os.path.join(_tmp, "journal.db"))
+os.environ.setdefault("GEMINI_CACHE_PATH", "")
+
+import bot
+from core import classifier, sheets
+from core.fake_sheets import FakeClient
+from core.fake_telegram import FakeBotAPI, montar_update
+from core.evento import Evento, TipoEvento
+from bench_classifier import gerar_corpus_sintetico
+
+logging.disable(logging.WARNING)
+
+
+# ================================================================
+# TELEGRAM FALSO
+# ================================================================
+
+class _Usuario:
+    def __init__(self, id):
+        self.id = id
+
+
+class _Chat:
+    def __init__(self, id):
+        self.id = id
+
+
+class _Mensagem:
+    def __init__(self, texto: str, ao_responder):
+        self.text = texto
+        self._ao_responder = ao_responder
+
+    async def reply_text(self, texto, **kwargs):
+        self._ao_responder()
+        return self  # a resposta progressiva edita a mensagem devolvida
+
+    async def edit_text(self, texto, **kwargs):
+        self._ao_responder()
+
+
+class UpdateFalso:
+    """O suficiente de telegram.Update para o handle_message."""
+
+    def __init__(self, update_id: int, user_id: int, chat_id: int, texto: str, ao_responder):
+        self.update_id = update_id
+        self.effective_user = _Usuario(user_id)
+        self.effective_chat = _Chat(chat_id)
+        self.message = _Mensagem(texto, ao_responder)
+
+
+# ================================================================
+# GEMINI FALSO
+# ================================================================
+
+def criar_gemini_falso(latencia: float, taxa_erro: float, semente: int):
+    rnd = random.Random(semente)
+
+    def _chamar_gemini(texto_original, blocos_inconclusivos):
+        time.sleep(latencia)
+        if rnd.random() < taxa_erro:
+            return []  # mesma degradação do fallback real
+        return [
+            Evento(TipoEvento.DESPESA_PESSOAL, valor="", descricao=b, tags=["lazer"], dias=[],
+                   cliente="", aviso="", fonte="gemini")
+            for b in blocos_inconclusivos
+        ]
+
+    return _chamar_gemini
+
+
+# ================================================================
+# CARGA
+# ================================================================
+
+def _percentil(ordenadas: list, p: float) -> float:
+    if not ordenadas:
+        return 0.0
+    return ordenadas[min(len(ordenadas) - 1, int(round(p / 100 * (len(ordenadas) - 1))))]
+
+
+async def _usuario(chat_id: int, textos: list, pausa: float, latencias: list, primeiras: list,
+                   contador):
+    for texto in textos:
+        inicio = time.perf_counter()
+        respondido = []
+        update = UpdateFalso(next(contador), int(os.environ["AUTHORIZED_USER_ID"]), chat_id,
+                             texto, lambda: respondido.append(time.perf_counter()))
+        await bot.handle_message(update, None)
+        fim = time.perf_counter()
+        primeiras.append((respondido[0] if respondido else fim) - inicio)
+        latencias.append((respondido[-1] if respondido else fim) - inicio)
+        if pausa:
+            await asyncio.sleep(random.uniform(0, 2 * pausa))
+
+
+async def _amostrar_fila(amostras: list, parar: asyncio.Event, intervalo: float = 0.01):
+    fila = bot._executor._work_queue
+    while not parar.is_set():
+        amostras.append(fila.qsize())
+        await asyncio.sleep(intervalo)
+
+
+def _corpus(n: int, semente: int) -> list:
+    corpus = gerar_corpus_sintetico(n, semente)
+    # Parte das mensagens sem categoria, para exercitar o fallback
+    rnd = random.Random(semente)
+    return [m if rnd.random() > 0.2 else f"Paguei {rnd.randint(10, 900)} hoje." for m in corpus]
+
+
+async def _medir(usuarios: int, mensagens: int, semente: int, usuario) -> dict:
+    """Roda `usuario(chat_id, textos, latencias, primeiras, contador)` por chat e resume."""
+    corpus = _corpus(usuarios * mensagens, semente)
+    latencias, primeiras, fila = [], [], []
+    contador = iter(range(1, 10 ** 9))
+    parar = asyncio.Event()
+    amostrador = asyncio.create_task(_amostrar_fila(fila, parar))
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(
+        usuario(1000 + u, corpus[u * mensagens:(u + 1) * mensagens], latencias, primeiras, contador)
+        for u in range(usuarios)
+    ))
+    duracao = time.perf_counter() - inicio
+
+    parar.set()
+    await amostrador
+
+    latencias.sort()
+    primeiras.sort()
+    return {
+        "mensagens": len(latencias),
+        "duracao_s": duracao,
+        "vazao": len(latencias) / duracao if duracao else 0.0,
+        "p50": _percentil(latencias, 50),
+        "p95": _percentil(latencias, 95),
+        "p99": _percentil(latencias, 99),
+        "max": latencias[-1] if latencias else 0.0,
+        "primeira_p50": _percentil(primeiras, 50),
+        "primeira_p95": _percentil(primeiras, 95),
+        "primeira_p99": _percentil(primeiras, 99),
+        "fila_max": max(fila, default=0),
+        "fila_media": sum(fila) / len(fila) if fila else 0.0,
+    }
+
+
+async def rodar_carga(usuarios: int, mensagens: int, pausa: float, semente: int) -> dict:
+    """Chama bot.handle_message direto, sem Telegram no caminho."""
+    return await _medir(usuarios, mensagens, semente,
+                        lambda chat_id, textos, latencias, primeiras, contador:
+                        _usuario(chat_id, textos, pausa, latencias, primeiras, contador))
+
+
+# ================================================================
+# TRANSPORTE TELEGRAM (polling × webhook)
+# ================================================================
+
+SEGREDO_WEBHOOK = "loadtest-segredo"
+
+
+def _porta_livre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def rodar_carga_telegram(transporte: str, usuarios: int, mensagens: int, pausa: float,
+                               semente: int, rtt: float) -> dict:
+    """
+    Mesma carga, entregue pelo Application real. A latência vai do instante
+    em que o "Telegram" recebe a mensagem até o sendMessage do bot chegar a
+    ele; as duas pontas pagam rtt/2 de rede em cada sentido.
+    """
+    import httpx
+
+    api = FakeBotAPI(rtt=rtt)
+    app = bot.criar_aplicacao("123456:loadtest", request=api)
+    user_id = int(os.environ["AUTHORIZED_USER_ID"])
+    extras = {}
+
+    async with app:
+        if transporte == "webhook":
+            porta = _porta_livre()
+            url = f"http://127.0.0.1:{porta}/telegram"
+            await app.updater.start_webhook(
+                listen="127.0.0.1", port=porta, url_path="telegram",
+                webhook_url=url, secret_token=SEGREDO_WEBHOOK,
+            )
+            http = httpx.AsyncClient()
+            cabecalhos = {"X-Telegram-Bot-Api-Secret-Token": SEGREDO_WEBHOOK}
+
+            async def entregar(update):
+                await asyncio.sleep(rtt / 2)  # Telegram → bot
+                r = await http.post(url, json=update, headers=cabecalhos)
+                r.raise_for_status()
+
+            # Sem o segredo, o servidor recusa antes de enfileirar
+            extras["sem_segredo"] = (await http.post(url, json=montar_update(0, user_id, 1, "x"))).status_code
+        else:
+            await app.updater.start_polling(poll_interval=0.0, timeout=10)
+            http = None
+
+            async def entregar(update):
+                api.enfileirar(update)  # o getUpdates pendente devolve em rtt/2
+
+        await app.start()
+
+        async def usuario(chat_id, textos, latencias, primeiras, contador):
+            for texto in textos:
+                inicio = time.perf_counter()
+                await entregar(montar_update(next(contador), user_id, chat_id, texto))
+                instante, resposta = await api.proxima_resposta(chat_id)
+                primeiras.append(instante - inicio)
+                while bot.EM_ANDAMENTO in resposta:  # resposta progressiva: espera a versão final
+                    instante, resposta = await api.proxima_resposta(chat_id)
+                latencias.append(instante - inicio)
+                if pausa:
+                    await asyncio.sleep(random.uniform(0, 2 * pausa))
+
+        try:
+            r = await _medir(usuarios, mensagens, semente, usuario)
+        finally:
+            await app.updater.stop()
+            await app.stop()
+            if http is not None:
+                await http.aclose()
+
+    r.update(extras, transporte=transporte, chamadas_api=dict(api.chamadas))
+    return r
+
+
+def _imprimir(r: dict) -> None:
+    print(f"\n  Mensagens:  {r['mensagens']} em {r['duracao_s']:.1f} s")
+    print(f"  Vazão:      {r['vazao']:.1f} msg/s")
+    print(f"  Latência:   p50 {r['p50'] * 1000:.0f} ms · p95 {r['p95'] * 1000:.0f} ms · "
+          f"p99 {r['p99'] * 1000:.0f} ms · máx {r['max'] * 1000:.0f} ms")
+    print(f"  1ª resposta: p50 {r['primeira_p50'] * 1000:.0f} ms · p95 {r['primeira_p95'] * 1000:.0f} ms · "
+          f"p99 {r['primeira_p99'] * 1000:.0f} ms")
+    print(f"  Fila do pipeline: máx {r['fila_max']} · média {r['fila_media']:.1f}")
+    if "chamadas_api" in r:
+        print(f"  Bot API:    {r['chamadas_api']}")
+    if "sem_segredo" in r:
+        print(f"  POST sem secret token → HTTP {r['sem_segredo']}")
+
+
+# ================================================================
+# RUNNER
+# ================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga do GessoBot")
+    parser.add_argument("--usuarios", type=int, default=50, help="chats simultâneos")
+    parser.add_argument("--mensagens", type=int, default=10, help="mensagens por chat")
+    parser.add_argument("--pausa", type=float, default=0.0, help="pausa média entre mensagens (s)")
+    parser.add_argument("--sheets-latencia", type=float, default=0.15)
+    parser.add_argument("--sheets-erros", type=float, default=0.02)
+    parser.add_argument("--gemini-latencia", type=float, default=0.8)
+    parser.add_argument("--gemini-erros", type=float, default=0.05)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--transporte", choices=("direto", "polling", "webhook", "comparar"),
+                        default="direto", help="como os updates chegam ao bot")
+    parser.add_argument("--telegram-rtt", type=float, default=0.05,
+                        help="ida e volta até a Bot API falsa (s)")
+    args = parser.parse_args()
+
+    fake = FakeClient(latencia=args.sheets_latencia, taxa_erro=args.sheets_erros, semente=args.semente)
+    sheets._get_client = lambda: fake
+    classifier._chamar_gemini = criar_gemini_falso(args.gemini_latencia, args.gemini_erros, args.semente)
+    # Sem moldes: as mensagens "Paguei N hoje." têm de chegar ao stub em toda
+    # rodada, e no --transporte comparar o webhook não pode herdar o cache
+    # aquecido pelo polling
+    classifier._moldes = False
+
+    sheets.inicializar_planilha()
+    sheets.iniciar_write_behind()
+
+    print("\n" + "=" * 60)
+    print("🚚 TESTE DE CARGA — GessoBot")
+    print("=" * 60)
+    print(f"{args.usuarios} chats × {args.mensagens} mensagens · "
+          f"Sheets {args.sheets_latencia * 1000:.0f} ms/{args.sheets_erros:.0%} erro · "
+          f"Gemini {args.gemini_latencia * 1000:.0f} ms/{args.gemini_erros:.0%} erro · "
+          f"{bot.PIPELINE_WORKERS} worker(s)")
+
+    if args.transporte == "direto":
+        _imprimir(asyncio.run(rodar_carga(args.usuarios, args.mensagens, args.pausa, args.semente)))
+    else:
+        transportes = ("polling", "webhook") if args.transporte == "comparar" else (args.transporte,)
+        for transporte in transportes:
+            print(f"\n── {transporte} (RTT {args.telegram_rtt * 1000:.0f} ms) ──")
+            _imprimir(asyncio.run(rodar_carga_telegram(
+                transporte, args.usuarios, args.mensagens, args.pausa,
+                args.semente, args.telegram_rtt,
+            )))
+
+    inicio = time.perf_counter()
+    sheets.encerrar_write_behind()
+    linhas = sum(len(ws.linhas) - 1 for ws in fake.spreadsheet._abas.values())
+    print(f"  Sheets:     {linhas} linha(s) gravada(s), {fake.chamadas} chamada(s), "
+          f"{fake.erros} erro(s) simulado(s); flush final em {time.perf_counter() - inicio:.1f} s")
+    print()
+
+    bot._executor.shutdown(wait=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+"""
+test_bot.py
+===========
+Testes ponta a ponta do bot.py com os dublês do loadtest.py (Sheets e
+Gemini falsos, sem rede): mensagens seguidas do mesmo chat com resposta
+progressiva mantêm a vazão da resposta única, e o main() em modo webhook
+recusa updates sem o segredo certo e drena o journal ao encerrar.
+Execute: python test_bot.py
+"""
+
+import io
+import os
+import json
+import time
+import signal
+import asyncio
+import logging
+import tempfile
+import threading
+import contextlib
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("TELEGRAM_TOKEN", "teste")
+os.environ.setdefault("SPREADSHEET_ID", "teste")
+os.environ.setdefault("AUTHORIZED_USER_ID", "4242")
+
+import bot
+import loadtest
+from core import classifier, sheets, security
+from core.fake_sheets import FakeClient
+from core.fake_telegram import FakeBotAPI, montar_update
+
+logging.disable(logging.ERROR)
+
+
+def _preparar(pasta: str) -> FakeClient:
+    """Planilha falsa com write-behind num journal em `pasta`."""
+    fake = FakeClient()
+    sheets._get_client = lambda: fake
+    sheets._invalidar_cache()
+    sheets.SHEETS_WRITE_BEHIND = bot.SHEETS_WRITE_BEHIND = True
+    sheets.SHEETS_JOURNAL_PATH = os.path.join(pasta, "journal.db")
+    sheets.DISJUNTOR_SHEETS.registrar_sucesso()  # começa fechado
+    # O loadtest responde como AUTHORIZED_USER_ID do ambiente, mesmo que o
+    # core.config tenha sido importado antes por outro teste
+    security.AUTHORIZED_USER_ID = os.environ["AUTHORIZED_USER_ID"]
+    sheets.inicializar_planilha()
+    sheets.iniciar_write_behind()
+    return fake
+
+
+# ================================================================
+# CASOS
+# ================================================================
+
+def test_mensagens_seguidas_com_resposta_progressiva_mantem_a_vazao():
+    # 10 chats × 3 mensagens sem pausa, Gemini de 0,2 s: a versão final não
+    # pode segurar a vez do chat esperando o balde de edições (1 por s)
+    original = classifier._chamar_gemini, classifier._moldes, bot.RESPOSTA_PROGRESSIVA
+    classifier._chamar_gemini = loadtest.criar_gemini_falso(0.2, 0.0, 42)
+    classifier._moldes = False
+    vazao = {}
+    with tempfile.TemporaryDirectory() as pasta:
+        _preparar(pasta)
+        try:
+            for progressiva in (False, True):
+                bot.RESPOSTA_PROGRESSIVA = progressiva
+                vazao[progressiva] = asyncio.run(loadtest.rodar_carga(10, 3, 0.0, 42))["vazao"]
+        finally:
+            sheets.encerrar_write_behind()
+            classifier._chamar_gemini, classifier._moldes, bot.RESPOSTA_PROGRESSIVA = original
+    assert vazao[True] >= 0.8 * vazao[False], vazao
+
+
+def _postar(url: str, update: dict, segredo: str | None) -> int:
+    """POST do update como o Telegram faria; retorna o status HTTP."""
+    cabecalhos = {"Content-Type": "application/json"}
+    if segredo is not None:
+        cabecalhos["X-Telegram-Bot-Api-Secret-Token"] = segredo
+    pedido = urllib.request.Request(url, json.dumps(update).encode(), cabecalhos)
+    try:
+        with urllib.request.urlopen(pedido, timeout=5) as r:
+            return r.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def _linhas_gravadas(fake: FakeClient) -> int:
+    return sum(len(aba.linhas) - 1 for aba in fake.spreadsheet._abas.values())  # sem cabeçalhos
+
+
+def test_webhook_recusa_segredo_errado_e_drena_o_journal_ao_encerrar():
+    # O main() de verdade: o SIGTERM para o Application e o finally grava
+    # no Sheets o que o flusher não conseguiu gravar enquanto ele estava fora
+    porta = loadtest._porta_livre()
+    url = f"http://127.0.0.1:{porta}/telegram"
+    segredo = "segredo-do-teste"
+    user_id = int(os.environ["AUTHORIZED_USER_ID"])
+    api = FakeBotAPI(rtt=0.0)
+    criar_aplicacao = bot.criar_aplicacao
+    originais = {nome: getattr(bot, nome) for nome in (
+        "BOT_MODO", "WEBHOOK_ESCUTA", "WEBHOOK_PORTA", "WEBHOOK_CAMINHO", "WEBHOOK_URL",
+        "WEBHOOK_SEGREDO", "RESPOSTA_PROGRESSIVA", "criar_aplicacao", "iniciar_cliente_gemini",
+        "iniciar_modelo_local", "_executor")}
+    original_gemini, original_intervalo = classifier._chamar_gemini, sheets.SHEETS_FLUSH_INTERVALO
+    bot.BOT_MODO, bot.WEBHOOK_ESCUTA, bot.WEBHOOK_PORTA = "webhook", "127.0.0.1", porta
+    bot.WEBHOOK_CAMINHO, bot.WEBHOOK_URL, bot.WEBHOOK_SEGREDO = "telegram", f"http://127.0.0.1:{porta}", segredo
+    bot.RESPOSTA_PROGRESSIVA = False
+    bot.criar_aplicacao = lambda: criar_aplicacao("123456:teste", request=api)
+    bot.iniciar_cliente_gemini = lambda: None
+    bot.iniciar_modelo_local = lambda: None
+    bot._executor = ThreadPoolExecutor(max_workers=4)  # o main() desliga o seu no fim
+    classifier._chamar_gemini = loadtest.criar_gemini_falso(0.0, 0.0, 42)
+    sheets.SHEETS_FLUSH_INTERVALO = 60  # só o acordar() de cada registro dispara o flush
+    status, gravadas_antes = {}, None
+
+    def telegram():
+        nonlocal gravadas_antes
+        prazo = time.monotonic() + 10
+        while True:  # até o servidor do webhook subir
+            try:
+                status["sem"] = _postar(url, montar_update(1, user_id, 1, "Paguei 500 hoje."), None)
+                break
+            except urllib.error.URLError:
+                if time.monotonic() > prazo:
+                    raise
+                time.sleep(0.02)
+        status["errado"] = _postar(url, montar_update(2, user_id, 1, "Paguei 500 hoje."), "outro")
+        status["certo"] = _postar(url, montar_update(3, user_id, 2, "Paguei 500 hoje."), segredo)
+        while not any(chat == 2 for _, chat, _ in api.respostas) and time.monotonic() < prazo:
+            time.sleep(0.01)
+        gravadas_antes = _linhas_gravadas(fake)
+        fake.fora_do_ar = False
+        os.kill(os.getpid(), signal.SIGTERM)
+
+    with tempfile.TemporaryDirectory() as pasta:
+        fake = _preparar(pasta)
+        fake.fora_do_ar = True  # o registro fica no journal até o encerramento
+        cliente = threading.Thread(target=telegram, daemon=True)
+        try:
+            cliente.start()
+            with contextlib.redirect_stdout(io.StringIO()):
+                bot.main()
+            cliente.join(5)
+            gravadas_depois = _linhas_gravadas(fake)
+            pendentes = sheets.Journal(sheets.SHEETS_JOURNAL_PATH).contar()
+        finally:
+            asyncio.set_event_loop(None)  # o run_webhook fecha o loop que deixou como atual
+            sheets.encerrar_write_behind()
+            for nome, valor in originais.items():
+                setattr(bot, nome, valor)
+            classifier._chamar_gemini, sheets.SHEETS_FLUSH_INTERVALO = original_gemini, original_intervalo
+
+    assert status == {"sem": 403, "errado": 403, "certo": 200}, status
+    assert {chat for _, chat, _ in api.respostas} == {2}  # os recusados nem chegaram ao handler
+    assert gravadas_antes == 0
+    assert gravadas_depois == 1 and pendentes == 0, (gravadas_depois, pendentes)
+
+
+# ================================================================
+# RUNNER
+# ================================================================
+
+def main():
+    casos = [
+        test_mensagens_seguidas_com_resposta_progressiva_mantem_a_vazao,
+        test_webhook_recusa_segredo_errado_e_drena_o_journal_ao_encerrar,
+    ]
+    for caso in casos:
+        caso()
+        print(f"  ✅ {caso.__name__}")
+    print(f"\n{len(casos)} caso(s) OK.")
+
+
+if __name__ == "__main__":
+    main()
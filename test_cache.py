@@ -0,0 +1,216 @@
+"""
+test_cache.py
+=============
+Testes do CacheRespostas: acerto em memória e em disco, reinício pelo
+SQLite, TTL, LRU da memória e limite do disco, resultado vazio fora do
+cache e single-flight (no sucesso e com o cálculo interrompido).
+Execute: python test_cache.py
+"""
+
+import os
+import time
+import tempfile
+import threading
+
+from core.cache import CacheRespostas, chave_blocos
+
+
+def _contando(valor):
+    """calcular() que devolve `valor` e conta as chamadas em .chamadas."""
+    def calcular():
+        calcular.chamadas += 1
+        return valor
+    calcular.chamadas = 0
+    return calcular
+
+
+# ================================================================
+# CASOS
+# ================================================================
+
+def test_chave_ignora_caixa_espacos_e_pontuacao_final():
+    assert chave_blocos(["Paguei  500 hoje.", "caiu o PIX!"]) == \
+        chave_blocos(["paguei 500 hoje", "caiu o pix"])
+
+
+def test_memoria_disco_e_reinicio():
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, "cache.db")
+        calcular = _contando([{"tipo": "receita"}])
+
+        cache = CacheRespostas(caminho)
+        assert cache.obter_ou_calcular("k", calcular) == [{"tipo": "receita"}]
+        assert cache.obter_ou_calcular("k", calcular) == [{"tipo": "receita"}]
+        assert calcular.chamadas == 1
+        stats = cache.estatisticas()
+        assert (stats["misses"], stats["hits_memoria"], stats["hits_disco"]) == (1, 1, 0)
+
+        # Outro processo (reinício do bot): memória vazia, o SQLite responde
+        reaberto = CacheRespostas(caminho)
+        assert reaberto.obter_ou_calcular("k", calcular) == [{"tipo": "receita"}]
+        assert reaberto.obter_ou_calcular("k", calcular) == [{"tipo": "receita"}]
+        assert calcular.chamadas == 1
+        stats = reaberto.estatisticas()
+        assert (stats["misses"], stats["hits_memoria"], stats["hits_disco"]) == (0, 1, 1)
+
+
+def test_cada_leitura_devolve_copia():
+    cache = CacheRespostas()
+    cache.obter_ou_calcular("k", lambda: [{"tags": ["lazer"]}])
+    cache.obter_ou_calcular("k", lambda: None)[0]["tags"].append("mexido")
+    assert cache.obter_ou_calcular("k", lambda: None) == [{"tags": ["lazer"]}]
+
+
+def test_ttl_expira_na_memoria_e_no_disco():
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, "cache.db")
+        calcular = _contando(["v"])
+        cache = CacheRespostas(caminho, ttl=0.05)
+        cache.obter_ou_calcular("k", calcular)
+        time.sleep(0.1)
+        # Vencido no disco: o reinício calcula de novo
+        assert CacheRespostas(caminho, ttl=0.05).obter_ou_calcular("k", calcular) == ["v"]
+        time.sleep(0.1)
+        # Vencido na memória (e de novo no disco)
+        assert cache.obter_ou_calcular("k", calcular) == ["v"]
+        assert calcular.chamadas == 3
+
+
+def test_lru_da_memoria():
+    cache = CacheRespostas(max_memoria=2)
+    calcular = _contando(["v"])
+    cache.obter_ou_calcular("a", calcular)
+    cache.obter_ou_calcular("b", calcular)
+    cache.obter_ou_calcular("a", calcular)  # "a" passa a ser o mais recente
+    cache.obter_ou_calcular("c", calcular)  # sai "b"
+    assert calcular.chamadas == 3
+    cache.obter_ou_calcular("a", calcular)
+    assert calcular.chamadas == 3
+    cache.obter_ou_calcular("b", calcular)
+    assert calcular.chamadas == 4 and cache.estatisticas()["entradas_memoria"] == 2
+
+
+def test_limite_do_disco_descarta_o_menos_acessado():
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, "cache.db")
+        cache = CacheRespostas(caminho, max_memoria=1, max_disco=2)
+        for chave in ("a", "b"):
+            cache.obter_ou_calcular(chave, lambda: [chave])
+            time.sleep(0.01)  # acessado_em distinto
+        cache.obter_ou_calcular("a", lambda: None)  # volta do disco: "b" é o menos acessado
+        time.sleep(0.01)
+        cache.obter_ou_calcular("c", lambda: ["c"])
+
+        reaberto = CacheRespostas(caminho)
+        calcular = _contando(["de novo"])
+        assert reaberto.obter_ou_calcular("a", calcular) == ["a"]
+        assert reaberto.obter_ou_calcular("c", calcular) == ["c"]
+        assert reaberto.obter_ou_calcular("b", calcular) == ["de novo"]
+        assert calcular.chamadas == 1
+
+
+def test_resultado_vazio_nao_fica_guardado():
+    cache = CacheRespostas()
+    assert cache.obter_ou_calcular("k", lambda: []) == []
+    calcular = _contando(["v"])
+    assert cache.obter_ou_calcular("k", calcular) == ["v"] and calcular.chamadas == 1
+
+
+def test_single_flight_colapsa_chamadas_iguais():
+    cache = CacheRespostas()
+    comecou, liberar = threading.Event(), threading.Event()
+    chamadas = []
+
+    def calcular():
+        chamadas.append(1)
+        comecou.set()
+        liberar.wait(2.0)
+        return [{"tipo": "receita"}]
+
+    resultados = []
+
+    def pedir():
+        resultados.append(cache.obter_ou_calcular("k", calcular))
+
+    lider = threading.Thread(target=pedir, daemon=True)
+    lider.start()
+    comecou.wait(1.0)
+    seguidores = [threading.Thread(target=pedir, daemon=True) for _ in range(3)]
+    for t in seguidores:
+        t.start()
+    while cache.estatisticas()["colapsadas"] < 3:
+        time.sleep(0.001)
+    time.sleep(0.02)  # o cálculo leva tempo: é o que os seguidores economizam
+    liberar.set()
+    for t in [lider] + seguidores:
+        t.join(1.0)
+
+    assert len(chamadas) == 1
+    assert resultados == [[{"tipo": "receita"}]] * 4
+    assert len({id(r) for r in resultados}) == 4  # cópias independentes
+    stats = cache.estatisticas()
+    assert stats["misses"] == 1 and stats["segundos_economizados"] >= 3 * 0.02
+
+
+def test_cache_interrompido_repassa_o_erro_a_quem_espera():
+    cache = CacheRespostas()
+    comecou, liberar = threading.Event(), threading.Event()
+    erros = []
+
+    def calcular():
+        comecou.set()
+        liberar.wait()
+        raise KeyboardInterrupt
+
+    def lider():
+        try:
+            cache.obter_ou_calcular("k", calcular)
+        except KeyboardInterrupt as e:
+            erros.append(e)
+
+    def seguidor():
+        try:
+            cache.obter_ou_calcular("k", lambda: ["nao deveria rodar"])
+        except KeyboardInterrupt as e:
+            erros.append(e)
+
+    t1 = threading.Thread(target=lider, daemon=True)
+    t1.start()
+    comecou.wait()
+    t2 = threading.Thread(target=seguidor, daemon=True)
+    t2.start()
+    while not cache.estatisticas()["colapsadas"]:
+        time.sleep(0.001)
+    liberar.set()
+    t1.join(1.0)
+    t2.join(1.0)
+    assert not t1.is_alive() and not t2.is_alive()
+    assert len(erros) == 2 and erros[0] is erros[1]
+    # Nada ficou preso nem guardado: a próxima chamada calcula de novo
+    assert cache.obter_ou_calcular("k", lambda: ["ok"]) == ["ok"]
+
+
+# ================================================================
+# RUNNER
+# ================================================================
+
+def main():
+    casos = [
+        test_chave_ignora_caixa_espacos_e_pontuacao_final,
+        test_memoria_disco_e_reinicio,
+        test_cada_leitura_devolve_copia,
+        test_ttl_expira_na_memoria_e_no_disco,
+        test_lru_da_memoria,
+        test_limite_do_disco_descarta_o_menos_acessado,
+        test_resultado_vazio_nao_fica_guardado,
+        test_single_flight_colapsa_chamadas_iguais,
+        test_cache_interrompido_repassa_o_erro_a_quem_espera,
+    ]
+    for caso in casos:
+        caso()
+        print(f"  ✅ {caso.__name__}")
+    print(f"\n{len(casos)} caso(s) OK.")
+
+
+if __name__ == "__main__":
+    main()
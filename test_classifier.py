@@ -150,13 +150,12 @@ def testar(nome, texto, grupo=""):
 
     eventos = classify_text(texto)
     for i, ev in enumerate(eventos, 1):
-        d = ev["dados"]
-        fonte = " [gemini]" if d.get("fonte") == "gemini" else ""
-        tags = ", ".join(d.get("tags", [])) or "—"
-        valor = d.get("valor") or "—"
-        cliente = d.get("cliente") or "—"
-        aviso = f" ⚠ {d['aviso']}" if d.get("aviso") else ""
-        print(f"  [{i}] {ev['tipo']}{fonte}")
+        fonte = " [gemini]" if ev.fonte == "gemini" else ""
+        tags = ", ".join(ev.tags or []) or "—"
+        valor = ev.valor or "—"
+        cliente = ev.cliente or "—"
+        aviso = f" ⚠ {ev.aviso}" if ev.aviso else ""
+        print(f"  [{i}] {ev.tipo}{fonte}")
         print(f"       valor={valor}  tags={tags}  cliente={cliente}{aviso}")
 
     return eventos
@@ -181,9 +180,9 @@ def main():
         grupos[grupo].append(ex["nome"])
         eventos = testar(ex["nome"], ex["texto"], grupo)
         tipos = [
-            f"{e['tipo']}"
-            + (f"({','.join(e['dados'].get('tags',[]))})" if e['dados'].get('tags') else "")
-            + (" [G]" if e['dados'].get('fonte') == 'gemini' else "")
+            f"{e.tipo}"
+            + (f"({','.join(e.tags)})" if e.tags else "")
+            + (" [G]" if e.fonte == 'gemini' else "")
             for e in eventos
         ]
         resultados.append((ex["nome"], len(eventos), tipos))
@@ -0,0 +1,111 @@
+"""
+test_escalonador.py
+===================
+Testes do ProcessadorPorChat: ordem dentro do chat, paralelismo entre
+chats, limite global e fila por chat limitada.
+Execute: python test_escalonador.py
+"""
+
+import asyncio
+
+from core.escalonador import ProcessadorPorChat
+
+
+class _Chat:
+    def __init__(self, id):
+        self.id = id
+
+
+class UpdateFalso:
+    def __init__(self, chat_id):
+        self.effective_chat = _Chat(chat_id)
+
+
+async def _despachar(processador, itens):
+    """Imita o Application: uma task por update, criadas na ordem de chegada."""
+    tarefas = [asyncio.create_task(processador.process_update(UpdateFalso(chat), coro))
+               for chat, coro in itens]
+    await asyncio.gather(*tarefas)
+
+
+# ================================================================
+# CASOS
+# ================================================================
+
+def test_ordem_no_chat_e_paralelismo_entre_chats():
+    concluidos = []
+
+    async def trabalho(nome, segundos):
+        await asyncio.sleep(segundos)
+        concluidos.append(nome)
+
+    async def rodar():
+        async with ProcessadorPorChat(limite_global=4) as p:
+            await _despachar(p, [
+                (1, trabalho("a1", 0.10)),  # a mais lenta chega primeiro
+                (1, trabalho("a2", 0.01)),
+                (2, trabalho("b1", 0.01)),
+                (1, trabalho("a3", 0.0)),
+            ])
+
+    asyncio.run(rodar())
+    assert [n for n in concluidos if n.startswith("a")] == ["a1", "a2", "a3"]
+    assert concluidos[0] == "b1"  # o chat 2 não esperou o chat 1
+
+
+def test_limite_global():
+    ativos, pico = [0], [0]
+
+    async def trabalho():
+        ativos[0] += 1
+        pico[0] = max(pico[0], ativos[0])
+        await asyncio.sleep(0.02)
+        ativos[0] -= 1
+
+    async def rodar():
+        async with ProcessadorPorChat(limite_global=3) as p:
+            await _despachar(p, [(chat, trabalho()) for chat in range(10)])
+            assert p.resumo()["chats"] == 0
+
+    asyncio.run(rodar())
+    assert pico[0] == 3
+
+
+def test_fila_do_chat_cheia_descarta_e_avisa():
+    executados, avisados = [], []
+
+    async def trabalho(n):
+        await asyncio.sleep(0.02)
+        executados.append(n)
+
+    async def avisar(update):
+        avisados.append(update.effective_chat.id)
+
+    async def rodar():
+        async with ProcessadorPorChat(limite_por_chat=2, ao_rejeitar=avisar) as p:
+            await _despachar(p, [(7, trabalho(n)) for n in range(4)])
+            assert p.rejeitados == 2
+
+    asyncio.run(rodar())
+    assert executados == [0, 1]
+    assert avisados == [7, 7]
+
+
+# ================================================================
+# RUNNER
+# ================================================================
+
+def main():
+    casos = [
+        test_ordem_no_chat_e_paralelismo_entre_chats,
+        test_limite_global,
+        test_fila_do_chat_cheia_descarta_e_avisa,
+    ]
+    for caso in casos:
+        caso()
+        print(f"  ✅ {caso.__name__}")
+    print(f"\n{len(casos)} caso(s) OK.")
+
+
+if __name__ == "__main__":
+    main()
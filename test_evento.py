@@ -0,0 +1,60 @@
+"""
+test_evento.py
+==============
+Testes do Evento: formato do to_dict (só campos presentes), ida e volta
+pelo cache JSON e centavos levados do merge até a linha do Sheets.
+Execute: python test_evento.py
+"""
+
+import os
+import json
+from datetime import datetime
+
+os.environ.setdefault("TELEGRAM_TOKEN", "teste")
+os.environ.setdefault("SPREADSHEET_ID", "teste")
+
+from core.evento import Evento, TipoEvento
+from core.classifier import classificar_regex, concluir_classificacao
+from core.sheets import _montar_linha
+
+
+# ================================================================
+# CASOS
+# ================================================================
+
+def test_to_dict_so_com_campos_presentes():
+    ev = Evento(TipoEvento.RECEITA, cliente="Ana", valor="2.500", dias=[])
+    assert ev.to_dict() == {"tipo": "receita", "dados": {"valor": "2.500", "cliente": "Ana", "dias": []}}
+    assert ev.centavos == 250000
+    assert not hasattr(ev, "__dict__")
+
+    volta = Evento.from_dict(json.loads(json.dumps(ev.to_dict())))
+    assert volta.to_dict() == ev.to_dict() and volta.tipo is TipoEvento.RECEITA
+
+
+def test_merge_leva_centavos_e_tira_aviso():
+    # "tinta" tem tag sem valor; "Paguei 1,5 mil" tem valor sem tag (e aviso)
+    parcial = classificar_regex("Comprei tinta. Paguei 1,5 mil.")
+    parcial["inconclusivos"] = []  # sem Gemini: só o merge
+    [ev] = concluir_classificacao(parcial)
+    assert (ev.tipo, ev.valor, ev.centavos, ev.aviso) == ("despesa_servico", "1,5 mil", 150000, None)
+    assert _montar_linha(ev, "frase", datetime(2024, 1, 1))[4] == "1500.00"
+
+
+# ================================================================
+# RUNNER
+# ================================================================
+
+def main():
+    casos = [
+        test_to_dict_so_com_campos_presentes,
+        test_merge_leva_centavos_e_tira_aviso,
+    ]
+    for caso in casos:
+        caso()
+        print(f"  ✅ {caso.__name__}")
+    print(f"\n{len(casos)} caso(s) OK.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""
+test_gemini.py
+==============
+Testes do cliente Gemini (prazo, hedge, cota, disjuntor), da degradação do
+classificador para o resultado do regex e das etapas do modo pipeline —
+com um modelo falso, sem rede.
+Execute: python test_gemini.py
+"""
+
+import json
+import time
+import threading
+
+from core import classifier
+from core.cache import CacheRespostas
+from core.moldes import CacheMoldes
+from core.gemini import (
+    ClienteGemini, MicroLote, PrazoEsgotado, iniciar_cliente_gemini, DISJUNTOR_GEMINI,
+)
+from core.limites import LimitadorTaxa, CotaEsgotada
+
+
+class _Resposta:
+    def __init__(self, text):
+        self.text = text
+
+
+class ModeloFalso:
+    """
+    Imita GenerativeModel.generate_content com latências programadas.
+    `texto` pode ser uma string fixa ou uma função prompt → string.
+    """
+
+    def __init__(self, latencias, texto='{"eventos": []}'):
+        self._latencias = list(latencias)
+        self._texto = texto
+        self._lock = threading.Lock()
+        self.chamadas = 0
+
+    def generate_content(self, prompt, request_options=None):
+        with self._lock:
+            self.chamadas += 1
+            latencia = self._latencias.pop(0) if self._latencias else 0.0
+        time.sleep(latencia)
+        texto = self._texto(prompt) if callable(self._texto) else self._texto
+        return _Resposta(texto)
+
+
+RESPOSTA_GEMINI = json.dumps({"eventos": [{
+    "tipo": "despesa_pessoal",
+    "dados": {"valor": "500", "descricao": "janta fora", "tags": ["alimentacao"]},
+}]})
+
+
+def _novo_cache():
+    classifier._cache_gemini = CacheRespostas()
+    # Moldes de testes anteriores ("Paguei V hoje.") responderiam sem o Gemini
+    classifier._moldes = CacheMoldes()
+    classifier._lote_gemini = MicroLote(classifier._consultar_gemini_lote, janela=0.0)
+    DISJUNTOR_GEMINI.registrar_sucesso()  # começa fechado
+
+
+def _responder_por_pedido(prompt):
+    """Responde cada pedido do lote com o valor que aparece no seu texto."""
+    pedidos = []
+    for i, secao in enumerate(prompt.split("[R")[1:], 1):
+        valor = "300" if "300" in secao else "500"
+        pedidos.append({"id": f"R{i}", "eventos": [{
+            "tipo": "despesa_pessoal",
+            "dados": {"valor": valor, "descricao": "lote", "tags": ["lazer"]},
+        }]})
+    return json.dumps({"pedidos": pedidos})
+
+
+# ================================================================
+# CASOS
+# ================================================================
+
+def test_prazo_esgotado():
+    cliente = ClienteGemini(modelo=ModeloFalso([1.0]), prazo=0.1)
+    inicio = time.perf_counter()
+    try:
+        cliente.gerar("oi")
+        assert False, "deveria ter estourado o prazo"
+    except PrazoEsgotado:
+        pass
+    assert time.perf_counter() - inicio < 0.5
+
+
+def test_hedge_dispara_quando_passa_do_p95():
+    # 20 chamadas rápidas formam o histórico; a 21ª trava e a hedge responde
+    modelo = ModeloFalso([0.01] * 20 + [2.0, 0.01])
+    cliente = ClienteGemini(modelo=modelo, prazo=1.0, hedge=True, hedge_min_amostras=20)
+    for _ in range(20):
+        cliente.gerar("aquece")
+
+    inicio = time.perf_counter()
+    cliente.gerar("lenta")
+    assert time.perf_counter() - inicio < 0.5
+    assert cliente.hedges_disparados == 1
+    assert modelo.chamadas == 22
+
+
+def test_classificador_usa_resposta_do_gemini():
+    _novo_cache()
+    iniciar_cliente_gemini(ClienteGemini(modelo=ModeloFalso([0.0], RESPOSTA_GEMINI)))
+
+    eventos = classifier.classify_text("Paguei 500 hoje.")
+    assert eventos[0].tipo == "despesa_pessoal"
+    assert eventos[0].fonte == "gemini"
+
+
+def test_classificador_degrada_para_regex_no_prazo():
+    _novo_cache()
+    iniciar_cliente_gemini(ClienteGemini(modelo=ModeloFalso([1.0], RESPOSTA_GEMINI), prazo=0.1))
+
+    eventos = classifier.classify_text("Paguei 500 hoje.")
+    assert eventos[0].tipo == "despesa"
+    assert eventos[0].valor == "500"
+    assert eventos[0].fonte is None
+
+
+def test_micro_lote_junta_mensagens_concorrentes():
+    _novo_cache()
+    classifier._lote_gemini = MicroLote(classifier._consultar_gemini_lote, janela=0.2)
+    modelo = ModeloFalso([0.0], _responder_por_pedido)
+    iniciar_cliente_gemini(ClienteGemini(modelo=modelo))
+
+    resultados = {}
+
+    def classificar(texto):
+        resultados[texto] = classifier.classify_text(texto)
+
+    threads = [threading.Thread(target=classificar, args=(t,))
+               for t in ("Paguei 500 hoje.", "Paguei 300 ontem.")]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert modelo.chamadas == 1
+    assert resultados["Paguei 500 hoje."][0].valor == "500"
+    assert resultados["Paguei 300 ontem."][0].valor == "300"
+    assert classifier._lote_gemini.lotes_executados == 1
+
+
+def test_micro_lote_interrompido_repassa_o_erro_aos_seguidores():
+    def executar(itens):
+        raise KeyboardInterrupt
+
+    lote = MicroLote(executar, janela=0.5)
+    erros = []
+
+    def submeter(item):
+        try:
+            lote.submeter(item)
+        except KeyboardInterrupt as e:
+            erros.append(e)
+
+    lider = threading.Thread(target=submeter, args=("a",), daemon=True)
+    lider.start()
+    while not lote._itens:
+        time.sleep(0.001)
+    seguidor = threading.Thread(target=submeter, args=("b",), daemon=True)
+    seguidor.start()
+    lider.join(2.0)
+    seguidor.join(2.0)
+    assert not lider.is_alive() and not seguidor.is_alive()
+    assert len(erros) == 2 and erros[0] is erros[1]
+
+
+def test_limitador_enfileira_e_esgota():
+    limite = LimitadorTaxa("teste", por_minuto=600, rajada=1)  # 1 ficha a cada 0,1 s
+    inicio = time.perf_counter()
+    limite.aguardar()
+    limite.aguardar()  # balde vazio: espera a próxima ficha
+    assert 0.08 < time.perf_counter() - inicio < 0.3
+    try:
+        limite.aguardar(espera_max=0.01)
+        assert False, "deveria ter esgotado a cota"
+    except CotaEsgotada:
+        pass
+
+
+def test_classificador_degrada_para_regex_sem_cota():
+    _novo_cache()
+    modelo = ModeloFalso([0.0, 0.0], RESPOSTA_GEMINI)
+    limite = LimitadorTaxa("gemini_rpm", por_minuto=1, rajada=1)
+    iniciar_cliente_gemini(ClienteGemini(modelo=modelo, limite_rpm=limite, cota_espera=0.1))
+
+    assert classifier.classify_text("Paguei 500 hoje.")[0].fonte == "gemini"
+
+    inicio = time.perf_counter()
+    eventos = classifier.classify_text("Paguei 300 ontem.")
+    assert time.perf_counter() - inicio < 0.5
+    assert eventos[0].tipo == "despesa"
+    assert modelo.chamadas == 1
+
+
+def test_disjuntor_aberto_responde_na_hora_com_aviso():
+    _novo_cache()
+    modelo = ModeloFalso([1.0] * DISJUNTOR_GEMINI.falhas_para_abrir)
+    iniciar_cliente_gemini(ClienteGemini(modelo=modelo, prazo=0.05))
+
+    for i in range(DISJUNTOR_GEMINI.falhas_para_abrir):
+        classifier.classify_text(f"Paguei {100 + i} hoje.")
+    assert DISJUNTOR_GEMINI.estado == "aberto"
+
+    time.sleep(1.0)  # requisições presas terminam
+    chamadas = modelo.chamadas
+    inicio = time.perf_counter()
+    eventos = classifier.classify_text("Paguei 999 hoje.")
+    assert time.perf_counter() - inicio < 0.05
+    assert modelo.chamadas == chamadas
+    assert eventos[0].tipo == "despesa"
+    assert classifier.AVISO_GEMINI_FORA in eventos[0].aviso
+
+
+def test_pipeline_so_antecipa_eventos_que_nao_mudam():
+    _novo_cache()
+    iniciar_cliente_gemini(ClienteGemini(modelo=ModeloFalso([0.0], RESPOSTA_GEMINI)))
+
+    parcial = classifier.classificar_regex("Recebi 2500 do João. Paguei 500 hoje.")
+    definitivos = classifier.eventos_definitivos(parcial)
+    assert [ev.tipo for ev in definitivos] == ["receita"]
+    eventos = classifier.concluir_classificacao(parcial)
+    assert eventos[0] is definitivos[0]  # o bot reconhece o que já gravou
+    assert eventos[1].fonte == "gemini"
+
+    # "tinta" tem tag mas não valor: sem o Gemini, absorve o valor do bloco
+    # seguinte no merge — não pode ser gravado antes
+    _novo_cache()
+    iniciar_cliente_gemini(ClienteGemini(modelo=ModeloFalso([1.0]), prazo=0.1))
+    parcial = classifier.classificar_regex("Comprei tinta. Paguei 300 hoje. Recebi 800 da Ana.")
+    definitivos = classifier.eventos_definitivos(parcial)
+    assert [ev.tipo for ev in definitivos] == ["receita"]
+    eventos = classifier.concluir_classificacao(parcial)
+    assert [(ev.tipo, ev.valor) for ev in eventos] == [
+        ("despesa_servico", "300"), ("receita", "800"),
+    ]
+    assert eventos[1] is definitivos[0]
+
+
+def test_resposta_invalida_descarta_so_o_item():
+    resposta = json.dumps({"pedidos": [
+        {"id": "R1", "eventos": [
+            {"tipo": "despesa_servico", "valor": "80", "tags": ["material", "lazer"], "dias": ["ontem"]},
+            {"tipo": "transferencia", "valor": "10"},  # tipo desconhecido
+            "lixo",
+        ]},
+        {"id": "R2", "eventos": "nao e lista"},
+        {"id": "R3", "eventos": [{"tipo": "receita", "valor": "mil", "cliente": "Ana"}]},
+    ]})
+    r1, r2, r3 = classifier._ler_resposta_gemini(resposta, 3)
+    assert [(ev.tipo, ev.valor, ev.tags, ev.dias) for ev in r1] == [
+        ("despesa_servico", "80", ["material"], []),  # "lazer" não é tag de serviço
+    ]
+    assert r2 == []
+    assert r3[0].valor == "" and r3[0].cliente == "Ana"
+
+
+def test_prompt_compacto_e_uso_de_tokens_acerta_a_cota():
+    prompt = classifier._montar_prompt([
+        ("Recebi 2500 do João. Paguei 500 hoje.", ["Paguei 500 hoje"]),
+        ("paguei 300 hoje", ["paguei 300 hoje"]),
+    ])
+    assert prompt == "[R1]\ncontexto: Recebi 2500 do João. Paguei 500 hoje.\n- Paguei 500 hoje\n[R2]\n- paguei 300 hoje"
+    assert "REGRAS" not in prompt and "tipo" not in prompt  # a parte fixa vai como system instruction
+
+    class _Uso:
+        prompt_token_count = 400
+        candidates_token_count = 30
+        cached_content_token_count = 0
+
+    class _RespostaComUso(_Resposta):
+        usage_metadata = _Uso()
+
+    class _ModeloComUso(ModeloFalso):
+        def generate_content(self, prompt, request_options=None):
+            return _RespostaComUso(super().generate_content(prompt, request_options).text)
+
+    tpm = LimitadorTaxa("gemini_tpm", por_minuto=1000)
+    cliente = ClienteGemini(modelo=_ModeloComUso([0.0]), limite_tpm=tpm,
+                            instrucao_sistema=classifier.INSTRUCAO_GEMINI)
+    estimado = cliente._estimar_tokens(prompt)
+    cliente.gerar(prompt)
+    # Sobra no balde o que a resposta diz ter gasto, não a estimativa
+    assert abs(tpm._fichas - (1000 - 400)) < 1, (tpm._fichas, estimado)
+
+
+# ================================================================
+# RUNNER
+# ================================================================
+
+def main():
+    casos = [
+        test_prazo_esgotado,
+        test_hedge_dispara_quando_passa_do_p95,
+        test_classificador_usa_resposta_do_gemini,
+        test_classificador_degrada_para_regex_no_prazo,
+        test_micro_lote_junta_mensagens_concorrentes,
+        test_micro_lote_interrompido_repassa_o_erro_aos_seguidores,
+        test_limitador_enfileira_e_esgota,
+        test_classificador_degrada_para_regex_sem_cota,
+        test_disjuntor_aberto_responde_na_hora_com_aviso,
+        test_pipeline_so_antecipa_eventos_que_nao_mudam,
+        test_resposta_invalida_descarta_so_o_item,
+        test_prompt_compacto_e_uso_de_tokens_acerta_a_cota,
+    ]
+    for caso in casos:
+        caso()
+        print(f"  ✅ {caso.__name__}")
+    print(f"\n{len(casos)} caso(s) OK.")
+
+
+if __name__ == "__main__":
+    main()
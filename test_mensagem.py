@@ -0,0 +1,60 @@
+"""
+test_mensagem.py
+================
+Testes da Mensagem: texto dobrado com offsets alinhados ao original e
+léxico que casa as grafias com e sem acento.
+Execute: python test_mensagem.py
+"""
+
+from core.mensagem import Mensagem, dobrar
+from core.classifier import classificar_regex, extract_cliente, extract_dias
+
+
+# ================================================================
+# CASOS
+# ================================================================
+
+def test_dobrar_preserva_offsets():
+    texto = "Paguei R$ 80 na Farmácia, SÁBADO"
+    dobrado = dobrar(texto)
+    assert dobrado == "paguei r$ 80 na farmacia, sabado"
+    assert len(dobrado) == len(texto)
+    assert len(dobrar("İstanbul")) == len("İstanbul")
+
+
+def test_valores_sao_extraidos_uma_vez():
+    msg = Mensagem("recebi 2.500 e mais 300")
+    assert msg.valores is msg.valores
+    assert msg.valor.centavos == 250000
+
+
+def test_lexico_com_e_sem_acento():
+    for texto in ("gastei 80 na farmácia", "gastei 80 na farmacia", "GASTEI 80 NA FARMACIA"):
+        [ev] = classificar_regex(texto)["eventos"]
+        assert ev.tipo == "despesa_pessoal" and ev.tags == ["saude"], (texto, ev)
+
+
+def test_cliente_e_dias_na_grafia_original():
+    assert extract_cliente(Mensagem("Recebi 2.500 da Ângela")) == "Ângela"
+    assert extract_dias("paguei sabado e TERCA") == ["sábado", "terça"]
+
+
+# ================================================================
+# RUNNER
+# ================================================================
+
+def main():
+    casos = [
+        test_dobrar_preserva_offsets,
+        test_valores_sao_extraidos_uma_vez,
+        test_lexico_com_e_sem_acento,
+        test_cliente_e_dias_na_grafia_original,
+    ]
+    for caso in casos:
+        caso()
+        print(f"  ✅ {caso.__name__}")
+    print(f"\n{len(casos)} caso(s) OK.")
+
+
+if __name__ == "__main__":
+    main()
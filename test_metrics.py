@@ -0,0 +1,179 @@
+"""
+test_metrics.py
+===============
+Testes da exposição das métricas em formato texto (OpenMetrics): linhas
+# HELP/# TYPE de cada família, buckets acumulados do histograma com +Inf
+igual ao _count, _sum, contadores com _total, o # EOF no fim e o
+endpoint HTTP /metrics.
+Execute: python test_metrics.py
+"""
+
+import re
+import urllib.error
+import urllib.request
+
+from core import metrics
+from core.metrics import Contador, Histograma, Medidor
+
+_RE_AMOSTRA = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{[^}]*\})? (\S+)$')
+_RE_LE = re.compile(r',?le="([^"]*)"')
+_SUFIXOS = {"counter": ("_total",), "gauge": ("",), "histogram": ("_bucket", "_count", "_sum")}
+
+
+def _temporarias(*metricas):
+    """Tira do registro global as métricas criadas só para o teste."""
+    for m in metricas:
+        metrics._REGISTRO.remove(m)
+
+
+def _validar(texto: str) -> dict:
+    """
+    Confere a exposição inteira: cada amostra pertence a uma família já
+    declarada com # HELP e # TYPE, os buckets de cada série de histograma
+    são acumulados e terminam em +Inf igual ao _count, e o texto termina
+    em # EOF. Retorna {família: tipo}.
+    """
+    linhas = texto.split("\n")
+    assert linhas[-2:] == ["# EOF", ""], linhas[-3:]
+    ajuda, familias, histogramas = set(), {}, {}
+    for linha in linhas[:-2]:
+        if linha.startswith("# HELP "):
+            ajuda.add(linha.split()[2])
+            continue
+        if linha.startswith("# TYPE "):
+            _, _, nome, tipo = linha.split()
+            assert nome in ajuda and nome not in familias, linha
+            familias[nome] = tipo
+            continue
+        m = _RE_AMOSTRA.match(linha)
+        assert m, linha
+        nome, rotulos, valor = m.group(1), m.group(2) or "", float(m.group(3))
+        familia = next((f for f, tipo in familias.items()
+                        if any(nome == f + sufixo for sufixo in _SUFIXOS[tipo])), None)
+        assert familia is not None, f"amostra sem # TYPE: {linha}"
+        if familias[familia] != "histogram":
+            continue
+        le = _RE_LE.search(rotulos)
+        base = _RE_LE.sub("", rotulos).replace("{,", "{")
+        serie = histogramas.setdefault((familia, "" if base == "{}" else base), {"buckets": []})
+        if nome.endswith("_bucket"):
+            serie["buckets"].append((le.group(1), valor))
+        else:
+            serie[nome[len(familia) + 1:]] = valor
+
+    for (familia, rotulos), serie in histogramas.items():
+        contagens = [n for _, n in serie["buckets"]]
+        assert contagens == sorted(contagens), (familia, rotulos)
+        assert serie["buckets"][-1][0] == "+Inf", (familia, rotulos)
+        assert serie["count"] == contagens[-1] and "sum" in serie, (familia, rotulos)
+    return familias
+
+
+# ================================================================
+# CASOS
+# ================================================================
+
+def test_histograma_exporta_buckets_acumulados():
+    h = Histograma("teste_hist_segundos", "Histograma de teste.", buckets=(0.1, 1), rotulos=("aba",))
+    try:
+        for v in (0.05, 0.1, 0.5, 3):  # 0.1 cai no bucket le="0.1" (limite inclusivo)
+            h.observar(v, aba="a")
+        h.observar(0.2, aba="b")
+        linhas = h.exportar()
+    finally:
+        _temporarias(h)
+    assert linhas[:2] == ["# HELP teste_hist_segundos Histograma de teste.",
+                          "# TYPE teste_hist_segundos histogram"]
+    assert linhas[2:7] == [
+        'teste_hist_segundos_bucket{aba="a",le="0.1"} 2',
+        'teste_hist_segundos_bucket{aba="a",le="1.0"} 3',
+        'teste_hist_segundos_bucket{aba="a",le="+Inf"} 4',
+        'teste_hist_segundos_count{aba="a"} 4',
+        'teste_hist_segundos_sum{aba="a"} ' + linhas[6].split()[-1],
+    ]
+    assert abs(float(linhas[6].split()[-1]) - 3.65) < 1e-9
+    assert linhas[7:] == [
+        'teste_hist_segundos_bucket{aba="b",le="0.1"} 0',
+        'teste_hist_segundos_bucket{aba="b",le="1.0"} 1',
+        'teste_hist_segundos_bucket{aba="b",le="+Inf"} 1',
+        'teste_hist_segundos_count{aba="b"} 1',
+        'teste_hist_segundos_sum{aba="b"} 0.2',
+    ]
+
+
+def test_contador_e_medidor():
+    c = Contador("teste_contador", "Contador de teste.", rotulos=("resultado",))
+    g = Medidor("teste_medidor", "Medidor de teste.")
+    try:
+        c.inc(resultado="ok")
+        c.inc(2, resultado="erro")
+        g.inc(3)
+        g.dec()
+        assert c.exportar() == [
+            "# HELP teste_contador Contador de teste.",
+            "# TYPE teste_contador counter",
+            'teste_contador_total{resultado="erro"} 2',
+            'teste_contador_total{resultado="ok"} 1',
+        ]
+        assert g.exportar() == [
+            "# HELP teste_medidor Medidor de teste.",
+            "# TYPE teste_medidor gauge",
+            "teste_medidor 2",
+        ]
+    finally:
+        _temporarias(c, g)
+
+
+def test_exportacao_completa_termina_em_eof():
+    h = Histograma("teste_export_segundos", "Histograma de teste.", buckets=(0.5,))
+    try:
+        h.observar(0.1)
+        h.observar(9)
+        metrics.HANDLER_SEGUNDOS.observar(0.3)
+        metrics.BLOCOS.inc(camada="regex")
+        familias = _validar(metrics.exportar())
+    finally:
+        _temporarias(h)
+    assert familias["teste_export_segundos"] == "histogram"
+    assert familias["gessobot_handler_segundos"] == "histogram"
+    assert familias["gessobot_blocos"] == "counter"
+    assert familias["gessobot_updates_na_fila"] == "gauge"
+
+
+def test_endpoint_http():
+    servidor = metrics.iniciar_servidor_metricas(0)
+    try:
+        base = f"http://127.0.0.1:{servidor.server_address[1]}"
+        with urllib.request.urlopen(f"{base}/metrics", timeout=5) as r:
+            assert r.status == 200
+            assert r.headers["Content-Type"].startswith("application/openmetrics-text")
+            _validar(r.read().decode("utf-8"))
+        try:
+            urllib.request.urlopen(f"{base}/outra", timeout=5)
+            assert False, "deveria ser 404"
+        except urllib.error.HTTPError as e:
+            assert e.code == 404
+    finally:
+        servidor.shutdown()
+        servidor.server_close()
+
+
+# ================================================================
+# RUNNER
+# ================================================================
+
+def main():
+    casos = [
+        test_histograma_exporta_buckets_acumulados,
+        test_contador_e_medidor,
+        test_exportacao_completa_termina_em_eof,
+        test_endpoint_http,
+    ]
+    for caso in casos:
+        caso()
+        print(f"  ✅ {caso.__name__}")
+    print(f"\n{len(casos)} caso(s) OK.")
+
+
+if __name__ == "__main__":
+    main()
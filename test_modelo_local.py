@@ -0,0 +1,138 @@
+"""
+test_modelo_local.py
+====================
+Testes do classificador local: previsão e limiar, ida e volta pelo
+arquivo JSON, troca do arquivo sem reiniciar (em background, fora de
+quem chama atual()), exemplos tirados do cache do Gemini e o bloco
+resolvido antes do fallback.
+Execute: python test_modelo_local.py
+"""
+
+import os
+import time
+import logging
+import tempfile
+
+from core import classifier
+from core.cache import CacheRespostas, chave_blocos
+from core.modelo_local import ModeloLocal, ModeloArquivo
+from treinar_modelo import exemplos_do_cache
+
+logging.disable(logging.WARNING)
+
+HISTORICO = [
+    ("almoçamos fora, foi 80", "despesa_pessoal:alimentacao"),
+    ("almocei fora hoje 35", "despesa_pessoal:alimentacao"),
+    ("jantamos fora foi 120", "despesa_pessoal:alimentacao"),
+    ("paguei o aluguel 1200", "despesa_pessoal:moradia"),
+    ("paguei o ajudante 150", "despesa_servico:funcionario"),
+    ("caiu no pix 500 do Zé", "receita"),
+    ("bom dia pessoal", "nao_classificado"),
+]
+
+
+# ================================================================
+# CASOS
+# ================================================================
+
+def test_previsao_e_limiar():
+    modelo = ModeloLocal.treinar(HISTORICO)
+    rotulo, prob = modelo.prever("Almoçamos fora, foi 95")
+    assert rotulo == "despesa_pessoal:alimentacao" and prob >= 0.9, (rotulo, prob)
+    # Vocabulário desconhecido: nem arrisca
+    assert modelo.prever("xyzw qkjh") == (None, 0.0)
+    # Ambíguo entre aluguel e ajudante: fica abaixo do limiar
+    assert modelo.prever("paguei o 300")[1] < 0.9
+
+
+def test_arquivo_ida_e_volta_e_troca_a_quente():
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, "modelo.json")
+        arquivo = ModeloArquivo(caminho, intervalo=0)
+        assert arquivo.recarregar() is None
+
+        ModeloLocal.treinar(HISTORICO).salvar(caminho)
+        assert arquivo.recarregar().prever("almocei fora 40")[0] == "despesa_pessoal:alimentacao"
+
+        ModeloLocal.treinar([("almocei fora 40", "despesa_servico:funcionario")] * 3 + HISTORICO[3:]).salvar(caminho)
+        os.utime(caminho, ns=(1, 1))  # mtime diferente mesmo no mesmo tique do relógio
+        assert arquivo.recarregar().prever("almocei fora 40")[0] == "despesa_servico:funcionario"
+
+        with open(caminho, "w") as f:
+            f.write("{quebrado")
+        os.utime(caminho, ns=(2, 2))
+        assert arquivo.recarregar() is not None  # inválido: mantém o anterior
+
+        os.remove(caminho)
+        assert arquivo.recarregar() is None
+
+
+def test_atual_nao_le_o_arquivo_na_hora():
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, "modelo.json")
+        ModeloLocal.treinar(HISTORICO).salvar(caminho)
+        arquivo = ModeloArquivo(caminho, intervalo=0)
+        # Quem chama (o event loop) recebe o que já está carregado: nada
+        assert arquivo.atual() is None
+
+        prazo = time.monotonic() + 2.0
+        while arquivo.atual() is None and time.monotonic() < prazo:
+            time.sleep(0.01)
+        assert arquivo.atual().prever("almocei fora 40")[0] == "despesa_pessoal:alimentacao"
+
+
+def test_exemplos_do_cache_do_gemini():
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, "cache.db")
+        cache = CacheRespostas(caminho)
+        cache.obter_ou_calcular(chave_blocos(["Almoçamos fora, foi 80"]), lambda: [
+            {"tipo": "despesa_pessoal", "dados": {"tags": ["alimentacao"]}}])
+        cache.obter_ou_calcular(chave_blocos(["gastei 50", "saiu 30"]), lambda: [
+            {"tipo": "despesa", "dados": {}}])  # dois blocos, um evento: não atribuível
+        assert exemplos_do_cache(caminho) == [("almoçamos fora, foi 80", "despesa_pessoal:alimentacao")]
+
+
+def test_bloco_resolvido_antes_do_gemini():
+    chamadas = []
+    original = classifier._chamar_gemini, classifier._moldes, classifier._modelo_local
+    classifier._chamar_gemini = lambda texto, blocos: chamadas.append(blocos) or []
+    classifier._moldes = False
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, "modelo.json")
+        ModeloLocal.treinar(HISTORICO).salvar(caminho)
+        try:
+            classifier._modelo_local = False
+            assert classifier.classificar_regex("almoçamos fora, foi 60")["inconclusivos"]
+
+            classifier._modelo_local = ModeloArquivo(caminho, limiar=0.9)
+            classifier._modelo_local.recarregar()
+            [ev] = classifier.classify_text("almoçamos fora, foi 60")
+            stats = classifier.estatisticas_modelo_local()
+        finally:
+            classifier._chamar_gemini, classifier._moldes, classifier._modelo_local = original
+    assert not chamadas
+    assert (ev.tipo, ev.tags, ev.valor, ev.centavos, ev.fonte) == \
+        ("despesa_pessoal", ["alimentacao"], "60", 6000, "local")
+    assert stats["aceitos"] >= 1 and stats["exemplos"] == len(HISTORICO)
+
+
+# ================================================================
+# RUNNER
+# ================================================================
+
+def main():
+    casos = [
+        test_previsao_e_limiar,
+        test_arquivo_ida_e_volta_e_troca_a_quente,
+        test_atual_nao_le_o_arquivo_na_hora,
+        test_exemplos_do_cache_do_gemini,
+        test_bloco_resolvido_antes_do_gemini,
+    ]
+    for caso in casos:
+        caso()
+        print(f"  ✅ {caso.__name__}")
+    print(f"\n{len(casos)} caso(s) OK.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+test_moldes.py
+==============
+Testes do caminho rápido por molde: o acerto dá a mesma classificação do
+caminho completo, trechos do léxico ficam fora das lacunas, o esqueleto
+do Gemini é preenchido sem nova chamada (mas não quando o nome é uma
+loja, não o cliente, nem quando a resposta cobria vários blocos) e o LRU
+respeita o limite.
+Execute: python test_moldes.py
+"""
+
+import logging
+
+from core import classifier
+from core.classifier import classificar_regex, classify_text, molde_do_bloco
+from core.evento import Evento
+from core.mensagem import Mensagem
+from core.moldes import CacheMoldes
+
+logging.disable(logging.WARNING)
+
+
+def _classificar(texto: str, moldes) -> list:
+    original = classifier._moldes
+    classifier._moldes = moldes
+    try:
+        return [ev.to_dict() for ev in classificar_regex(texto)["eventos"]]
+    finally:
+        classifier._moldes = original
+
+
+# ================================================================
+# CASOS
+# ================================================================
+
+def test_acerto_regex_igual_ao_caminho_completo():
+    moldes = CacheMoldes()
+    _classificar("Recebi 2.500 do Carlos sexta", moldes)
+    texto = "Recebi 1.800 do Marcos terça"
+    assert _classificar(texto, moldes) == _classificar(texto, False)
+    assert moldes.estatisticas()["acertos_regex"] == 1
+
+
+def test_trecho_do_lexico_fica_literal():
+    # "99" é tag de transporte: não pode virar lacuna de valor
+    assert molde_do_bloco(Mensagem("paguei 99 de corrida")).chave != \
+        molde_do_bloco(Mensagem("paguei 98 de corrida")).chave
+    moldes = CacheMoldes()
+    _classificar("paguei 99 de corrida", moldes)
+    texto = "paguei 98 de corrida"
+    assert _classificar(texto, moldes) == _classificar(texto, False)
+    assert moldes.estatisticas()["acertos_regex"] == 0
+
+
+def test_esqueleto_do_gemini_sem_nova_chamada():
+    chamadas = []
+
+    def gemini_falso(texto, blocos):
+        chamadas.append(blocos)
+        return [Evento("receita", valor="150", cliente="Marcos", descricao="acerto do Marcos",
+                       tags=[], dias=[], aviso="", fonte="gemini")]
+
+    moldes = CacheMoldes()
+    original = classifier._chamar_gemini, classifier._moldes
+    classifier._chamar_gemini = gemini_falso
+    classifier._moldes = moldes
+    try:
+        classify_text("Marcos 150 acerto")
+        [ev] = classify_text("Joana 80 acerto")
+    finally:
+        classifier._chamar_gemini, classifier._moldes = original
+    assert len(chamadas) == 1
+    assert (ev.tipo, ev.valor, ev.centavos, ev.cliente, ev.descricao, ev.fonte) == \
+        ("receita", "80", 8000, "Joana", "acerto do Joana", "gemini")
+    assert moldes.estatisticas()["acertos_gemini"] == 1
+
+
+def test_nome_que_decide_a_tag_nao_vira_esqueleto():
+    chamadas = []
+
+    def gemini_falso(texto, blocos):
+        chamadas.append(blocos)
+        loja = blocos[0].split()[-1].rstrip(".")
+        return [Evento("despesa_pessoal", valor="200", cliente="", descricao=f"roupa na {loja}",
+                       tags=["vestuario"], dias=[], aviso="", fonte="gemini")]
+
+    moldes = CacheMoldes()
+    original = classifier._chamar_gemini, classifier._moldes
+    classifier._chamar_gemini = gemini_falso
+    classifier._moldes = moldes
+    try:
+        classify_text("Paguei 200 na Renner")
+        classify_text("Paguei 90 na Drogasil")
+    finally:
+        classifier._chamar_gemini, classifier._moldes = original
+    # A loja não é cliente: o segundo bloco volta ao Gemini
+    assert len(chamadas) == 2 and moldes.estatisticas()["acertos_gemini"] == 0
+
+
+def test_resposta_de_varios_blocos_nao_vira_esqueleto():
+    chamadas = []
+
+    def gemini_falso(texto, blocos):
+        chamadas.append(blocos)
+        if len(blocos) == 1:
+            return [Evento("despesa_pessoal", valor="300", cliente="", descricao="mercado",
+                           tags=["alimentacao"], dias=[], aviso="", fonte="gemini")]
+        # Um evento por bloco na contagem, mas na ordem trocada: o posto é
+        # o segundo bloco
+        return [Evento("despesa_pessoal", valor="500", cliente="", descricao="gasolina",
+                       tags=["transporte"], dias=[], aviso="", fonte="gemini"),
+                Evento("despesa_pessoal", valor="500", cliente="", descricao="mercado",
+                       tags=["alimentacao"], dias=[], aviso="", fonte="gemini")]
+
+    moldes = CacheMoldes()
+    original = classifier._chamar_gemini, classifier._moldes
+    classifier._chamar_gemini = gemini_falso
+    classifier._moldes = moldes
+    try:
+        classify_text("Paguei 500 hoje. Gastei 500 no posto.")
+        [ev] = classify_text("Paguei 300 hoje.")
+    finally:
+        classifier._chamar_gemini, classifier._moldes = original
+    assert [len(b) for b in chamadas] == [2, 1]
+    assert ev.tags == ["alimentacao"] and moldes.estatisticas()["acertos_gemini"] == 0
+
+
+def test_lru_limitado():
+    moldes = CacheMoldes(max_itens=2)
+    moldes.guardar("a", "regex", 1)
+    moldes.guardar("b", "regex", 2)
+    moldes.obter("a")  # "a" passa a ser o mais recente
+    moldes.guardar("c", "regex", 3)
+    assert moldes.obter("b") is None
+    assert moldes.obter("a") == ("regex", 1) and moldes.estatisticas()["entradas"] == 2
+
+
+# ================================================================
+# RUNNER
+# ================================================================
+
+def main():
+    casos = [
+        test_acerto_regex_igual_ao_caminho_completo,
+        test_trecho_do_lexico_fica_literal,
+        test_esqueleto_do_gemini_sem_nova_chamada,
+        test_nome_que_decide_a_tag_nao_vira_esqueleto,
+        test_resposta_de_varios_blocos_nao_vira_esqueleto,
+        test_lru_limitado,
+    ]
+    for caso in casos:
+        caso()
+        print(f"  ✅ {caso.__name__}")
+    print(f"\n{len(casos)} caso(s) OK.")
+
+
+if __name__ == "__main__":
+    main()
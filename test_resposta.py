@@ -0,0 +1,153 @@
+"""
+test_resposta.py
+================
+Testes da RespostaProgressiva: confirmação imediata, edições coalescidas
+dentro do ritmo por chat, versão final fora do ritmo (mensagens seguidas
+não esperam o balde) e RetryAfter do Telegram.
+Execute: python test_resposta.py
+"""
+
+import time
+import asyncio
+import itertools
+
+from telegram.error import RetryAfter
+
+from core.resposta import RespostaProgressiva
+
+_chats = itertools.count(1)
+
+
+class MensagemFalsa:
+    """Imita telegram.Message: reply_text devolve a mensagem que será editada."""
+
+    def __init__(self, falhas_retry=0):
+        self.chamadas = []  # (instante, método, texto)
+        self._falhas_retry = falhas_retry
+
+    async def reply_text(self, texto, **kwargs):
+        await asyncio.sleep(0.01)
+        self.chamadas.append((time.perf_counter(), "send", texto))
+        return self
+
+    async def edit_text(self, texto, **kwargs):
+        await asyncio.sleep(0.01)
+        if self._falhas_retry:
+            self._falhas_retry -= 1
+            raise RetryAfter(0.05)
+        self.chamadas.append((time.perf_counter(), "edit", texto))
+
+
+# ================================================================
+# CASOS
+# ================================================================
+
+def test_confirma_na_hora_e_coalesce_edicoes():
+    mensagem = MensagemFalsa()
+
+    async def rodar():
+        inicio = time.perf_counter()
+        resposta = RespostaProgressiva(mensagem, next(_chats), intervalo=0.2)
+        resposta.enviar("regex")
+        await asyncio.sleep(0.05)
+        # A rajada cobre a confirmação e mais duas edições; as demais
+        # esperam a vez e só o texto mais recente sai
+        for i in range(6):
+            resposta.atualizar(f"parcial {i}")
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.25)
+        # O balde está vazio até ~0,4 s, mas a final não espera a vez
+        await resposta.concluir("final")
+        return inicio, resposta, time.perf_counter()
+
+    inicio, resposta, fim = asyncio.run(rodar())
+    metodos = [m for _, m, _ in mensagem.chamadas]
+    textos = [t for _, _, t in mensagem.chamadas]
+    assert metodos[0] == "send" and resposta.enviada_em - inicio < 0.05
+    assert textos == ["regex", "parcial 0", "parcial 1", "parcial 5", "final"]
+    assert mensagem.chamadas[3][0] - inicio >= 0.19  # a 4ª ficha só vem com o ritmo
+    assert fim - inicio < 0.38
+
+
+def test_texto_igual_nao_edita():
+    mensagem = MensagemFalsa()
+
+    async def rodar():
+        resposta = RespostaProgressiva(mensagem, next(_chats), intervalo=0.2)
+        resposta.enviar("pronto")
+        await resposta.concluir("pronto")
+
+    asyncio.run(rodar())
+    assert [m for _, m, _ in mensagem.chamadas] == ["send"]
+
+
+def test_retry_after_tenta_de_novo_com_o_texto_mais_recente():
+    mensagem = MensagemFalsa(falhas_retry=1)
+
+    async def rodar():
+        resposta = RespostaProgressiva(mensagem, next(_chats), intervalo=0.01)
+        resposta.enviar("regex")
+        resposta.atualizar("parcial")
+        await asyncio.sleep(0.03)  # a edição leva o RetryAfter
+        await resposta.concluir("final")
+
+    asyncio.run(rodar())
+    assert [(m, t) for _, m, t in mensagem.chamadas] == [("send", "regex"), ("edit", "final")]
+
+
+def test_retry_after_na_final_nao_prende_o_handler():
+    mensagem = MensagemFalsa(falhas_retry=1)
+
+    async def rodar():
+        resposta = RespostaProgressiva(mensagem, next(_chats), intervalo=0.01)
+        resposta.enviar("regex")
+        inicio = time.perf_counter()
+        await resposta.concluir("final")
+        concluido = time.perf_counter() - inicio
+        await asyncio.sleep(0.1)  # a final sai em segundo plano, depois da pausa
+        return concluido
+
+    assert asyncio.run(rodar()) < 0.04
+    assert [(m, t) for _, m, t in mensagem.chamadas] == [("send", "regex"), ("edit", "final")]
+
+
+def test_mensagens_seguidas_do_chat_nao_esperam_o_ritmo():
+    # Com intervalo de 1 s, três mensagens seguidas (6 chamadas) levariam
+    # ~3 s no ritmo do balde; a final de cada uma não espera a vez
+    mensagens = [MensagemFalsa() for _ in range(3)]
+    chat = next(_chats)
+
+    async def rodar():
+        inicio = time.perf_counter()
+        for i, mensagem in enumerate(mensagens):
+            resposta = RespostaProgressiva(mensagem, chat, intervalo=1.0)
+            resposta.enviar(f"regex {i}")
+            await asyncio.sleep(0.02)  # o Gemini
+            await resposta.concluir(f"final {i}")
+        return time.perf_counter() - inicio
+
+    assert asyncio.run(rodar()) < 0.3
+    assert [[t for _, _, t in m.chamadas] for m in mensagens] == \
+        [[f"regex {i}", f"final {i}"] for i in range(3)]
+
+
+# ================================================================
+# RUNNER
+# ================================================================
+
+def main():
+    casos = [
+        test_confirma_na_hora_e_coalesce_edicoes,
+        test_texto_igual_nao_edita,
+        test_retry_after_tenta_de_novo_com_o_texto_mais_recente,
+        test_retry_after_na_final_nao_prende_o_handler,
+        test_mensagens_seguidas_do_chat_nao_esperam_o_ritmo,
+    ]
+    for caso in casos:
+        caso()
+        print(f"  ✅ {caso.__name__}")
+    print(f"\n{len(casos)} caso(s) OK.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""
+test_sheets.py
+==============
+Testes da escrita no Sheets (cache de handles, lote por aba, journal
+write-behind, disjuntor) usando o backend falso de core/fake_sheets.py — sem rede.
+Execute: python test_sheets.py
+"""
+
+import os
+import time
+import tempfile
+import threading
+
+os.environ.setdefault("TELEGRAM_TOKEN", "teste")
+os.environ.setdefault("SPREADSHEET_ID", "teste")
+
+import gspread
+
+from core import sheets
+from core.fake_sheets import FakeClient
+from core.evento import Evento, TipoEvento
+from core.journal import Journal, FlusherSheets
+
+
+EVENTOS = [
+    Evento(TipoEvento.RECEITA, valor="2.500", cliente="Ana", dias=["quinta"]),
+    Evento(TipoEvento.DESPESA_SERVICO, valor="300", tags=["material"], descricao="tinta"),
+    Evento(TipoEvento.DESPESA_SERVICO, valor="200", tags=["funcionario"], descricao="ajudante"),
+]
+
+
+def _preparar(write_behind: bool) -> FakeClient:
+    fake = FakeClient()
+    sheets._get_client = lambda: fake
+    sheets._invalidar_cache()
+    sheets.SHEETS_WRITE_BEHIND = write_behind
+    sheets.DISJUNTOR_SHEETS.registrar_sucesso()  # começa fechado
+    return fake
+
+
+def _linhas(fake: FakeClient, aba: str) -> list:
+    return fake.spreadsheet._abas[aba].linhas[1:]  # sem cabeçalho
+
+
+class _RespostaErro:
+    """O suficiente de requests.Response para montar um gspread APIError."""
+
+    def __init__(self, code: int, mensagem: str):
+        self.text = mensagem
+        self._corpo = {"error": {"code": code, "message": mensagem, "status": ""}}
+
+    def json(self):
+        return self._corpo
+
+
+# ================================================================
+# CASOS
+# ================================================================
+
+def test_lote_por_aba_e_cache():
+    fake = _preparar(write_behind=False)
+    sheets.inicializar_planilha()
+
+    antes = fake.chamadas
+    resultado = sheets.registrar_eventos(EVENTOS, "frase")
+
+    assert resultado == {
+        "sucesso": ["Receitas", "Despesas Serviço", "Despesas Serviço"],
+        "erros": [],
+    }
+    # Handles em cache: só um append_rows por aba tocada
+    assert fake.chamadas - antes == 2
+    assert len(_linhas(fake, "Despesas Serviço")) == 2
+    assert _linhas(fake, "Receitas")[0][4] == "2500.00"
+
+
+def test_erro_por_aba_mantem_contrato():
+    fake = _preparar(write_behind=False)
+    sheets.inicializar_planilha()
+    fake.fora_do_ar = True
+
+    resultado = sheets.registrar_eventos(EVENTOS, "frase")
+
+    assert resultado["sucesso"] == []
+    assert len(resultado["erros"]) == 3
+    assert "Despesas Serviço" in resultado["erros"][1]
+
+
+def test_journal_sobrevive_a_queda_e_drena_no_encerramento():
+    fake = _preparar(write_behind=True)
+    sheets.inicializar_planilha()
+    fake.fora_do_ar = True
+
+    with tempfile.TemporaryDirectory() as tmp:
+        journal = Journal(os.path.join(tmp, "journal.db"))
+        flusher = FlusherSheets(journal, sheets._gravar_linhas, intervalo=0.05, backoff_base=0.01)
+        sheets._journal, sheets._flusher = journal, flusher
+        flusher.start()
+
+        resultado = sheets.registrar_eventos(EVENTOS, "frase")
+        assert resultado["erros"] == []
+        assert len(resultado["sucesso"]) == 3
+
+        # Sheets fora do ar: tudo continua no journal
+        flusher.drenar(ignorar_backoff=True)
+        assert journal.contar() == 3
+
+        # Volta ao ar: o encerramento gracioso envia o que estava pendente
+        fake.fora_do_ar = False
+        sheets.encerrar_write_behind()
+
+        assert len(_linhas(fake, "Receitas")) == 1
+        assert len(_linhas(fake, "Despesas Serviço")) == 2
+
+
+def test_disjuntor_aberto_adia_para_o_journal_sem_chamar_o_sheets():
+    fake = _preparar(write_behind=False)
+    sheets.inicializar_planilha()
+    fake.fora_do_ar = True
+
+    with tempfile.TemporaryDirectory() as tmp:
+        journal = Journal(os.path.join(tmp, "journal.db"))
+        flusher = FlusherSheets(journal, sheets._gravar_linhas, intervalo=60)
+        sheets._journal, sheets._flusher = journal, flusher
+
+        # Falhas seguidas abrem o disjuntor
+        while sheets.DISJUNTOR_SHEETS.estado != "aberto":
+            sheets.registrar_eventos(EVENTOS, "frase")
+
+        antes, no_journal = fake.chamadas, journal.contar()
+        resultado = sheets.registrar_eventos(EVENTOS, "frase")
+        assert resultado["erros"] == []
+        assert fake.chamadas == antes
+        assert journal.contar() - no_journal == 3
+
+        # Volta ao ar: o encerramento testa, fecha o disjuntor e drena
+        fake.fora_do_ar = False
+        sheets.encerrar_write_behind()
+        assert sheets.DISJUNTOR_SHEETS.estado == "fechado"
+        assert Journal(os.path.join(tmp, "journal.db")).contar() == 0
+
+
+def test_aba_em_backoff_nao_e_ultrapassada():
+    with tempfile.TemporaryDirectory() as tmp:
+        journal = Journal(os.path.join(tmp, "journal.db"))
+        [antiga] = journal.anexar({"Receitas": [["1"]]})
+        journal.adiar([antiga], 60)
+        journal.anexar({"Receitas": [["2"]], "Despesas Serviço": [["3"]]})
+
+        # A linha nova de Receitas esperaria a antiga: só a outra aba sai
+        assert [(aba, linha) for _, aba, linha, _ in journal.pendentes(10)] == [("Despesas Serviço", ["3"])]
+        assert [linha for _, _, linha, _ in journal.pendentes(10, ignorar_backoff=True)] == [["1"], ["2"], ["3"]]
+        journal.fechar()
+
+
+def test_encerrar_nao_drena_junto_com_o_flusher_preso():
+    entrou, liberar = threading.Event(), threading.Event()
+    chamadas = []
+
+    def gravar(linhas_por_aba):
+        chamadas.append(linhas_por_aba)
+        entrou.set()
+        liberar.wait(2.0)  # append_rows pendurado
+        return {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        journal = Journal(os.path.join(tmp, "journal.db"))
+        flusher = FlusherSheets(journal, gravar, intervalo=60)
+        flusher.start()
+        journal.anexar({"Receitas": [["1"]]})
+        flusher.acordar()
+        assert entrou.wait(1.0)
+
+        flusher.encerrar(timeout=0.05)
+        assert len(chamadas) == 1  # sem segunda drenagem das mesmas linhas
+
+        liberar.set()
+        flusher.join(1.0)
+        assert len(chamadas) == 1 and journal.contar() == 0
+        journal.fechar()
+
+
+def test_so_handle_obsoleto_repete_a_escrita():
+    _preparar(write_behind=False)
+    sheets.inicializar_planilha()
+    casos = [
+        (500, "Internal error encountered.", 1),  # pode ter gravado: não repete
+        (503, "The service is currently unavailable.", 1),
+        (404, "Requested entity was not found.", 2),
+        (400, "Invalid requests[0].appendCells: No grid with id: 7", 2),
+    ]
+    for code, mensagem, esperadas in casos:
+        tentativas = []
+
+        def operacao(ws):
+            tentativas.append(ws)
+            raise gspread.exceptions.APIError(_RespostaErro(code, mensagem))
+
+        try:
+            sheets._na_aba("Receitas", operacao)
+            assert False, "deveria ter propagado o erro"
+        except gspread.exceptions.APIError:
+            pass
+        assert len(tentativas) == esperadas, (code, len(tentativas))
+
+
+def test_aba_lenta_nao_trava_o_cache_das_outras():
+    fake = _preparar(write_behind=False)
+    sheets.inicializar_planilha()
+    entrou, liberar = threading.Event(), threading.Event()
+    worksheet = fake.spreadsheet.worksheet
+
+    def worksheet_lento(nome_aba):
+        if nome_aba == "Nova":
+            entrou.set()
+            liberar.wait(2.0)  # metadados lentos ou espera pela cota
+        return worksheet(nome_aba)
+
+    fake.spreadsheet.worksheet = worksheet_lento
+    abrindo = threading.Thread(target=sheets._get_sheet, args=("Nova",), daemon=True)
+    abrindo.start()
+    assert entrou.wait(1.0)
+
+    inicio = time.perf_counter()
+    sheets._get_sheet("Receitas")
+    assert time.perf_counter() - inicio < 0.5
+    liberar.set()
+    abrindo.join(1.0)
+    assert "Nova" in fake.spreadsheet._abas
+
+
+# ================================================================
+# RUNNER
+# ================================================================
+
+def main():
+    casos = [
+        test_lote_por_aba_e_cache,
+        test_erro_por_aba_mantem_contrato,
+        test_journal_sobrevive_a_queda_e_drena_no_encerramento,
+        test_disjuntor_aberto_adia_para_o_journal_sem_chamar_o_sheets,
+        test_aba_em_backoff_nao_e_ultrapassada,
+        test_encerrar_nao_drena_junto_com_o_flusher_preso,
+        test_so_handle_obsoleto_repete_a_escrita,
+        test_aba_lenta_nao_trava_o_cache_das_outras,
+    ]
+    for caso in casos:
+        caso()
+        print(f"  ✅ {caso.__name__}")
+    print(f"\n{len(casos)} caso(s) OK.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+test_valores.py
+===============
+Testes do tokenizador de valores: formas de escrita, centavos sem float
+e escolha do valor principal de um bloco.
+Execute: python test_valores.py
+"""
+
+from core.valores import extrair_valores, valor_principal, para_centavos, formatar_centavos
+
+
+# ================================================================
+# CASOS
+# ================================================================
+
+def test_formas_em_centavos():
+    casos = {
+        "2500": 250000,
+        "2.500": 250000,
+        "2,500": 250000,
+        "1.200,50": 120050,
+        "1,200.50": 120050,
+        "80,50": 8050,
+        "1200.5": 120050,
+        "2,5 mil": 250000,
+        "1k": 100000,
+        "R$ 50": 5000,
+        "R$1.234.567,89": 123456789,
+        "1200,505": 120051,  # meio centavo arredonda para cima
+    }
+    for texto, esperado in casos.items():
+        assert para_centavos(texto) == esperado, (texto, para_centavos(texto))
+
+
+def test_trecho_e_texto():
+    [valor] = extrair_valores("paguei R$ 2,5 mil de material")
+    assert valor.texto == "2,5 mil"
+    assert "paguei R$ 2,5 mil de material"[valor.inicio:valor.fim] == "R$ 2,5 mil"
+
+
+def test_valor_principal():
+    assert valor_principal("dia 5 recebi 2.500 da Ana").texto == "2.500"
+    assert valor_principal("3 sacos por 130").texto == "130"
+    assert valor_principal("paguei 1k e mais 3000").texto == "1k"
+    assert valor_principal("comprei 2 sacos") is None
+    assert valor_principal("saiu internet 2,5") is None  # bloco cortado de "2,5 mil"
+    assert valor_principal("gastei R$ 5 no café").centavos == 500
+
+
+def test_formatar_centavos():
+    assert formatar_centavos(120050) == "1200.50"
+    assert formatar_centavos(5) == "0.05"
+    assert formatar_centavos(-250000) == "-2500.00"
+
+
+# ================================================================
+# RUNNER
+# ================================================================
+
+def main():
+    casos = [
+        test_formas_em_centavos,
+        test_trecho_e_texto,
+        test_valor_principal,
+        test_formatar_centavos,
+    ]
+    for caso in casos:
+        caso()
+        print(f"  ✅ {caso.__name__}")
+    print(f"\n{len(casos)} caso(s) OK.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+treinar_modelo.py
+=================
+Treina o classificador local (core/modelo_local.py) com o histórico
+rotulado e grava o arquivo que o bot recarrega sozinho (MODELO_LOCAL_PATH).
+Execute: python treinar_modelo.py [--cache gessobot_gemini_cache.db]
+                                  [--planilha aba.csv ...] [--saida arquivo.json]
+
+Fontes de exemplos (bloco, rótulo):
+  --cache     respostas do Gemini no cache em disco (core/cache.py): a
+              chave são os blocos normalizados, o valor os eventos. Só
+              entram respostas atribuíveis — um bloco, ou um evento por bloco.
+  --planilha  abas exportadas em CSV (cabeçalho de core/sheets.CABECALHO):
+              Descrição como texto, Tipo + Tags como rótulo. Linhas com
+              aviso (ainda por revisar) ficam de fora.
+
+Antes de gravar, separa --validacao dos exemplos para medir, no limiar
+configurado, quanto o modelo resolveria sozinho e com que acerto.
+"""
+
+import os
+import csv
+import sys
+import json
+import random
+import sqlite3
+import argparse
+
+from core.modelo_local import ModeloLocal, rotulo_do_evento
+
+# Mesmo padrão de core/config.py, sem exigir o .env do bot
+CACHE_PADRAO = os.getenv("GEMINI_CACHE_PATH", "gessobot_gemini_cache.db")
+SAIDA_PADRAO = os.getenv("MODELO_LOCAL_PATH", "gessobot_modelo_local.json")
+LIMIAR_PADRAO = float(os.getenv("MODELO_LOCAL_LIMIAR", "0.9"))
+
+
+# ================================================================
+# FONTES
+# ================================================================
+
+def _rotulo(evento: dict) -> str | None:
+    dados = evento.get("dados") or {}
+    return rotulo_do_evento(evento.get("tipo", ""), dados.get("tags"))
+
+
+def exemplos_do_cache(caminho: str) -> list:
+    """(bloco, rótulo) das respostas do Gemini guardadas no SQLite do cache."""
+    conn = sqlite3.connect(f"file:{caminho}?mode=ro", uri=True)
+    try:
+        linhas = conn.execute("SELECT chave, valor FROM respostas").fetchall()
+    finally:
+        conn.close()
+
+    exemplos = []
+    for chave, valor in linhas:
+        blocos = chave.split("\n")
+        eventos = json.loads(valor)
+        if len(eventos) == len(blocos):
+            pares = [(b, _rotulo(ev)) for b, ev in zip(blocos, eventos)]
+        elif len(blocos) == 1 and eventos:
+            # Bloco que o Gemini subdividiu: só serve se todos têm o mesmo rótulo
+            rotulos = {_rotulo(ev) for ev in eventos}
+            pares = [(blocos[0], rotulos.pop())] if len(rotulos) == 1 else []
+        else:
+            pares = []
+        exemplos += [(b, r) for b, r in pares if b and r]
+    return exemplos
+
+
+def exemplos_da_planilha(caminho: str) -> list:
+    """(descrição, rótulo) das linhas de uma aba exportada em CSV."""
+    exemplos = []
+    with open(caminho, encoding="utf-8", newline="") as f:
+        for linha in csv.DictReader(f):
+            if (linha.get("Aviso") or "").strip():
+                continue
+            tags = [t.strip() for t in (linha.get("Tags") or "").split(",") if t.strip()]
+            rotulo = rotulo_do_evento((linha.get("Tipo") or "").strip(), tags)
+            texto = (linha.get("Descrição") or "").strip()
+            if texto and rotulo:
+                exemplos.append((texto, rotulo))
+    return exemplos
+
+
+# ================================================================
+# VALIDAÇÃO
+# ================================================================
+
+def avaliar(modelo: ModeloLocal, exemplos: list, limiar: float) -> dict:
+    """Fração dos exemplos aceitos no limiar e acerto entre os aceitos."""
+    aceitos = certos = 0
+    for texto, rotulo in exemplos:
+        previsto, prob = modelo.prever(texto)
+        if previsto is not None and prob >= limiar:
+            aceitos += 1
+            certos += previsto == rotulo
+    return {
+        "exemplos": len(exemplos),
+        "cobertura": aceitos / len(exemplos) if exemplos else 0.0,
+        "acerto": certos / aceitos if aceitos else 0.0,
+    }
+
+
+# ================================================================
+# RUNNER
+# ================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Treina o classificador local do GessoBot")
+    parser.add_argument("--cache", default=CACHE_PADRAO, help="SQLite do cache do Gemini")
+    parser.add_argument("--planilha", nargs="*", default=[], metavar="CSV",
+                        help="abas da planilha exportadas em CSV")
+    parser.add_argument("--saida", default=SAIDA_PADRAO, help="arquivo do modelo")
+    parser.add_argument("--limiar", type=float, default=LIMIAR_PADRAO)
+    parser.add_argument("--validacao", type=float, default=0.2,
+                        help="fração separada para validação (padrão 0.2)")
+    parser.add_argument("--alpha", type=float, default=0.5)
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args()
+
+    exemplos = []
+    if args.cache and os.path.exists(args.cache):
+        do_cache = exemplos_do_cache(args.cache)
+        print(f"Cache do Gemini ({args.cache}): {len(do_cache)} exemplo(s)")
+        exemplos += do_cache
+    for caminho in args.planilha:
+        da_planilha = exemplos_da_planilha(caminho)
+        print(f"Planilha ({caminho}): {len(da_planilha)} exemplo(s)")
+        exemplos += da_planilha
+    if not exemplos:
+        print("❌ Nenhum exemplo rotulado encontrado.")
+        sys.exit(1)
+
+    random.Random(args.semente).shuffle(exemplos)
+    n_validacao = int(len(exemplos) * args.validacao)
+    if n_validacao:
+        validacao, treino = exemplos[:n_validacao], exemplos[n_validacao:]
+        r = avaliar(ModeloLocal.treinar(treino, alpha=args.alpha), validacao, args.limiar)
+        print(f"Validação ({r['exemplos']} exemplos, limiar {args.limiar}): "
+              f"resolve {r['cobertura']:.0%} sozinho, acerto {r['acerto']:.1%}")
+
+    modelo = ModeloLocal.treinar(exemplos, alpha=args.alpha)
+    modelo.salvar(args.saida)
+    print(f"✅ Modelo gravado em {args.saida}: {modelo.exemplos} exemplos, "
+          f"{len(modelo.rotulos)} rótulos")
+
+
+if __name__ == "__main__":
+    main()